@@ -0,0 +1,92 @@
+import numpy as np
+
+from projections import ProjectedCache
+from projections import axes_projection
+from spatial_index import GridIndex
+
+
+class AnnotationLayer(object):
+    """
+    Texts, images and other anchored artists culled through a spatial index.
+
+    Each feature is registered with its anchor and a factory that builds its
+    artist at a given position.  Artists are only created once a feature
+    first comes into view, and on every view update only the features the
+    index returns are shown; the rest are hidden.  On other projections
+    than plain lon/lat the anchors are projected in bulk, cached per
+    projection, and culled against the view.
+
+    With an overlay, the artists are drawn on it rather than with the
+    frame, so a pan that shifts the cached frame redraws them per frame.
+    """
+
+    def __init__(self, ax=None):
+        self.index = GridIndex()
+        self.factories = []
+        self.artists = {}
+        self.shown = {}
+        self.projected = ProjectedCache()
+        self.ax = ax
+        self.overlay = None
+
+    def attach(self, ax, overlay=None):
+        """
+        Moves the layer to new axes, and the artists to overlay if given;
+        artists are rebuilt as they come into view
+        """
+        for artist in self.artists.values():
+            if self.overlay is not None and artist in self.overlay.artists:
+                self.overlay.remove_artist(artist)
+            elif artist.axes is not None:
+                artist.remove()
+        self.artists = {}
+        self.shown = {}
+        self.ax = ax
+        self.overlay = overlay
+
+    def add(self, factory, lon, lat):
+        """
+        Registers a feature whose artist is built by factory((x, y))
+        """
+        self.index.insert(lon, lat)
+        self.factories.append(factory)
+
+    def shown_artists(self):
+        """
+        The artists of the features in view
+        """
+        return [self.artists[fid] for fid in self.shown]
+
+    def update_view(self):
+        if self.ax is None:
+            return
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        projection = axes_projection(self.ax)
+        if projection.identity:
+            ids, shifts = self.index.query(x0, x1, y0, y1)
+            xs = self.index.lons[ids] + shifts
+            ys = self.index.lats[ids]
+        else:
+            xs, ys = self.projected.get(projection, self.index.lons,
+                                        self.index.lats)
+            ids = np.flatnonzero((xs >= x0) & (xs <= x1) &
+                                 (ys >= y0) & (ys <= y1))
+            xs, ys = xs[ids], ys[ids]
+
+        shown = {}
+        for fid, x, y in zip(ids.tolist(), xs.tolist(), ys.tolist()):
+            artist = self.artists.get(fid)
+            if artist is None:
+                artist = self.artists[fid] = self.factories[fid]((x, y))
+                self.ax.add_artist(artist)
+                if self.overlay is not None:
+                    self.overlay.add_artist(artist)
+            elif self.shown.get(fid) != (x, y):
+                artist.xy = artist.xybox = (x, y)
+            artist.set_visible(True)
+            shown[fid] = (x, y)
+        for fid in self.shown:
+            if fid not in shown:
+                self.artists[fid].set_visible(False)
+        self.shown = shown
@@ -0,0 +1,115 @@
+import threading
+import traceback
+import wx
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+
+class RenderCancelled(Exception):
+    pass
+
+
+class RenderJob(object):
+    """
+    A single off-thread render request.
+
+    The build function reports progress through the job, which is also where
+    a superseded job notices it has been cancelled.
+    """
+
+    def __init__(self, param, on_progress=None):
+        self.param = param
+        self.on_progress = on_progress
+        self.result = None
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def progress(self, fraction, message=''):
+        """
+        Reports progress to the GUI thread, raising RenderCancelled if the job
+        has been superseded
+        """
+        if self.cancelled():
+            raise RenderCancelled()
+        if self.on_progress:
+            wx.CallAfter(self.on_progress, self, fraction, message)
+
+
+class BackgroundRenderer(object):
+    """
+    Builds and rasterizes figures on a worker thread.
+
+    build(figure, param, job) populates a fresh Agg-backed Figure, which is
+    then drawn off the GUI thread, and its return value is kept as
+    job.result.  The drawing is done by draw(figure, job) when given, and by
+    the figure's canvas otherwise.  When it finishes, on_done(job, figure)
+    is called on the GUI thread, unless a newer request has cancelled the
+    job in the meantime.  If building or drawing raises, the job is
+    dropped and on_error(job, error) is called on the GUI thread instead.
+    """
+
+    def __init__(self, build, on_done, on_progress=None, draw=None,
+                 on_error=None):
+        self.build = build
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.draw = draw
+        self.on_error = on_error
+        self.job = None
+
+    def busy(self):
+        return self.job is not None
+
+    def cancel(self):
+        if self.job is not None:
+            self.job.cancel()
+            self.job = None
+
+    def submit(self, param, size_inches, dpi):
+        """
+        Starts rendering param, cancelling any render already in progress
+        """
+        self.cancel()
+        job = self.job = RenderJob(param, self.on_progress)
+        worker = threading.Thread(target=self._run,
+                                  args=(job, size_inches, dpi))
+        worker.daemon = True
+        worker.start()
+        return job
+
+    def _run(self, job, size_inches, dpi):
+        try:
+            figure = Figure(size_inches, dpi=dpi)
+            FigureCanvasAgg(figure)
+            job.result = self.build(figure, job.param, job)
+            job.progress(0.9, 'Rasterizing')
+            if self.draw:
+                self.draw(figure, job)
+            else:
+                figure.canvas.draw()
+        except RenderCancelled:
+            return
+        except Exception as error:
+            traceback.print_exc()
+            wx.CallAfter(self._fail, job, error)
+            return
+        wx.CallAfter(self._finish, job, figure)
+
+    def _finish(self, job, figure):
+        if job is not self.job or job.cancelled():
+            return
+        self.job = None
+        self.on_done(job, figure)
+
+    def _fail(self, job, error):
+        if job is not self.job:
+            return
+        self.job = None
+        if self.on_error:
+            self.on_error(job, error)
@@ -0,0 +1,102 @@
+import argparse
+import os
+import sys
+
+import matplotlib
+matplotlib.use('Agg')
+
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, SCRIPT_PATH)
+
+from map_figure import STOCK_IMAGE
+from map_figure import create_axes
+from map_figure import plot_layers
+from session import read_session
+
+FORMATS = ('png', 'svg')
+DEFAULT_SIZE = (8.0, 4.0)
+DEFAULT_DPI = 300
+
+
+def load_session(path):
+    """
+    Reads the property values saved by MainFrame.OnSave
+    """
+    return read_session(path).properties
+
+
+def output_path(session, output_dir, fmt):
+    name = os.path.splitext(os.path.basename(session))[0] + '.' + fmt
+    return os.path.join(output_dir or os.path.dirname(session), name)
+
+
+def render_session(session, output, size=DEFAULT_SIZE, dpi=DEFAULT_DPI,
+                   base_image=STOCK_IMAGE):
+    """
+    Renders one session file to output, the format following its extension
+    """
+    figure = Figure(size, dpi=dpi)
+    FigureCanvasAgg(figure)
+    ax = create_axes(figure)
+    plot_layers(ax, load_session(session), base_image)
+    figure.savefig(output, dpi=dpi)
+    return output
+
+
+def render_sessions(sessions, output_dir=None, fmt='png', size=DEFAULT_SIZE,
+                    dpi=DEFAULT_DPI, base_image=STOCK_IMAGE, jobs=None):
+    """
+    Renders independent sessions across a process pool, yielding
+    (session, output, error) as each one finishes
+    """
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = [(session, pool.submit(
+            render_session, session, output_path(session, output_dir, fmt),
+            size, dpi, base_image)) for session in sessions]
+        for session, future in futures:
+            try:
+                yield session, future.result(), None
+            except Exception as error:
+                yield session, None, error
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='jormungandr-render',
+        description='Render saved .map sessions without a display.')
+    parser.add_argument('sessions', nargs='+', metavar='SESSION',
+                        help='.map session file(s) to render')
+    parser.add_argument('-o', '--output-dir',
+                        help='directory for the images (default: next to '
+                             'each session)')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='png',
+                        help='image format (default: %(default)s)')
+    parser.add_argument('--size', nargs=2, type=float, default=DEFAULT_SIZE,
+                        metavar=('WIDTH', 'HEIGHT'),
+                        help='figure size in inches (default: %s %s)' %
+                             DEFAULT_SIZE)
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI,
+                        help='resolution (default: %(default)s)')
+    parser.add_argument('--base-image', default=STOCK_IMAGE,
+                        help='raster used for the base imagery')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for session, output, error in render_sessions(
+            args.sessions, args.output_dir, args.format, tuple(args.size),
+            args.dpi, args.base_image, args.jobs):
+        if error is None:
+            print('%s -> %s' % (session, output))
+        else:
+            failed += 1
+            sys.stderr.write('%s: %s\n' % (session, error))
+    return 1 if failed else 0
@@ -0,0 +1,347 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+
+import matplotlib
+matplotlib.use('Agg')
+
+import numpy as np
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, SCRIPT_PATH)
+
+from map_figure import MAP_LAYERS
+from map_figure import create_axes
+from map_figure import plot_layers
+from map_view import MapView
+from projections import axes_projection
+from progressive import INTERACTIVE_DPI
+from parallel_render import LAYER_WORKERS
+from parallel_render import LayerCompositor
+
+DEFAULT_SIZE = (8.0, 4.0)
+DEFAULT_DPI = 100
+POINT_COUNTS = (1000, 10000, 100000, 1000000, 10000000)
+ZOOM_LEVELS = (1, 4, 16, 64, 256)
+
+# down to a view a few arc-seconds across
+GRID_ZOOM_LEVELS = (1, 16, 256, 4096, 65536, 1048576)
+PAN_STEPS = 20
+
+# a case regresses when its median time exceeds the baseline's by this much
+DEFAULT_TOLERANCE = 0.25
+SCHEMA_VERSION = 1
+
+
+class HeadlessPlot(MapView):
+    """
+    The plot's map view on an Agg canvas, so its hot paths can be timed
+    without a display
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, dpi=DEFAULT_DPI):
+        figure = Figure(size, dpi=dpi)
+        MapView.__init__(self, figure, FigureCanvasAgg(figure))
+        self.map = axes_projection(self.ax)
+
+    def zoom(self, level, lon=0.0, lat=0.0):
+        """
+        Centers the view on lon/lat, showing 1/level of the globe's width
+        """
+        half_lon = 180.0 / level
+        half_lat = min(90.0 / level, 90.0)
+        self.ax.set_xlim(lon - half_lon, lon + half_lon)
+        self.ax.set_ylim(max(lat - half_lat, -90.0),
+                         min(lat + half_lat, 90.0))
+
+
+def random_points(count, seed=0):
+    state = np.random.RandomState(seed)
+    return state.uniform(-180, 180, count), state.uniform(-90, 90, count)
+
+
+def measure(function, repeat=5, number=1, setup=None):
+    """
+    Times function (number calls per sample, repeat samples), returning the
+    per-call seconds of each sample
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        samples.append(timeit.timeit(function, number=number) / number)
+    return samples
+
+
+def bench_grid(plot, zooms=GRID_ZOOM_LEVELS):
+    for level in zooms:
+        plot.zoom(level, 10.0, 10.0)
+        yield ('grid/meridians_and_parallels', {'zoom': level},
+               measure(plot._plot_meridians_and_parallels, number=10))
+
+
+def bench_labels(plot, counts=(10, 50, 200)):
+    for count in counts:
+        lons = np.linspace(-180, 180, count)
+        lats = np.linspace(-90, 90, count)
+        yield ('grid/label_grid', {'lines': count},
+               measure(lambda: plot._label_grid(lons, lats), number=10))
+
+
+def bench_grid_spacing(plot, zooms=GRID_ZOOM_LEVELS):
+    for level in zooms:
+        span = 360.0 / level
+        yield ('grid/spacing', {'zoom': level},
+               measure(lambda: plot.grid_spacing.lines(10.0, 10.0 + span),
+                       number=1000))
+
+
+def bench_plot(plot, counts=POINT_COUNTS):
+    param = {'Blue Marble': True}
+    for count in counts:
+        plot.points.clear()
+        plot.points.extend(*random_points(count))
+        plot.zoom(1)
+        yield ('render/plot', {'points': count},
+               measure(lambda: plot.plot(param), repeat=3))
+
+
+def bench_pan_zoom(plot, counts=POINT_COUNTS, zooms=ZOOM_LEVELS,
+                   steps=PAN_STEPS):
+    plot.plot({'Blue Marble': True})
+    for count in counts:
+        plot.points.clear()
+        plot.points.extend(*random_points(count))
+        for level in zooms:
+            def sequence():
+                for step in range(steps):
+                    plot.zoom(level, -60.0 + 120.0 * step / steps, 20.0)
+                    plot.render({'view'})
+            yield ('render/pan_zoom', {'points': count, 'zoom': level,
+                                       'steps': steps},
+                   [sample / steps for sample in
+                    measure(sequence, repeat=3)])
+
+
+def bench_projection(plot, counts=POINT_COUNTS,
+                     projections=('Robinson', 'Orthographic')):
+    for count in counts:
+        plot.points.clear()
+        plot.points.extend(*random_points(count))
+        for name in projections:
+            param = {'Blue Marble': True, 'Projection': name}
+
+            # the first switch projects everything; later ones hit the caches
+            plot.plot(param)
+
+            def switch():
+                plot.plot({'Blue Marble': True})
+                plot.plot(param)
+            yield ('render/projection_switch', {'points': count,
+                                                'projection': name},
+                   [sample / 2 for sample in measure(switch, repeat=3)])
+
+
+def bench_pixel_pan(plot, counts=POINT_COUNTS, zooms=ZOOM_LEVELS,
+                    steps=PAN_STEPS):
+    plot.plot({'Blue Marble': True})
+    for count in counts:
+        plot.points.clear()
+        plot.points.extend(*random_points(count))
+        for level in zooms:
+            def sequence():
+                plot.zoom(level, -60.0, 20.0)
+                plot.render({'view'})
+                plot.begin_pan()
+                for step in range(steps):
+                    plot.zoom(level, -60.0 + 120.0 * step / steps / level,
+                              20.0)
+                    plot.pan_frame()
+            yield ('render/pixel_pan', {'points': count, 'zoom': level,
+                                        'steps': steps},
+                   [sample / steps for sample in
+                    measure(sequence, repeat=3)])
+
+
+def bench_progressive(plot, counts=POINT_COUNTS, zooms=ZOOM_LEVELS[:3]):
+    plot.plot({'Blue Marble': True})
+    for count in counts:
+        plot.points.clear()
+        plot.points.extend(*random_points(count))
+        for level in zooms:
+            plot.zoom(level, 10.0, 10.0)
+            for mode in ('interactive', 'full'):
+                plot.progressive.interacting = mode == 'interactive'
+                yield ('render/progressive', {'points': count,
+                                              'zoom': level, 'mode': mode},
+                       measure(lambda: plot.render({'view'}), repeat=3))
+        plot.progressive.interacting = False
+
+
+def bench_parallel(plot, workers=(0, max(LAYER_WORKERS, 1))):
+    param = {'Blue Marble': True, 'Coastlines': True, 'State Borders': True,
+             'Country Borders': True}
+    for count in workers:
+        compositor = LayerCompositor(count)
+
+        def render():
+            figure = Figure(plot.figure.get_size_inches(),
+                            dpi=plot.figure.dpi)
+            FigureCanvasAgg(figure)
+            ax = create_axes(figure)
+            sent = compositor.submit(figure, param, plot.base_image)
+            layers = plot_layers(ax, param, plot.base_image,
+                                 names=[name for name in MAP_LAYERS.names
+                                        if name not in sent])
+            compositor.draw(figure, layers, param, plot.base_image)
+        try:
+            # the first render starts the workers and warms the caches
+            render()
+            yield ('render/parallel_layers', {'workers': count},
+                   measure(render, repeat=3))
+        finally:
+            compositor.shutdown()
+
+
+SUITES = {
+    'grid': bench_grid,
+    'labels': bench_labels,
+    'grid_spacing': bench_grid_spacing,
+    'plot': bench_plot,
+    'pan_zoom': bench_pan_zoom,
+    'parallel': bench_parallel,
+    'pixel_pan': bench_pixel_pan,
+    'progressive': bench_progressive,
+    'projection': bench_projection,
+}
+
+
+def case_key(name, params):
+    return name + ''.join('[%s=%s]' % item for item in sorted(params.items()))
+
+
+def run(suites=None, counts=POINT_COUNTS, size=DEFAULT_SIZE,
+        dpi=DEFAULT_DPI, stream=None, interactive_dpi=INTERACTIVE_DPI):
+    """
+    Runs the named suites (all by default), returning the results document.
+    A case that raises is recorded with its error instead of timings.
+    """
+    results = {}
+    for suite in suites or sorted(SUITES):
+        plot = HeadlessPlot(size, dpi)
+        plot.progressive.configure(dpi=interactive_dpi)
+        kwargs = {'counts': counts} if suite in (
+            'plot', 'pan_zoom', 'pixel_pan', 'progressive',
+            'projection') else {}
+        cases = SUITES[suite](plot, **kwargs)
+        while True:
+            try:
+                name, params, samples = next(cases)
+            except StopIteration:
+                break
+            except Exception as error:
+                key = case_key(suite, {'error': type(error).__name__})
+                results[key] = {'error': '%s: %s' % (type(error).__name__,
+                                                     error)}
+                if stream:
+                    stream.write('%-60s FAILED %s\n' % (key,
+                                                         results[key]['error']))
+                break
+            key = case_key(name, params)
+            results[key] = {'name': name, 'params': params,
+                            'min': min(samples),
+                            'median': float(np.median(samples)),
+                            'samples': samples}
+            if stream:
+                stream.write('%-60s %10.3f ms\n' % (
+                    key, 1000.0 * results[key]['median']))
+    return {'schema': SCHEMA_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': {'python': platform.python_version(),
+                        'platform': platform.platform(),
+                        'numpy': np.__version__,
+                        'matplotlib': matplotlib.__version__,
+                        'size': list(size), 'dpi': dpi,
+                        'interactive_dpi': interactive_dpi},
+            'results': results}
+
+
+def compare(document, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Regressions of document against baseline: cases that failed, or whose
+    median time grew by more than tolerance, as (key, message) pairs
+    """
+    regressions = []
+    for key, result in sorted(document['results'].items()):
+        if 'error' in result:
+            regressions.append((key, result['error']))
+            continue
+        reference = baseline['results'].get(key)
+        if reference is None or 'median' not in reference:
+            continue
+        ratio = result['median'] / max(reference['median'], 1e-12)
+        if ratio > 1.0 + tolerance:
+            regressions.append((key, '%.3f ms -> %.3f ms (%+.0f%%)' % (
+                1000.0 * reference['median'], 1000.0 * result['median'],
+                100.0 * (ratio - 1.0))))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='jormungandr-benchmark',
+        description='Time the plotting hot paths without a display.')
+    parser.add_argument('suites', nargs='*', metavar='SUITE',
+                        help='suites to run: %s (default: all)' %
+                             ', '.join(sorted(SUITES)))
+    parser.add_argument('-o', '--output',
+                        help='write the results to this JSON file')
+    parser.add_argument('-b', '--baseline',
+                        help='JSON results to compare against; exits with '
+                             'status 1 on any regression')
+    parser.add_argument('-t', '--tolerance', type=float,
+                        default=DEFAULT_TOLERANCE,
+                        help='allowed slowdown against the baseline '
+                             '(default: %(default)s)')
+    parser.add_argument('-n', '--points', nargs='+', type=int,
+                        default=POINT_COUNTS, metavar='COUNT',
+                        help='point layer sizes (default: %s)' %
+                             ' '.join(str(count) for count in POINT_COUNTS))
+    parser.add_argument('--size', nargs=2, type=float, default=DEFAULT_SIZE,
+                        metavar=('WIDTH', 'HEIGHT'),
+                        help='figure size in inches (default: %s %s)' %
+                             DEFAULT_SIZE)
+    parser.add_argument('--dpi', type=int, default=DEFAULT_DPI,
+                        help='resolution (default: %(default)s)')
+    parser.add_argument('--interactive-dpi', type=int,
+                        default=INTERACTIVE_DPI,
+                        help='resolution of reduced frames '
+                             '(default: %(default)s)')
+    args = parser.parse_args(argv)
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error('unknown suite(s): %s' % ', '.join(sorted(unknown)))
+
+    document = run(args.suites, tuple(args.points), tuple(args.size),
+                   args.dpi, sys.stdout, args.interactive_dpi)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(document, f, indent=1, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(document, baseline, args.tolerance)
+        for key, message in regressions:
+            sys.stderr.write('REGRESSION %s: %s\n' % (key, message))
+        if regressions:
+            return 1
+    return 1 if any('error' in result
+                    for result in document['results'].values()) else 0
@@ -0,0 +1,120 @@
+import numpy as np
+
+from instrumentation import Profiler
+
+
+class BlitOverlay(object):
+    """
+    Overlay layer drawn on top of a cached background with blitting.
+
+    The background bitmap is captured after every full render of the figure
+    (``draw_event``).  Artists registered with the overlay are marked as
+    animated, so they are skipped by full renders and only ever drawn here by
+    restoring the background and blitting the dirty rectangles, i.e. the
+    union of the regions the artists covered before and after the update.
+    Drawing and blitting are timed with profiler, when given.
+    """
+
+    def __init__(self, canvas, profiler=None):
+        self.canvas = canvas
+        self.profiler = profiler or Profiler(enabled=False)
+        self.background = None
+        self.artists = []
+        self._extents = {}
+        self.connect()
+
+    def connect(self):
+        """
+        Follows the full renders of the figure on the canvas; called again
+        when another figure is swapped into the canvas, as the figure holds
+        the event connections
+        """
+        self._cid = self.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def on_draw(self, event):
+        """
+        Callback for full renders, caches the background and redraws overlay
+        """
+        with self.profiler.timer('overlay'):
+            self.background = self.canvas.copy_from_bbox(
+                    self.canvas.figure.bbox)
+            self._extents = {}
+            self._draw_artists(self.artists)
+
+    def add_artist(self, artist):
+        """
+        Registers an artist to be drawn on the overlay
+        """
+        if artist in self.artists:
+            return artist
+        artist.set_animated(True)
+        self.artists.append(artist)
+        return artist
+
+    def remove_artist(self, artist):
+        """
+        Unregisters an artist, erasing it from the screen
+        """
+        self.remove_artists([artist])
+
+    def remove_artists(self, artists):
+        """
+        Unregisters artists, erasing them from the screen in one update
+        """
+        dirty = []
+        for artist in artists:
+            if artist not in self.artists:
+                continue
+            self.artists.remove(artist)
+            if id(artist) in self._extents:
+                dirty.append(self._extents.pop(id(artist)))
+            artist.remove()
+        if dirty and self.background is not None:
+            with self.profiler.timer('overlay'):
+                self.canvas.restore_region(self.background)
+                self._draw_artists(self.artists)
+                self._blit(dirty)
+
+    def clear(self):
+        """
+        Forgets all artists and the cached background, used after the axes
+        have been cleared
+        """
+        self.artists = []
+        self._extents = {}
+        self.background = None
+
+    def update(self, artists=None):
+        """
+        Redraws the given overlay artists (all of them by default), blitting
+        only the regions that changed
+        """
+        if self.background is None:
+            return
+        if artists is None:
+            artists = self.artists
+        dirty = [self._extents.pop(id(artist)) for artist in artists
+                 if id(artist) in self._extents]
+
+        with self.profiler.timer('overlay'):
+            self.canvas.restore_region(self.background)
+            self._draw_artists(self.artists)
+            dirty.extend(self._extents[id(artist)] for artist in artists
+                         if id(artist) in self._extents)
+            self._blit(dirty)
+
+    def _blit(self, bboxes):
+        with self.profiler.timer('blit'):
+            for bbox in bboxes:
+                self.canvas.blit(bbox)
+
+    def _draw_artists(self, artists):
+        renderer = self.canvas.get_renderer()
+        for artist in artists:
+            if not artist.get_visible():
+                continue
+            artist.draw(renderer)
+            extent = artist.get_window_extent(renderer)
+            # empty artists (e.g. a scatter with no offsets) have no extent
+            if np.all(np.isfinite(extent.bounds)):
+                self._extents[id(artist)] = extent.expanded(1.1, 1.1)
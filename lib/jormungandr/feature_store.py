@@ -0,0 +1,146 @@
+import hashlib
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from lod import LodPolylines
+from lod import dp_importance
+
+FEATURE_STORE_DIR = os.path.join(os.path.expanduser('~'), '.jormungandr',
+                                 'features')
+FORMAT_VERSION = 1
+EARTH_RADIUS_KM = 6371.0088
+
+# arrays stored per dataset, each as an uncompressed .npy so it can be
+# memory-mapped
+ARRAYS = ('vertices', 'offsets', 'areas', 'importance')
+
+
+def ring_areas(vertices, offsets):
+    """
+    Areas [km^2] on the sphere enclosed by the lines stored back to back in
+    vertices, line i spanning offsets[i]:offsets[i + 1].  Lines that don't
+    close on themselves enclose nothing and get an infinite area, so no area
+    threshold removes them.
+    """
+    if not len(vertices):
+        return np.empty(0)
+    lon = np.radians(vertices[:, 0])
+    lat = np.radians(vertices[:, 1])
+    sin_lat = np.sin(lat)
+
+    # one term per edge; the edges joining consecutive lines are zeroed
+    dlon = (np.diff(lon) + np.pi) % (2.0 * np.pi) - np.pi
+    terms = np.append(dlon * (2.0 + sin_lat[:-1] + sin_lat[1:]), 0.0)
+    terms[offsets[1:-1] - 1] = 0.0
+    areas = np.abs(np.add.reduceat(terms, offsets[:-1])) * \
+        EARTH_RADIUS_KM ** 2 / 2.0
+
+    closed = np.all(vertices[offsets[:-1]] == vertices[offsets[1:] - 1],
+                    axis=1)
+    return np.where(closed, areas, np.inf)
+
+
+class FeatureSet(object):
+    """
+    The preprocessed lines of one dataset: vertices and line offsets, the
+    area enclosed by each line and the Douglas-Peucker importance of each
+    vertex.
+
+    Subsets above an area threshold are vectorized masks over the arrays,
+    and are kept as LodPolylines per threshold, so their levels of detail and
+    projected copies survive layers being toggled off and on.
+    """
+
+    def __init__(self, vertices, offsets, areas, importance):
+        self.vertices = vertices
+        self.offsets = offsets
+        self.areas = areas
+        self.importance = importance
+        self._lods = {}
+        self._lock = threading.Lock()
+
+    @property
+    def count(self):
+        return len(self.offsets) - 1
+
+    def lod(self, area_threshold=0.0):
+        """
+        LodPolylines of the lines enclosing at least area_threshold [km^2]
+        """
+        area_threshold = float(area_threshold or 0.0)
+        with self._lock:
+            lod = self._lods.get(area_threshold)
+            if lod is None:
+                lod = self._lods[area_threshold] = self._subset(area_threshold)
+            return lod
+
+    def _subset(self, area_threshold):
+        keep = self.areas >= area_threshold
+        counts = np.diff(self.offsets)
+        if keep.all():
+            return LodPolylines.from_arrays(self.vertices, self.offsets,
+                                            self.importance)
+        vertices = np.repeat(keep, counts)
+        return LodPolylines.from_arrays(
+            self.vertices[vertices],
+            np.cumsum(np.concatenate(([0], counts[keep]))),
+            self.importance[vertices])
+
+
+class FeatureStore(object):
+    """
+    On-disk cache of line datasets preprocessed into NumPy arrays.
+
+    Each source file is read, flattened and analysed once; the arrays are
+    written to a directory keyed by the source's path, size and
+    modification time, and memory-mapped from there afterwards.
+    """
+
+    def __init__(self, cache_dir=FEATURE_STORE_DIR):
+        self.cache_dir = cache_dir
+
+    def path(self, source):
+        stat = os.stat(source)
+        key = hashlib.sha1(('%s:%d:%d:%d' % (
+            os.path.abspath(source), stat.st_size, stat.st_mtime,
+            FORMAT_VERSION)).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, source, read_lines):
+        """
+        The FeatureSet of source; read_lines() returns its lines as (n, 2)
+        lon/lat arrays and is only called when the store has no copy
+        """
+        directory = self.path(source)
+        try:
+            return FeatureSet(**dict(
+                (name, np.load(os.path.join(directory, name + '.npy'),
+                               mmap_mode='r'))
+                for name in ARRAYS))
+        except (IOError, OSError, ValueError):
+            pass
+
+        lines = [np.asarray(line, dtype=float)[:, :2] for line in read_lines()
+                 if len(line) >= 2]
+        vertices = np.concatenate(lines) if lines else np.empty((0, 2))
+        offsets = np.cumsum([0] + [len(line) for line in lines])
+        features = FeatureSet(vertices, offsets, ring_areas(vertices, offsets),
+                              dp_importance(vertices, offsets))
+        self._store(directory, features)
+        return features
+
+    def _store(self, directory, features):
+        temp = '%s.%d.tmp' % (directory, threading.current_thread().ident)
+        try:
+            if not os.path.isdir(temp):
+                os.makedirs(temp)
+            for name in ARRAYS:
+                np.save(os.path.join(temp, name + '.npy'),
+                        getattr(features, name))
+            os.rename(temp, directory)
+        except OSError:
+            # the store is an optimization only
+            shutil.rmtree(temp, ignore_errors=True)
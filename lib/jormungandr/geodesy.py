@@ -0,0 +1,234 @@
+import numpy as np
+
+from pyproj import Geod
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+
+# Karney's solution, used only where Vincenty's inverse does not converge
+# (nearly antipodal points)
+WGS84_GEOD = Geod(a=WGS84_A, f=WGS84_F)
+
+MAX_ITERATIONS = 200
+TOLERANCE = 1e-12
+
+NUM_RING_VERTICES = 256
+NUM_PATH_VERTICES = 128
+
+
+def _series(u2):
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    return A, B
+
+
+def _delta_sigma(B, sin_sigma, cos_sigma, cos_2sm):
+    return B * sin_sigma * (cos_2sm + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sm ** 2) -
+        B / 6 * cos_2sm * (-3 + 4 * sin_sigma ** 2) *
+        (-3 + 4 * cos_2sm ** 2)))
+
+
+def wrap_lon(lon):
+    """
+    Wraps longitudes into [-180, 180)
+    """
+    return (np.asarray(lon, dtype=float) + 180.0) % 360.0 - 180.0
+
+
+def direct(lat1, lon1, azimuth, distance):
+    """
+    Solves the direct geodesic problem on the WGS84 ellipsoid (Vincenty).
+
+    All arguments broadcast against each other.  Angles are in degrees,
+    distance in meters.  Returns lat2, lon2 and the forward azimuth at the
+    destination; lon2 is continuous with lon1 (not wrapped).
+    """
+    lat1, lon1, azimuth, distance = np.broadcast_arrays(
+        *[np.asarray(value, dtype=float) for value in
+          (lat1, lon1, azimuth, distance)])
+    f = WGS84_F
+    alpha1 = np.radians(azimuth)
+    sin_alpha1 = np.sin(alpha1)
+    cos_alpha1 = np.cos(alpha1)
+
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    sin_U1 = np.sin(U1)
+    cos_U1 = np.cos(U1)
+    sigma1 = np.arctan2(np.tan(U1), cos_alpha1)
+    sin_alpha = cos_U1 * sin_alpha1
+    cos2_alpha = 1 - sin_alpha ** 2
+    A, B = _series(cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2)
+
+    sigma = distance / (WGS84_B * A)
+    for _ in range(MAX_ITERATIONS):
+        cos_2sm = np.cos(2 * sigma1 + sigma)
+        sin_sigma = np.sin(sigma)
+        cos_sigma = np.cos(sigma)
+        previous = sigma
+        sigma = distance / (WGS84_B * A) + _delta_sigma(
+            B, sin_sigma, cos_sigma, cos_2sm)
+        if np.all(np.abs(sigma - previous) < TOLERANCE):
+            break
+
+    sin_sigma = np.sin(sigma)
+    cos_sigma = np.cos(sigma)
+    cos_2sm = np.cos(2 * sigma1 + sigma)
+    tmp = sin_U1 * sin_sigma - cos_U1 * cos_sigma * cos_alpha1
+    lat2 = np.arctan2(
+        sin_U1 * cos_sigma + cos_U1 * sin_sigma * cos_alpha1,
+        (1 - f) * np.hypot(sin_alpha, tmp))
+    lam = np.arctan2(sin_sigma * sin_alpha1,
+                     cos_U1 * cos_sigma - sin_U1 * sin_sigma * cos_alpha1)
+    C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+    L = lam - (1 - C) * f * sin_alpha * (sigma + C * sin_sigma * (
+        cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+    azimuth2 = np.arctan2(sin_alpha, -tmp)
+    return np.degrees(lat2), lon1 + np.degrees(L), np.degrees(azimuth2)
+
+
+def inverse(lat1, lon1, lat2, lon2):
+    """
+    Solves the inverse geodesic problem on the WGS84 ellipsoid (Vincenty).
+
+    All arguments broadcast against each other and are in degrees.  Returns
+    the distance in meters and the forward azimuths at both ends, as scalars
+    for scalar arguments.  Nearly antipodal pairs, for which the iteration
+    does not converge, are solved with Karney's method instead.
+    """
+    scalar = all(np.ndim(value) == 0 for value in (lat1, lon1, lat2, lon2))
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(value, dtype=float)) for value in
+          (lat1, lon1, lat2, lon2)])
+    f = WGS84_F
+    L = np.radians(wrap_lon(lon2 - lon1))
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sin_U1, cos_U1 = np.sin(U1), np.cos(U1)
+    sin_U2, cos_U2 = np.sin(U2), np.cos(U2)
+
+    lam = L
+    converged = np.zeros(L.shape, dtype=bool)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for _ in range(MAX_ITERATIONS):
+            sin_lam = np.sin(lam)
+            cos_lam = np.cos(lam)
+            sin_sigma = np.hypot(cos_U2 * sin_lam,
+                                 cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lam)
+            cos_sigma = sin_U1 * sin_U2 + cos_U1 * cos_U2 * cos_lam
+            sigma = np.arctan2(sin_sigma, cos_sigma)
+            sin_alpha = np.where(sin_sigma == 0, 0.0,
+                                 cos_U1 * cos_U2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            # equatorial lines have cos2_alpha == 0
+            cos_2sm = np.where(cos2_alpha == 0, 0.0,
+                               cos_sigma - 2 * sin_U1 * sin_U2 / cos2_alpha)
+            C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+            previous = lam
+            lam = L + (1 - C) * f * sin_alpha * (sigma + C * sin_sigma * (
+                cos_2sm + C * cos_sigma * (-1 + 2 * cos_2sm ** 2)))
+            converged = np.abs(lam - previous) < TOLERANCE
+            if np.all(converged):
+                break
+
+    A, B = _series(cos2_alpha * (WGS84_A ** 2 - WGS84_B ** 2) / WGS84_B ** 2)
+    distance = WGS84_B * A * (sigma - _delta_sigma(
+        B, sin_sigma, cos_sigma, cos_2sm))
+    azimuth1 = np.arctan2(cos_U2 * sin_lam,
+                          cos_U1 * sin_U2 - sin_U1 * cos_U2 * cos_lam)
+    azimuth2 = np.arctan2(cos_U1 * sin_lam,
+                          -sin_U1 * cos_U2 + cos_U1 * sin_U2 * cos_lam)
+
+    azimuth1 = np.degrees(azimuth1)
+    azimuth2 = np.degrees(azimuth2)
+    if not np.all(converged):
+        failed = ~converged
+        forward, back, distance[failed] = WGS84_GEOD.inv(
+            lon1[failed], lat1[failed], lon2[failed], lat2[failed])
+        azimuth1[failed] = forward
+        # the forward azimuth at the destination is opposite the back one
+        azimuth2[failed] = wrap_lon(np.asarray(back) + 180.0)
+
+    if scalar:
+        return float(distance[0]), float(azimuth1[0]), float(azimuth2[0])
+    return distance, azimuth1, azimuth2
+
+
+def range_rings(lats, lons, radii, npts=NUM_RING_VERTICES):
+    """
+    Vertices of geodesic circles of radii (meters) around lats/lons.
+
+    Returns an (n, npts, 2) array of lon/lat with longitudes unwrapped along
+    each ring, so rings crossing the antimeridian stay continuous.
+    """
+    lats, lons, radii = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(value, dtype=float)) for value in
+          (lats, lons, radii)])
+    azimuths = np.linspace(0.0, 360.0, npts)
+    lat2, lon2, _ = direct(lats[:, np.newaxis], lons[:, np.newaxis],
+                           azimuths[np.newaxis, :], radii[:, np.newaxis])
+    lon2 = np.degrees(np.unwrap(np.radians(lon2), axis=1))
+    return np.stack((lon2, lat2), axis=-1)
+
+
+def great_circles(lat1, lon1, lat2, lon2, npts=NUM_PATH_VERTICES):
+    """
+    Vertices of the geodesics between pairs of points.
+
+    Returns an (n, npts, 2) array of lon/lat with longitudes unwrapped along
+    each path.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        *[np.atleast_1d(np.asarray(value, dtype=float)) for value in
+          (lat1, lon1, lat2, lon2)])
+    distance, azimuth, _ = inverse(lat1, lon1, lat2, lon2)
+    fractions = np.linspace(0.0, 1.0, npts)
+    lats, lons, _ = direct(lat1[:, np.newaxis], lon1[:, np.newaxis],
+                           azimuth[:, np.newaxis],
+                           distance[:, np.newaxis] * fractions)
+    lons = np.degrees(np.unwrap(np.radians(lons), axis=1))
+    return np.stack((lons, lats), axis=-1)
+
+
+def ring_polygons(rings):
+    """
+    Turns rings from range_rings into polygons for a lon/lat map.
+
+    Rings enclosing a pole are closed along that pole, and every polygon
+    extending past the antimeridian gets a copy shifted by 360 degrees so
+    both sides of the map are covered.
+    """
+    polygons = []
+    for ring in rings:
+        winding = ring[-1, 0] - ring[0, 0]
+        if abs(winding) > 180.0:
+            # encloses a pole: the ring sweeps all longitudes
+            pole = 90.0 if np.mean(ring[:, 1]) > 0 else -90.0
+            ring = np.vstack((ring, [[ring[-1, 0], pole], [ring[0, 0], pole]]))
+        polygons.extend(_antimeridian_copies(ring))
+    return polygons
+
+
+def path_segments(paths):
+    """
+    Turns paths from great_circles into line segments for a lon/lat map,
+    adding shifted copies of paths that extend past the antimeridian
+    """
+    segments = []
+    for path in paths:
+        segments.extend(_antimeridian_copies(path))
+    return segments
+
+
+def _antimeridian_copies(vertices):
+    # shift the whole shape so that it starts inside the map
+    vertices = vertices.copy()
+    vertices[:, 0] -= 360.0 * np.floor((vertices[0, 0] + 180.0) / 360.0)
+    copies = [vertices]
+    if vertices[:, 0].max() > 180.0:
+        copies.append(vertices - [360.0, 0.0])
+    if vertices[:, 0].min() < -180.0:
+        copies.append(vertices + [360.0, 0.0])
+    return copies
@@ -0,0 +1,76 @@
+import numpy as np
+
+from matplotlib.collections import LineCollection
+
+# number of vertices used to trace each grid line on curved projections
+NUM_CURVED_VERTICES = 90
+
+# projected coordinates beyond this are treated as off the map (Basemap
+# reports points outside the projection domain as 1e30)
+INVALID_COORDINATE = 1e20
+
+
+class Graticule(object):
+    """
+    Meridians and parallels drawn as one solid black and one dashed white
+    LineCollection.
+
+    The collections are added to the axes once, on construction.  Zoom
+    changes only replace their segments in place, so no artists are added or
+    removed during interaction.
+    """
+
+    def __init__(self, ax, linewidth=0.2):
+        self.ax = ax
+        self.black = LineCollection([], linewidths=linewidth, colors='black',
+                                    linestyles='solid')
+        self.white = LineCollection([], linewidths=linewidth, colors='white',
+                                    linestyles=(0, (1, 1)))
+        self.ax.add_collection(self.black, autolim=False)
+        self.ax.add_collection(self.white, autolim=False)
+
+    def set_visible(self, visible):
+        self.black.set_visible(visible)
+        self.white.set_visible(visible)
+
+    def update(self, lons, lats, lon_extent, lat_extent, transform=None):
+        """
+        Replaces the segments with meridians at lons and parallels at lats,
+        spanning lon_extent and lat_extent, both (min, max) in degrees.
+
+        transform maps lon/lat arrays to axes data coordinates.  Without one
+        the axes are assumed cylindrical and each line is a single segment.
+        """
+        lons = np.asarray(lons, dtype=float)
+        lats = np.asarray(lats, dtype=float)
+        npts = 2 if transform is None else NUM_CURVED_VERTICES
+
+        # meridians: constant lon, lat sweeping the extent
+        sweep = np.linspace(lat_extent[0], lat_extent[1], npts)
+        mer_lon = np.repeat(lons[:, np.newaxis], npts, axis=1)
+        mer_lat = np.broadcast_to(sweep, mer_lon.shape)
+
+        # parallels: constant lat, lon sweeping the extent
+        sweep = np.linspace(lon_extent[0], lon_extent[1], npts)
+        par_lat = np.repeat(lats[:, np.newaxis], npts, axis=1)
+        par_lon = np.broadcast_to(sweep, par_lat.shape)
+
+        x = np.concatenate((mer_lon, par_lon))
+        y = np.concatenate((mer_lat, par_lat))
+        if transform is not None:
+            shape = x.shape
+            x, y = transform(x.ravel(), y.ravel())
+            x = np.asarray(x, dtype=float).reshape(shape)
+            y = np.asarray(y, dtype=float).reshape(shape)
+            invalid = (np.abs(x) > INVALID_COORDINATE) | \
+                (np.abs(y) > INVALID_COORDINATE)
+            x[invalid] = np.nan
+            y[invalid] = np.nan
+
+        segments = np.stack((x, y), axis=-1)
+        self.black.set_segments(segments)
+        self.white.set_segments(segments)
+
+    def clear(self):
+        self.black.set_segments([])
+        self.white.set_segments([])
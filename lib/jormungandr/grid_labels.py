@@ -0,0 +1,91 @@
+import numpy as np
+
+DEGREE_SIGN = u'\N{DEGREE SIGN}'
+
+# number of Text artists each pool starts with
+LABEL_POOL_SIZE = 32
+
+
+def wrap_lon(lon):
+    """
+    Wraps longitudes into [-180, 180], leaving values already in range alone
+    """
+    lon = np.asarray(lon, dtype=float)
+    east = np.maximum(np.ceil((lon - 180.0) / 360.0), 0.0)
+    west = np.maximum(np.ceil((-180.0 - lon) / 360.0), 0.0)
+    return lon - 360.0 * east + 360.0 * west
+
+
+def to_dms(deg):
+    """
+    Converts degrees to degrees minutes seconds
+    """
+    deg = np.asarray(deg, dtype=float)
+
+    # round to micro-arc-seconds first, so a value a hair below a whole
+    # second (a binary fraction of a degree) carries into the minutes
+    seconds = np.round(np.abs(deg) * 3600.0, 6)
+    d = np.floor(seconds / 3600.0)
+    m = np.floor((seconds - 3600.0 * d) / 60.0)
+    sd = seconds - 3600.0 * d - 60.0 * m
+    return np.copysign(d, deg), m, sd
+
+
+def format_dms(deg, positive, negative, degree_digits=2):
+    """
+    Formats degrees as DDD°MM'SS.SS"H labels, with H the positive or negative
+    hemisphere letter
+    """
+    deg = np.asarray(deg, dtype=float)
+    if deg.size == 0:
+        return np.array([], dtype=str)
+    d, m, sd = to_dms(deg)
+    labels = np.char.mod('%%0%dd' % degree_digits, np.abs(d).astype(int))
+    labels = np.char.add(labels, DEGREE_SIGN)
+    labels = np.char.add(labels, np.char.mod('%02d', m.astype(int)))
+    labels = np.char.add(labels, "'")
+    labels = np.char.add(labels, np.char.mod('%05.2f', sd))
+    labels = np.char.add(labels, '"')
+    return np.char.add(labels, np.where(deg >= 0, positive, negative))
+
+
+class LabelPool(object):
+    """
+    Fixed pool of Text artists reused for grid labels.
+
+    Updating the labels moves and re-texts the pooled artists and hides the
+    ones that aren't needed, rather than creating and removing artists.
+    on_create, when given, is called with each Text the pool creates.
+    """
+
+    def __init__(self, ax, size=LABEL_POOL_SIZE, on_create=None, **kwargs):
+        self.ax = ax
+        self.kwargs = kwargs
+        self.on_create = on_create
+        self.texts = []
+        self._grow(size)
+
+    def _grow(self, size):
+        while len(self.texts) < size:
+            text = self.ax.text(0, 0, '', visible=False, **self.kwargs)
+            self.texts.append(text)
+            if self.on_create:
+                self.on_create(text)
+
+    def set_labels(self, xs, ys, labels):
+        """
+        Shows labels at xs, ys and hides the rest of the pool
+        """
+        if len(labels) > len(self.texts):
+            self._grow(2 * len(labels))
+        for text, x, y, label in zip(self.texts, xs, ys, labels):
+            text.set_position((x, y))
+            text.set_text(label)
+            text.set_visible(True)
+        for text in self.texts[len(labels):]:
+            if not text.get_visible():
+                break
+            text.set_visible(False)
+
+    def hide(self):
+        self.set_labels([], [], [])
@@ -0,0 +1,98 @@
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from grid_labels import format_dms
+
+# DMS-friendly grid intervals in arc-seconds, finest first
+NICE_STEPS = np.array([
+    0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 15.0, 30.0,
+    60.0, 120.0, 300.0, 600.0, 900.0, 1800.0,
+    3600.0, 7200.0, 18000.0, 36000.0, 54000.0, 108000.0, 162000.0,
+    324000.0])
+
+# roughly how many lines to show across the viewport
+TARGET_LINES = 5
+
+# zoom buckets per halving of the viewport span
+BUCKETS_PER_OCTAVE = 4
+
+# labels kept in the label cache
+LABEL_CACHE_SIZE = 4096
+
+
+class GridSpacing(object):
+    """
+    Picks graticule intervals from the viewport span and lays out the
+    visible lines by arithmetic.
+
+    The span is quantized into logarithmic zoom buckets.  Each bucket's
+    interval, the one in NICE_STEPS closest in ratio to the bucket's mid
+    span over target_lines, is cached, so picking the interval is a
+    dictionary lookup at any zoom.  The visible lines
+    are the multiples of the interval inside the view, so the cost follows
+    the number of lines drawn, not the zoom level.  Labels are cached by
+    position, since panning at a fixed zoom keeps reusing the same lines.
+    """
+
+    def __init__(self, target_lines=TARGET_LINES,
+                 buckets_per_octave=BUCKETS_PER_OCTAVE,
+                 label_cache_size=LABEL_CACHE_SIZE):
+        self.target_lines = target_lines
+        self.buckets_per_octave = buckets_per_octave
+        self.label_cache_size = label_cache_size
+        self._steps = {}
+        self._labels = OrderedDict()
+
+    def bucket(self, span):
+        return int(math.floor(math.log(max(span, 1e-9), 2) *
+                              self.buckets_per_octave))
+
+    def step(self, span):
+        """
+        Grid interval in arc-seconds for a viewport span in degrees
+        """
+        bucket = self.bucket(span)
+        step = self._steps.get(bucket)
+        if step is None:
+            mid = 2.0 ** ((bucket + 0.5) / self.buckets_per_octave)
+            ideal = 3600.0 * mid / self.target_lines
+            index = np.argmin(np.abs(np.log(NICE_STEPS / ideal)))
+            step = self._steps[bucket] = float(NICE_STEPS[index])
+        return step
+
+    def lines(self, lo, hi, step=None):
+        """
+        Positions, in degrees, of the grid lines between lo and hi
+        """
+        if hi < lo:
+            lo, hi = hi, lo
+        if step is None:
+            step = self.step(hi - lo)
+        first = math.ceil(lo * 3600.0 / step - 1e-9)
+        last = math.floor(hi * 3600.0 / step + 1e-9)
+        return np.arange(first, last + 1) * step / 3600.0
+
+    def labels(self, degrees, positive, negative, degree_digits=2):
+        """
+        DMS labels for grid line positions, formatting only the positions
+        not seen recently
+        """
+        keys = [(positive, degree_digits, key) for key in
+                np.round(np.asarray(degrees) * 360000.0).astype(np.int64)
+                .tolist()]
+        missing = [index for index, key in enumerate(keys)
+                   if key not in self._labels]
+        if missing:
+            formatted = format_dms(np.asarray(degrees)[missing], positive,
+                                   negative, degree_digits)
+            for index, label in zip(missing, formatted.tolist()):
+                self._labels[keys[index]] = label
+        labels = []
+        for key in keys:
+            self._labels.move_to_end(key)
+            labels.append(self._labels[key])
+        while len(self._labels) > self.label_cache_size:
+            self._labels.popitem(last=False)
+        return labels
@@ -0,0 +1,144 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import wx
+from wx.lib.embeddedimage import PyEmbeddedImage
+
+import numpy as np
+from matplotlib.image import imread
+
+# decoded images kept in memory, in bytes of pixel data
+IMAGE_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class ImageCache(object):
+    """
+    Least-recently-used cache of decoded RGBA arrays keyed by a digest of
+    the encoded content.
+
+    The arrays are made read-only so that a single decoded image can be
+    shared by any number of artists.  Entries are evicted oldest first once
+    the total pixel data exceeds max_bytes; an image larger than the whole
+    budget is returned without being cached.
+    """
+
+    def __init__(self, max_bytes=IMAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, decode):
+        """
+        Cached array for key, calling decode() to build it on a miss
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        array = decode()
+        array.flags.writeable = False
+        if array.nbytes > self.max_bytes:
+            return array
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = array
+                self.nbytes += array.nbytes
+                while self.nbytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.nbytes -= evicted.nbytes
+            return self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = ImageCache()
+
+
+def _digest(*parts):
+    sha = hashlib.sha1()
+    for part in parts:
+        sha.update(part)
+    return sha.hexdigest()
+
+
+def as_rgba(array):
+    """
+    Normalizes a decoded grey, grey-alpha, RGB or RGBA image, with float
+    (0-1) or integer samples, to an (h, w, 4) uint8 array
+    """
+    array = np.asarray(array)
+    if array.dtype.kind == 'f':
+        array = np.round(np.clip(array, 0.0, 1.0) * 255).astype(np.uint8)
+    elif array.dtype != np.uint8:
+        # 16-bit samples
+        array = (array >> 8).astype(np.uint8)
+    if array.ndim == 2:
+        array = array[..., np.newaxis]
+    color = 1 if array.shape[2] < 3 else 3
+    rgba = np.empty(array.shape[:2] + (4,), dtype=np.uint8)
+    rgba[..., :3] = array[..., :color]
+    rgba[..., 3] = array[..., color] if array.shape[2] > color else 255
+    return rgba
+
+
+def png_to_rgba(data):
+    """
+    Decodes PNG bytes to an (h, w, 4) uint8 array without touching the
+    filesystem
+    """
+    return _cache.get(_digest(b'png', data), lambda: as_rgba(
+        imread(io.BytesIO(data), format='png')))
+
+
+def bitmap_to_rgba(bitmap):
+    """
+    Converts a wx.Bitmap (or wx.Image) to an (h, w, 4) uint8 array
+    """
+    image = bitmap if isinstance(bitmap, wx.Image) else \
+        bitmap.ConvertToImage()
+    width, height = image.GetWidth(), image.GetHeight()
+    rgb = bytes(image.GetData())
+    alpha = bytes(image.GetAlpha()) if image.HasAlpha() else b''
+
+    def decode():
+        rgba = np.empty((height, width, 4), dtype=np.uint8)
+        rgba[..., :3] = np.frombuffer(rgb, np.uint8).reshape(height,
+                                                             width, 3)
+        rgba[..., 3] = np.frombuffer(alpha, np.uint8).reshape(
+            height, width) if alpha else 255
+        return rgba
+
+    return _cache.get(_digest(b'bitmap', str(image.GetSize()).encode(),
+                              rgb, alpha), decode)
+
+
+def load_image(image):
+    """
+    (h, w, 4) uint8 array for an embedded image, a PNG file name, PNG
+    bytes, a wx bitmap or image, or an array (returned unchanged)
+    """
+    if isinstance(image, PyEmbeddedImage):
+        return png_to_rgba(image.GetData())
+    if isinstance(image, str):
+        with open(image, 'rb') as f:
+            return png_to_rgba(f.read())
+    if isinstance(image, bytes):
+        return png_to_rgba(image)
+    if isinstance(image, (wx.Bitmap, wx.Image)):
+        return bitmap_to_rgba(image)
+    return image
@@ -0,0 +1,270 @@
+import csv
+import itertools
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+CHUNK_ROWS = 100000
+CACHE_SUFFIX = '.cache'
+CACHE_VERSION = 1
+FALLBACK_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.jormungandr',
+                                  'ingest')
+
+LAT_NAMES = ('lat', 'latitude', 'geodetic_latitude')
+LON_NAMES = ('lon', 'long', 'longitude')
+TIME_NAMES = ('time', 'timestamp', 'datetime', 'epoch')
+ID_NAMES = ('id', 'name', 'callsign', 'track')
+
+# cells read as NaN in numeric columns, ignoring case and blanks
+MISSING_VALUES = ('', 'na', 'n/a', 'nan', 'null', 'none')
+
+
+class ColumnStore(object):
+    """
+    Columns of a position log, memory-mapped from a columnar cache.
+
+    Numeric columns are float64 arrays, missing values NaN.  Text columns are dictionary-encoded
+    as int32 codes, with the distinct values in labels[name].
+    """
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.meta = meta
+        self.rows = meta['rows']
+        self.names = [column['name'] for column in meta['columns']]
+        self.labels = dict((column['name'], column['labels'])
+                           for column in meta['columns']
+                           if 'labels' in column)
+        self.columns = {}
+        for index, column in enumerate(meta['columns']):
+            path = os.path.join(directory, '%d.bin' % index)
+            if self.rows:
+                self.columns[column['name']] = np.memmap(
+                    path, dtype=column['dtype'], mode='r', shape=(self.rows,))
+            else:
+                self.columns[column['name']] = np.empty(0, column['dtype'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def find(self, candidates):
+        """
+        Name of the first column matching one of candidates, ignoring case
+        """
+        lowered = dict((name.strip().lower(), name) for name in self.names)
+        for candidate in candidates:
+            if candidate in lowered:
+                return lowered[candidate]
+        raise KeyError('none of the columns %s found' % (candidates,))
+
+    def positions(self):
+        """
+        Longitude and latitude columns
+        """
+        return self[self.find(LON_NAMES)], self[self.find(LAT_NAMES)]
+
+    def times(self):
+        """
+        Time column in seconds, or None if there is none.  Text timestamps
+        (ISO 8601) are converted to seconds since the epoch, once per
+        distinct value.
+        """
+        try:
+            name = self.find(TIME_NAMES)
+        except KeyError:
+            return None
+        if name not in self.labels:
+            return self[name]
+        try:
+            seconds = np.array(self.labels[name], dtype='datetime64[ms]')
+        except ValueError:
+            return None
+        return seconds.astype(np.float64)[self[name]] / 1000.0
+
+    def ids(self):
+        """
+        Entity id column, or None if there is none
+        """
+        try:
+            return self[self.find(ID_NAMES)]
+        except KeyError:
+            return None
+
+
+def _source_stamp(path):
+    stat = os.stat(path)
+    return {'version': CACHE_VERSION, 'size': stat.st_size,
+            'mtime': stat.st_mtime}
+
+
+def cache_path(path):
+    """
+    Cache directory next to the source, or under the user's cache directory
+    when the source's directory is not writable
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    if os.access(directory, os.W_OK):
+        return os.path.abspath(path) + CACHE_SUFFIX
+    return os.path.join(FALLBACK_CACHE_DIR,
+                        os.path.abspath(path).strip(os.sep).replace(
+                            os.sep, '_') + CACHE_SUFFIX)
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, 'meta.json')) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _chunks(reader, ncols, chunk_rows):
+    """
+    The records of a CSV reader, skipping blank lines, as lists of columns
+    of up to chunk_rows values each
+    """
+    while True:
+        rows = list(itertools.islice(reader, chunk_rows))
+        if not rows:
+            return
+        rows = [row for row in rows
+                if row and (len(row) > 1 or row[0].strip())]
+        if set(map(len, rows)) - set([ncols]):
+            found = next(len(row) for row in rows if len(row) != ncols)
+            raise ValueError('expected %d columns, found %d' % (ncols,
+                                                                found))
+        if rows:
+            yield list(zip(*rows))
+
+
+class _TextColumn(Exception):
+    """
+    Raised when a column taken for numeric turns out to hold text
+    """
+
+    def __init__(self, index):
+        Exception.__init__(self, index)
+        self.index = index
+
+
+def _floats(values):
+    """
+    The values of a column as float64, with missing ones NaN; raises
+    ValueError for any other text
+    """
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        return np.array([np.nan if value.strip().lower() in MISSING_VALUES
+                         else value for value in values], dtype=np.float64)
+
+
+def _convert(path, directory, delimiter, chunk_rows, progress, text=()):
+    """
+    Streams the CSV into one raw binary file per column.  Columns whose
+    first chunk is numeric are numeric unless listed in text; _TextColumn
+    is raised if one of them holds text further down.
+    """
+    total = float(max(os.path.getsize(path), 1))
+    parent = os.path.dirname(directory)
+    temp = tempfile.mkdtemp(prefix='.ingest', dir=parent or None)
+    files = []
+    try:
+        with open(path, newline='') as f:
+            reader = csv.reader(f, delimiter=delimiter)
+            header = [name.strip() for name in next(reader, [])]
+            columns = None
+            codes = []
+            rows = 0
+            for table in _chunks(reader, len(header), chunk_rows):
+                if columns is None:
+                    # the first chunk decides each column's type
+                    columns = []
+                    for index, name in enumerate(header):
+                        try:
+                            if index in text:
+                                raise ValueError(name)
+                            _floats(table[index])
+                            columns.append({'name': name, 'dtype': 'float64'})
+                        except ValueError:
+                            columns.append({'name': name, 'dtype': 'int32',
+                                            'labels': []})
+                        codes.append({})
+                        files.append(open(os.path.join(
+                            temp, '%d.bin' % index), 'wb'))
+                for index, column in enumerate(columns):
+                    if 'labels' in column:
+                        values = _encode(table[index], codes[index],
+                                         column['labels'])
+                    else:
+                        try:
+                            values = _floats(table[index])
+                        except ValueError:
+                            raise _TextColumn(index)
+                    values.tofile(files[index])
+                rows += len(table[0])
+                if progress:
+                    progress(min(f.buffer.tell() / total, 1.0))
+            for handle in files:
+                handle.close()
+
+        meta = _source_stamp(path)
+        meta.update({'rows': rows, 'columns': columns or [
+            {'name': name, 'dtype': 'float64'} for name in header]})
+        for index in range(len(meta['columns'])):
+            open(os.path.join(temp, '%d.bin' % index), 'ab').close()
+        with open(os.path.join(temp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        if os.path.isdir(directory):
+            shutil.rmtree(directory)
+        os.rename(temp, directory)
+    except Exception:
+        for handle in files:
+            handle.close()
+        shutil.rmtree(temp, ignore_errors=True)
+        raise
+    return meta
+
+
+def _encode(values, codes, labels):
+    unique, inverse = np.unique(values, return_inverse=True)
+    mapping = np.empty(len(unique), dtype=np.int32)
+    for index, value in enumerate(unique.tolist()):
+        if value not in codes:
+            codes[value] = len(labels)
+            labels.append(value)
+        mapping[index] = codes[value]
+    return mapping[inverse]
+
+
+def load(path, delimiter=',', chunk_rows=CHUNK_ROWS, progress=None):
+    """
+    Opens a CSV position log as a ColumnStore.
+
+    The first load parses the file in chunks of chunk_rows records into a
+    columnar binary cache, so memory use is bounded by the chunk size.  Later
+    loads memory-map the cache directly as long as the source's size and
+    modification time are unchanged.  A column is numeric when all its
+    values are numbers or missing; one found to hold text past the first
+    chunk is read again as text.
+    """
+    directory = cache_path(path)
+    if not os.path.isdir(os.path.dirname(directory)):
+        os.makedirs(os.path.dirname(directory))
+    meta = _read_meta(directory)
+    stamp = _source_stamp(path)
+    if meta is None or any(meta.get(key) != value
+                           for key, value in stamp.items()):
+        text = set()
+        while True:
+            try:
+                meta = _convert(path, directory, delimiter, chunk_rows,
+                                progress, text)
+                break
+            except _TextColumn as error:
+                text.add(error.index)
+    return ColumnStore(directory, meta)
@@ -0,0 +1,199 @@
+import collections
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+# most recent timer samples kept for export
+RING_SIZE = 65536
+HUD_FONT_SIZE = 3
+
+
+class Profiler(object):
+    """
+    Lightweight wall-clock timers for the render hot paths.
+
+    Every timed stage appends (name, start, duration, thread id) to a ring
+    buffer holding the most recent samples, which is cheap enough to leave
+    on.  Stages timed on the GUI thread inside frame() are also collected
+    as that frame's breakdown, which is what the HUD shows.  The breakdown
+    has each stage's self time: the time spent in stages nested in it is
+    only counted for them, so the stages add up to at most the frame.
+    """
+
+    def __init__(self, capacity=RING_SIZE, enabled=True):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.samples = collections.deque(maxlen=capacity)
+        self.frames = 0
+        self.last_frame = None
+        self._stages = None
+        self._nested = None
+        self._frame_thread = None
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        thread = threading.get_ident()
+        stages = self._stages if thread == self._frame_thread else None
+        if stages is not None:
+            # time spent in the stages nested in this one
+            self._nested.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.samples.append((name, start, duration, thread))
+            if stages is not None:
+                nested = self._nested.pop()
+                if self._nested:
+                    self._nested[-1] += duration
+                stages.append((name, duration - nested))
+
+    @contextlib.contextmanager
+    def draw_timers(self, artists):
+        """
+        Times the draws of artists, given as (stage, artist) pairs, within
+        the block
+        """
+        if not self.enabled:
+            yield
+            return
+        wrapped = []
+        for name, artist in artists:
+            if 'draw' not in vars(artist):
+                artist.draw = self._timed_draw(name, artist.draw)
+                wrapped.append(artist)
+        try:
+            yield
+        finally:
+            for artist in wrapped:
+                del artist.draw
+
+    def _timed_draw(self, name, draw):
+        def timed_draw(renderer, *args, **kwargs):
+            with self.timer(name):
+                return draw(renderer, *args, **kwargs)
+        return timed_draw
+
+    @contextlib.contextmanager
+    def frame(self):
+        """
+        Times a whole frame, keeping the stages timed during it as
+        last_frame = (duration, [(stage, duration), ...])
+        """
+        stages = self._stages = []
+        self._nested = []
+        self._frame_thread = threading.get_ident()
+        start = time.perf_counter()
+        try:
+            with self.timer('frame'):
+                yield
+        finally:
+            self._stages = None
+            self.frames += 1
+            self.last_frame = (time.perf_counter() - start,
+                               [stage for stage in stages
+                                if stage[0] != 'frame'])
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.samples)
+
+    def clear(self):
+        with self._lock:
+            self.samples.clear()
+        self.last_frame = None
+
+    def chrome_trace(self):
+        """
+        The samples as a Chrome trace (chrome://tracing, Perfetto) document
+        """
+        pid = os.getpid()
+        return {'displayTimeUnit': 'ms',
+                'traceEvents': [
+                    {'name': name, 'cat': 'render', 'ph': 'X',
+                     'ts': 1e6 * (start - self.origin),
+                     'dur': 1e6 * duration, 'pid': pid, 'tid': thread}
+                    for name, start, duration, thread in self.snapshot()]}
+
+    def export_chrome_trace(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+def timed(name):
+    """
+    Decorates a method to run under self.profiler.timer(name)
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.timer(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class ProfilerHud(object):
+    """
+    Frame time and per-stage self times of the last frame, drawn on the blit
+    overlay in the top-left corner of the axes, followed by the line
+    status() returns, if given
+    """
+
+    def __init__(self, profiler, status=None):
+        self.profiler = profiler
+        self.status = status
+        self.enabled = False
+        self.artist = None
+        self.overlay = None
+
+    def attach(self, ax, overlay):
+        if self.artist is not None:
+            if self.artist in overlay.artists:
+                overlay.remove_artist(self.artist)
+            elif self.artist.axes is not None:
+                self.artist.remove()
+        self.overlay = overlay
+        self.artist = ax.text(
+                0.005, 0.995, '',
+                transform=ax.transAxes,
+                verticalalignment='top',
+                horizontalalignment='left',
+                family='monospace',
+                size=HUD_FONT_SIZE,
+                visible=self.enabled,
+                bbox=dict(facecolor='white', alpha=0.7, pad=0.2, lw=0.2))
+        overlay.add_artist(self.artist)
+
+    def set_enabled(self, enabled):
+        self.enabled = enabled
+        if self.artist is not None:
+            self.artist.set_visible(enabled)
+            self.update(force=True)
+
+    def update(self, force=False):
+        if self.artist is None or not (self.enabled or force):
+            return
+        if self.enabled and self.profiler.last_frame is not None:
+            duration, stages = self.profiler.last_frame
+            totals = collections.OrderedDict()
+            for name, elapsed in stages:
+                totals[name] = totals.get(name, 0.0) + elapsed
+            lines = ['frame %8.2f ms %6.1f fps' % (
+                1000.0 * duration, 1.0 / duration if duration else 0.0)]
+            lines.extend('%-20s %8.2f ms' % (name, 1000.0 * elapsed)
+                         for name, elapsed in totals.items())
+            if self.status:
+                lines.append(self.status())
+            self.artist.set_text('\n'.join(lines))
+        self.overlay.update([self.artist])
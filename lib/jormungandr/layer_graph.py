@@ -0,0 +1,99 @@
+class LayerSpec(object):
+    """
+    A map layer: the plot properties it depends on, the function building
+    it, build(ax, param, **kwargs), which returns the layer, and whether a
+    set of properties turns it on, enabled(param) (always by default).
+    Expensive layers, like ones read from files, are too slow to build on
+    the GUI thread.
+    """
+
+    def __init__(self, name, properties, build, enabled=None,
+                 expensive=False):
+        self.name = name
+        self.properties = frozenset(properties)
+        self.build = build
+        self.enabled = enabled or (lambda param: True)
+        self.expensive = expensive
+
+
+class LayerGraph(object):
+    """
+    The map layers built from the plot properties, each declaring the
+    properties it depends on.
+
+    Diffing the old and new property sets gives the layers to rebuild.  Each
+    layer owns handles to its artists and removes them itself through
+    remove(), so rebuilding one layer leaves every other layer's artists and
+    caches alone.
+    """
+
+    def __init__(self, specs):
+        self.specs = list(specs)
+
+    @property
+    def names(self):
+        return [spec.name for spec in self.specs]
+
+    def spec(self, name):
+        for spec in self.specs:
+            if spec.name == name:
+                return spec
+        raise KeyError(name)
+
+    def enabled(self, param):
+        """
+        Names of the layers param turns on
+        """
+        return [spec.name for spec in self.specs if spec.enabled(param)]
+
+    def changed(self, old, new):
+        """
+        Names of the properties whose values differ between old and new
+        """
+        return set(name for name in set(old) | set(new)
+                   if old.get(name) != new.get(name))
+
+    def affected(self, old, new):
+        """
+        Names of the layers depending on a property that changed
+        """
+        changed = self.changed(old, new)
+        return [spec.name for spec in self.specs if spec.properties & changed]
+
+    def build(self, ax, param, job=None, names=None, **kwargs):
+        """
+        Builds the layers param turns on (of names, when given) on ax,
+        returning them by name
+        """
+        layers = {}
+        for index, spec in enumerate(self.specs):
+            if names is not None and spec.name not in names or \
+                    not spec.enabled(param):
+                continue
+            if job:
+                job.progress(0.9 * index / len(self.specs), spec.name)
+            layer = spec.build(ax, param, job=job, **kwargs)
+            if layer is not None:
+                layers[spec.name] = layer
+        return layers
+
+    def update(self, ax, layers, old, new, defer_expensive=False, **kwargs):
+        """
+        Rebuilds, in layers, the layers affected by going from the old to
+        the new properties, returning their names.  With defer_expensive,
+        affected expensive layers are only removed, for the caller to build
+        elsewhere.
+        """
+        affected = self.affected(old, new)
+        for spec in self.specs:
+            if spec.name not in affected:
+                continue
+            layer = layers.pop(spec.name, None)
+            if layer is not None:
+                layer.remove()
+            if not spec.enabled(new) or defer_expensive and spec.expensive:
+                continue
+            layer = spec.build(ax, new, **kwargs)
+            if layer is not None:
+                layers[spec.name] = layer
+        return affected
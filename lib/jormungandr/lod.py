@@ -0,0 +1,240 @@
+import numpy as np
+
+from matplotlib.collections import LineCollection
+
+from projections import axes_box
+from projections import axes_projection
+
+# tolerance of the finest level, in degrees, and the factor between levels
+MIN_TOLERANCE = 1e-4
+LEVEL_FACTOR = 2.0
+
+
+def segment_distances(points, starts, ends):
+    """
+    Distances from each point to the segment with the matching start and
+    end (all (n, 2) arrays)
+    """
+    direction = ends - starts
+    length2 = np.einsum('ij,ij->i', direction, direction)
+    along = np.einsum('ij,ij->i', points - starts, direction)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(length2 > 0, along / length2, 0.0)
+    nearest = starts + np.clip(t, 0.0, 1.0)[:, np.newaxis] * direction
+    return np.hypot(*(points - nearest).T)
+
+
+def dp_importance(vertices, offsets):
+    """
+    Douglas-Peucker importance of each vertex of a set of polylines, stored
+    back to back in vertices with line i spanning offsets[i]:offsets[i + 1].
+
+    A vertex survives simplification at tolerance tol exactly when its
+    importance is >= tol, so every level of detail is a mask over one
+    precomputed array.  Endpoints are always kept.  All the open intervals
+    of one recursion depth, across every line, are split in a single
+    vectorized pass.
+    """
+    importance = np.zeros(len(vertices))
+    first = offsets[:-1].copy()
+    last = offsets[1:] - 1
+    importance[first] = np.inf
+    importance[last] = np.inf
+    parent = np.full(len(first), np.inf)
+
+    while True:
+        open_ = last - first > 1
+        first, last, parent = first[open_], last[open_], parent[open_]
+        if not len(first):
+            return importance
+
+        # interior vertices of every interval, and the interval of each
+        lengths = last - first - 1
+        bounds = np.cumsum(lengths) - lengths
+        interval = np.repeat(np.arange(len(first)), lengths)
+        index = (np.arange(lengths.sum()) - bounds[interval] +
+                 first[interval] + 1)
+        distances = segment_distances(vertices[index],
+                                      vertices[first[interval]],
+                                      vertices[last[interval]])
+
+        # farthest vertex of each interval (first one on ties)
+        farthest = np.maximum.reduceat(distances, bounds)
+        candidates = np.flatnonzero(distances == farthest[interval])
+        _, pick = np.unique(interval[candidates], return_index=True)
+        split = index[candidates[pick]]
+
+        # children can't outlive their parent split
+        value = np.minimum(farthest, parent)
+        importance[split] = value
+        first, last = (np.concatenate((first, split)),
+                       np.concatenate((split, last)))
+        parent = np.concatenate((value, value))
+
+
+class LodPolylines(object):
+    """
+    A set of polylines with precomputed Douglas-Peucker levels of detail.
+
+    Level k keeps the vertices whose importance is at least
+    MIN_TOLERANCE * LEVEL_FACTOR**k, i.e. it is never more than that far
+    from the full-resolution line.  Segment lists are built per level on
+    first use and cached.
+
+    For other projections the vertices are transformed in bulk once per
+    projection, and each level's segments are masks over that copy, split
+    where a line jumps across the edge of the map.
+    """
+
+    def __init__(self, lines, min_tolerance=MIN_TOLERANCE,
+                 level_factor=LEVEL_FACTOR):
+        lines = [np.asarray(line, dtype=float) for line in lines
+                 if len(line) >= 2]
+        self._setup(np.concatenate(lines) if lines else np.empty((0, 2)),
+                    np.cumsum([0] + [len(line) for line in lines]),
+                    None, min_tolerance, level_factor)
+
+    @classmethod
+    def from_arrays(cls, vertices, offsets, importance=None,
+                    min_tolerance=MIN_TOLERANCE, level_factor=LEVEL_FACTOR):
+        """
+        Polylines stored back to back in vertices, line i spanning
+        offsets[i]:offsets[i + 1], with their importance if already known
+        """
+        lod = cls.__new__(cls)
+        lod._setup(vertices, offsets, importance, min_tolerance, level_factor)
+        return lod
+
+    def _setup(self, vertices, offsets, importance, min_tolerance,
+               level_factor):
+        self.min_tolerance = min_tolerance
+        self.level_factor = level_factor
+        self.offsets = offsets
+        self.vertices = vertices
+        if importance is None:
+            importance = dp_importance(self.vertices, self.offsets)
+        self.importance = importance
+        finite = self.importance[np.isfinite(self.importance)]
+        top = finite.max() if len(finite) else min_tolerance
+        self.max_level = max(0, int(np.ceil(
+            np.log(max(top, min_tolerance) / min_tolerance) /
+            np.log(level_factor))))
+        self._segments = {}
+        self._projected = {}
+
+    def tolerance(self, level):
+        return self.min_tolerance * self.level_factor ** level
+
+    def level_for_tolerance(self, tolerance):
+        """
+        Coarsest level whose error stays within tolerance
+        """
+        if tolerance <= self.min_tolerance:
+            return 0
+        level = int(np.floor(np.log(tolerance / self.min_tolerance) /
+                             np.log(self.level_factor)))
+        return min(level, self.max_level)
+
+    def vertex_count(self, level):
+        return int(np.count_nonzero(
+            self.importance >= self.tolerance(level)))
+
+    def segments(self, level):
+        if level not in self._segments:
+            keep = self.importance >= self.tolerance(level)
+            counts = np.add.reduceat(keep, self.offsets[:-1]) \
+                if len(keep) else np.empty(0, dtype=int)
+            self._segments[level] = np.split(self.vertices[keep],
+                                             np.cumsum(counts)[:-1])
+        return self._segments[level]
+
+    def projected_segments(self, level, projection):
+        """
+        Segments of a level in the map coordinates of a MapProjection
+        """
+        if projection.identity:
+            return self.segments(level)
+        key = (level, projection.cache_key)
+        if key in self._segments:
+            return self._segments[key]
+
+        vertices = self._projected.get(projection.cache_key)
+        if vertices is None:
+            vertices = self._projected[projection.cache_key] = \
+                np.column_stack(projection.project(self.vertices[:, 0],
+                                                   self.vertices[:, 1]))
+        keep = self.importance >= self.tolerance(level)
+
+        # break lines at invalid vertices, at jumps of more than half the
+        # map's width (wrapping around the map), and between lines
+        kept = vertices[keep]
+        line = np.repeat(np.arange(len(self.offsets) - 1),
+                         np.diff(self.offsets))[keep]
+        valid = np.isfinite(kept).all(axis=1)
+        jump = np.abs(np.diff(kept[:, 0])) > 0.5 * projection.x_span
+        breaks = np.flatnonzero((np.diff(line) != 0) | jump |
+                                ~valid[1:] | ~valid[:-1]) + 1
+        pieces = np.split(kept, breaks)
+        starts = np.concatenate(([0], breaks))
+        segments = [piece for piece, start in zip(pieces, starts)
+                    if len(piece) >= 2 and valid[start]]
+        self._segments[key] = segments
+        return segments
+
+
+class PolylineLayer(object):
+    """
+    Draws LodPolylines as one LineCollection at the coarsest level that stays
+    within a pixel of the true lines for the current view
+    """
+
+    def __init__(self, lod, ax=None, pixel=1.0, **kwargs):
+        self.lod = lod
+        self.pixel = pixel
+        self.kwargs = kwargs
+        self.collection = None
+        self.level = None
+        if ax is not None:
+            self.attach(ax)
+
+    def attach(self, ax):
+        if self.collection is not None and self.collection.axes is not None:
+            self.collection.remove()
+        self.ax = ax
+        self.collection = LineCollection([], **self.kwargs)
+        ax.add_collection(self.collection, autolim=False)
+        self.level = None
+
+    def mirror(self, ax):
+        """
+        A layer drawing the same polylines on other axes
+        """
+        return PolylineLayer(self.lod, ax, self.pixel, **self.kwargs)
+
+    def remove(self):
+        if self.collection is not None and self.collection.axes is not None:
+            self.collection.remove()
+        self.collection = None
+        self.level = None
+
+    def set_visible(self, visible):
+        if self.collection is not None:
+            self.collection.set_visible(visible)
+
+    def shown_artists(self):
+        return [self.collection] if self.collection is not None else []
+
+    def update_view(self):
+        x0, x1 = self.ax.get_xlim()
+        y0, y1 = self.ax.get_ylim()
+        projection = axes_projection(self.ax)
+        box = axes_box(self.ax)
+        per_pixel = max(abs(x1 - x0) / max(box.width, 1),
+                        abs(y1 - y0) / max(box.height, 1))
+        level = self.lod.level_for_tolerance(
+            per_pixel * projection.degrees_per_unit * self.pixel)
+        key = (level, projection.cache_key)
+        if key != self.level:
+            self.level = key
+            self.collection.set_segments(
+                self.lod.projected_segments(level, projection))
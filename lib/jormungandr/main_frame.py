@@ -2,28 +2,32 @@ import wx
 import wx.adv
 import os
 import sys
-import yaml
+import time
 
 from wx.lib.wordwrap import wordwrap
 
 SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
 sys.path.insert(0, SCRIPT_PATH)
 
-from plot_panel import PlotPanel
-from propertygrid_panel import PropertyGridPanel
 from splash import Splash
+from preview_panel import PREVIEW_PATH
+from preview_panel import PreviewPanel
+from startup import StartupProfile
+from startup import preload
 
 MEDIA_PATH = os.path.join(os.path.dirname(
     os.path.dirname(SCRIPT_PATH)), 'media')
 ID_FILE_LOAD = wx.ID_ANY
 ID_FILE_SAVE = wx.ID_ANY
 ID_HELP_ABOUT = wx.ID_ANY
+AUTOSAVE_INTERVAL_MS = 60000
 
 
 class MainFrame(wx.Frame):
-    def __init__(self, parent, title):
+    def __init__(self, parent, title, profile=None):
 
         wx.Frame.__init__(self, parent, title=title, size=(1200, 600))
+        self.profile = profile or StartupProfile()
 
         self.splash = Splash(
             os.path.normpath(os.path.join(MEDIA_PATH, "Jormungandr.jpg")),
@@ -52,6 +56,10 @@ class MainFrame(wx.Frame):
         ID_FILE_SAVEAS = wxglade_tmp_menu.Append(
             wx.ID_ANY, "Save &As\tALT+SHIFT+S", "Save this session as...",
             wx.ITEM_NORMAL).GetId()
+        ID_FILE_TRACE = wxglade_tmp_menu.Append(
+            wx.ID_ANY, "Export Render &Trace...",
+            "Save the render timings as a Chrome trace",
+            wx.ITEM_NORMAL).GetId()
         ID_FILE_QUIT = wxglade_tmp_menu.Append(
             wx.ID_ANY, "&Quit\tCTRL+Q", "Quit this session",
             wx.ITEM_NORMAL).GetId()
@@ -65,18 +73,23 @@ class MainFrame(wx.Frame):
         self.frame_1_menubar.Append(wxglade_tmp_menu, "&Help")
         self.SetMenuBar(self.frame_1_menubar)
 
-        # Splitter Window
+        # Splitter Window, holding placeholders and a preview of the last
+        # view until the plotting modules are loaded
         self.sp = wx.SplitterWindow(self, style=wx.SUNKEN_BORDER)
-        self.p2 = PlotPanel(self.sp, self.statusbar)
-        self.p1 = PropertyGridPanel(self.sp, self.p2.updatePlot)
+        self.p1 = wx.Panel(self.sp)
+        self.p2 = PreviewPanel(self.sp, PREVIEW_PATH)
         self.sp.SplitVertically(self.p1, self.p2, 400)
+        self.ready = False
+        self.frame_1_menubar.EnableTop(0, False)
 
         # Event Bindings
         self.Bind(wx.EVT_MENU, self.OnOpen, id=ID_FILE_OPEN)
         self.Bind(wx.EVT_MENU, self.OnSave, id=ID_FILE_SAVE)
         self.Bind(wx.EVT_MENU, self.OnSaveAs, id=ID_FILE_SAVEAS)
+        self.Bind(wx.EVT_MENU, self.OnExportTrace, id=ID_FILE_TRACE)
         self.Bind(wx.EVT_MENU, self.OnExit, id=ID_FILE_QUIT)
         self.Bind(wx.EVT_MENU, self.OnAbout, id=ID_HELP_ABOUT)
+        self.Bind(wx.EVT_CLOSE, self.OnClose)
 
         # Open Menu Wildcard
         self.wildcard = "GUI Save File (*.map)|*.map"
@@ -84,11 +97,59 @@ class MainFrame(wx.Frame):
         # Current Working File
         self.working_file = None
 
-        # update the plot
-        self.p2.plot(self.p1.pg.GetPropertyValues())
-
-        # Set Statusbar text
-        self.statusbar.SetStatusText('Ready')
+        # Sessions are autosaved incrementally next to the working file
+        self.session_writer = None
+        self.autosave_timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, self.OnAutosave, self.autosave_timer)
+
+        # import the plotting modules behind the splash and preview
+        self.statusbar.SetStatusText('Loading...')
+        preload(self.profile, lambda: wx.CallAfter(self.OnModulesLoaded))
+
+    def OnModulesLoaded(self):
+        with self.profile.phase('import plot modules'):
+            from plot_panel import PlotPanel
+            from propertygrid_panel import PropertyGridPanel
+            from session import SessionWriter
+
+        with self.profile.phase('create panels'):
+            plot = PlotPanel(self.sp, self.statusbar,
+                             on_first_frame=self.OnFirstFrame)
+            plot.SetSize(self.p2.GetSize())
+            plot.Hide()
+            properties = PropertyGridPanel(self.sp, plot.updatePlot)
+            self.sp.ReplaceWindow(self.p1, properties)
+            self.p1.Destroy()
+            self.p1 = properties
+
+        # the preview stays up until the plot has rendered off-thread
+        self.plot = plot
+        self._first_render_start = time.perf_counter()
+        plot.updatePlot(self.p1.pg.GetPropertyValues())
+
+        self.session_writer = SessionWriter(
+            on_done=lambda path, error: wx.CallAfter(
+                self.OnSessionSaved, path, error))
+        self.autosave_timer.Start(AUTOSAVE_INTERVAL_MS)
+
+    def OnFirstFrame(self):
+        self.sp.ReplaceWindow(self.p2, self.plot)
+        self.p2.Destroy()
+        self.p2 = self.plot
+        self.p2.Show()
+        self.ready = True
+        self.frame_1_menubar.EnableTop(0, True)
+        self.splash.dismiss()
+        self.profile.record('first render', self._first_render_start,
+                            time.perf_counter())
+        if self.profile.enabled:
+            self.profile.report()
+
+    def OnClose(self, event):
+        # keep the last view as the preview for the next startup
+        if self.ready:
+            self.p2.save_preview(PREVIEW_PATH)
+        event.Skip()
 
     def OnOpen(self, event):
         dlg = wx.FileDialog(self,
@@ -96,24 +157,25 @@ class MainFrame(wx.Frame):
                             defaultDir=os.getcwd(),
                             defaultFile="",
                             wildcard=self.wildcard,
-                            style=wx.OPEN)
+                            style=wx.FD_OPEN)
 
         # Show the dialog and retrieve the user response.  If it is the OK
         # response, process the data.
         if dlg.ShowModal() == wx.ID_OK:
             # This returns a Python list of files that were selected.
             try:
-                with open(dlg.GetPath()) as f:
-                    yaml.full_load(f)
-
-                # Reset Appended Data Objects and create placeholders as needed
+                from session import read_session
+                session = read_session(dlg.GetPath())
 
                 # Set Properties
-                for key, value in d.iteritems():
-                    self.p1.pg.SetPropertyValue(RUN_DATA[key]['pgid'], value)
-                # TODO: This should work, but is not...
-                # self.p1.pg.SetPropertyValues(obj)
-            except:
+                for key, value in session.properties.items():
+                    self.p1.pg.SetPropertyValue(key, value)
+
+                # Layers are only read from the file once they are drawn
+                self.p2.load_session_layers(session.layers)
+                self.working_file = dlg.GetPath()
+                self.p2.updatePlot(self.p1.pg.GetPropertyValues())
+            except Exception:
                 dlg = wx.MessageDialog(self,
                                        'Unable to load input file.',
                                        'Error',
@@ -123,16 +185,33 @@ class MainFrame(wx.Frame):
         # Destroy the dialog.  Do not do this until you are done with it!  BAD
         # things can happen otherwise!
         dlg.Destroy()
-        # TODO: Update Plot...
 
     def OnSave(self, event=None):
         if not self.working_file:
             self.OnSaveAs()
+            return
 
         # Save Data
-        data = self.p1.pg.GetPropertyValues()
-        with open(self.working_file, 'w') as f:
-            f.write(yaml.safe_dump(data, default_flow_style=False))
+        self.statusbar.SetStatusText('Saving %s...' % self.working_file)
+        self.session_writer.save(self.working_file,
+                                 self.p1.pg.GetPropertyValues(),
+                                 self.p2.session_layers())
+
+    def OnAutosave(self, event):
+        from session import autosave_path
+        if not self.ready:
+            return
+        self.session_writer.autosave(autosave_path(self.working_file),
+                                     self.p1.pg.GetPropertyValues(),
+                                     self.p2.session_layers())
+
+    def OnSessionSaved(self, path, error):
+        from session import AUTOSAVE_SUFFIX
+        if error is not None:
+            self.statusbar.SetStatusText('Unable to save %s: %s' %
+                                         (path, error))
+        elif not path.endswith(AUTOSAVE_SUFFIX):
+            self.statusbar.SetStatusText('Saved %s' % path)
 
     def OnSaveAs(self, event=None):
         dlg = wx.FileDialog(
@@ -140,7 +219,7 @@ class MainFrame(wx.Frame):
             defaultDir=os.getcwd(),
             defaultFile="",
             wildcard=self.wildcard,
-            style=wx.SAVE | wx.OVERWRITE_PROMPT)
+            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
 
         # This sets the default filter that the user will initially see.
         # Otherwise, the first filter in the list will be used by default.
@@ -157,6 +236,18 @@ class MainFrame(wx.Frame):
         # things can happen otherwise!
         dlg.Destroy()
 
+    def OnExportTrace(self, event):
+        dlg = wx.FileDialog(
+            self, message="Export render trace as ...",
+            defaultDir=os.getcwd(),
+            defaultFile="render-trace.json",
+            wildcard="Chrome Trace (*.json)|*.json",
+            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT)
+        if dlg.ShowModal() == wx.ID_OK:
+            path = self.p2.profiler.export_chrome_trace(dlg.GetPath())
+            self.statusbar.SetStatusText('Exported %s' % path)
+        dlg.Destroy()
+
     def OnExit(self, event):
         self.Close()
 
@@ -0,0 +1,197 @@
+import os
+import threading
+
+import cartopy
+import cartopy.io.shapereader as shpreader
+import numpy as np
+
+import ingest
+from layer_graph import LayerGraph
+from layer_graph import LayerSpec
+from feature_store import FeatureStore
+from lod import PolylineLayer
+from playback import TimeIndex
+from point_layer import PointLayer
+from projections import get_projection
+from tile_pyramid import TilePyramid
+from tile_pyramid import TiledImageLayer
+
+STOCK_IMAGE = os.path.join(cartopy.config['repo_data_dir'], 'raster',
+                           'natural_earth',
+                           '50-natural-earth-1-downsampled.png')
+
+# property, layer name, and Natural Earth category and dataset
+BORDER_LAYERS = [
+    ('Coastlines', 'coastlines', 'physical', 'coastline'),
+    ('State Borders', 'states', 'cultural', 'admin_1_states_provinces_lines'),
+    ('Country Borders', 'borders', 'cultural', 'admin_0_boundary_lines_land'),
+]
+BORDER_RESOLUTION = '50m'
+
+_PYRAMIDS = {}
+_PYRAMIDS_LOCK = threading.Lock()
+_FEATURES = {}
+_FEATURES_LOCK = threading.Lock()
+_TIME_INDEXES = {}
+_TIME_INDEXES_LOCK = threading.Lock()
+FEATURE_STORE = FeatureStore()
+
+
+def get_pyramid(path):
+    """
+    Returns the shared tile pyramid for a raster
+    """
+    with _PYRAMIDS_LOCK:
+        if path not in _PYRAMIDS:
+            _PYRAMIDS[path] = TilePyramid(path)
+        return _PYRAMIDS[path]
+
+
+def geometry_lines(geometry):
+    """
+    Vertex arrays of the lines (or polygon rings) making up a geometry
+    """
+    if hasattr(geometry, 'geoms'):
+        return [line for part in geometry.geoms
+                for line in geometry_lines(part)]
+    if hasattr(geometry, 'exterior'):
+        return [np.asarray(ring.coords)[:, :2] for ring in
+                [geometry.exterior] + list(geometry.interiors)]
+    return [np.asarray(geometry.coords)[:, :2]]
+
+
+def get_border_lod(category, name, resolution=BORDER_RESOLUTION,
+                   area_threshold=0.0):
+    """
+    Returns the shared levels of detail for a Natural Earth line dataset,
+    without the rings enclosing less than area_threshold [km^2]
+    """
+    key = (category, name, resolution)
+    with _FEATURES_LOCK:
+        if key not in _FEATURES:
+            path = shpreader.natural_earth(resolution=resolution,
+                                           category=category, name=name)
+            _FEATURES[key] = FEATURE_STORE.load(path, lambda: [
+                line for geometry in shpreader.Reader(path).geometries()
+                for line in geometry_lines(geometry)])
+        features = _FEATURES[key]
+    return features.lod(area_threshold)
+
+
+def create_axes(figure, projection=None):
+    """
+    Map axes filling figure, in projection (a MapProjection, plate carree by
+    default), which is kept as the axes' map_projection
+    """
+    if projection is None:
+        projection = get_projection()
+    ax = figure.add_axes([0, 0, 1, 1], frameon=False,
+                         projection=projection.crs)
+    ax.map_projection = projection
+    if not projection.identity:
+        ax.set_global()
+    return ax
+
+
+def base_enabled(param):
+    """
+    Base imagery is shown by default, before the first set of plot
+    properties
+    """
+    return not param or param.get('Blue Marble', False)
+
+
+def build_base(ax, param, base_image=STOCK_IMAGE, job=None):
+    """
+    Base imagery
+    """
+    layer = TiledImageLayer(ax, get_pyramid(base_image))
+    layer.update_view()
+    return layer
+
+
+def border_builder(prop, category, dataset):
+    """
+    Builder of the line layer of a Natural Earth dataset
+    """
+    def build(ax, param, job=None, **kwargs):
+        lod = get_border_lod(category, dataset,
+                             area_threshold=param.get('Area Threshold', 0.0))
+        layer = PolylineLayer(lod, ax, linewidths=0.2, colors='black')
+        layer.update_view()
+        return layer
+    return build
+
+
+def build_input(ax, param, job=None, **kwargs):
+    """
+    The points of the input file
+    """
+    if job:
+        progress = lambda fraction: job.progress(
+            0.9 * fraction, 'Reading input file')
+    else:
+        progress = None
+    lons, lats = ingest.load(param['inputfile'],
+                             progress=progress).positions()
+    layer = PointLayer(ax, s=1., c='yellow', marker='.', linewidths=0)
+    layer.extend(lons, lats)
+    layer.update_view()
+    return layer
+
+
+def get_time_index(path):
+    """
+    The positions of an input file indexed for playback, or None when it
+    has no time column.  Only the last file's index is kept.
+    """
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+    with _TIME_INDEXES_LOCK:
+        if key not in _TIME_INDEXES:
+            store = ingest.load(path)
+            times = store.times()
+            index = None
+            if times is not None:
+                lons, lats = store.positions()
+                index = TimeIndex(times, lons, lats, store.ids())
+            _TIME_INDEXES.clear()
+            _TIME_INDEXES[key] = index
+        return _TIME_INDEXES[key]
+
+
+MAP_LAYERS = LayerGraph(
+    [LayerSpec('base', ['Blue Marble'], build_base, base_enabled)] +
+    [LayerSpec(name, [prop, 'Area Threshold'],
+               border_builder(prop, category, dataset),
+               lambda param, prop=prop: param.get(prop, False))
+     for prop, name, category, dataset in BORDER_LAYERS] +
+    [LayerSpec('input', ['inputfile'], build_input,
+               lambda param: bool(param.get('inputfile')), expensive=True)])
+
+
+def plot_layers(ax, param, base_image=STOCK_IMAGE, job=None, names=None):
+    """
+    Builds the map layers for a set of plot properties on ax (only those
+    of names, when given), returning them by name
+    """
+    # # Draw Circle
+    # self.draw_range_circle(param["longitude"],
+    #                        param["geodetic_latitude"],
+    #                        param["range"],
+    #                        color='r',
+    #                        alpha=0.5)
+    return MAP_LAYERS.build(ax, param, job=job, names=names,
+                            base_image=base_image)
+
+
+def update_layers(ax, layers, old, new, base_image=STOCK_IMAGE,
+                  defer_expensive=False):
+    """
+    Rebuilds in place the map layers depending on the plot properties that
+    changed from old to new, returning their names; with defer_expensive,
+    the expensive ones are only removed
+    """
+    return MAP_LAYERS.update(ax, layers, old, new,
+                             defer_expensive=defer_expensive,
+                             base_image=base_image)
@@ -0,0 +1,518 @@
+import numpy as np
+
+from matplotlib.font_manager import FontProperties
+
+from blit_overlay import BlitOverlay
+from graticule import Graticule
+from grid_labels import LabelPool
+from grid_labels import wrap_lon
+from grid_spacing import GridSpacing
+from map_figure import STOCK_IMAGE
+from map_figure import create_axes
+from map_figure import plot_layers
+from point_layer import PointLayer
+from annotation_layer import AnnotationLayer
+from lod import LodPolylines
+from lod import PolylineLayer
+from playback import Playback
+from projections import axes_projection
+from projections import clip_to_view
+from projections import projection_from_param
+from raster_cache import PanCache
+from progressive import ProgressiveRendering
+from instrumentation import Profiler
+from instrumentation import ProfilerHud
+from instrumentation import timed
+
+NUM_GRID_LINES = 5
+GRID_LABEL_FONT_SIZE = 2.5
+SEAM_DEGREES = 1e-6
+
+
+class ImmediateTimer(object):
+    """
+    The timer of a view without a GUI event loop to wait in, with the parts
+    of the wx.Timer interface playback and progressive rendering use.  It
+    fires as soon as it is started, and a repeating one fires once.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def Start(self, milliseconds=-1, oneShot=False):
+        self.callback(None)
+
+    def StartOnce(self, milliseconds=-1):
+        self.callback(None)
+
+    def Stop(self):
+        pass
+
+    def IsRunning(self):
+        return False
+
+
+class MapView(object):
+    """
+    A map on a matplotlib canvas, independent of the GUI: its layers, the
+    grid drawn on the blit overlay, rendering and pixel-shift pans.
+    PlotPanel puts it in a wx window, and the benchmark drives it on an Agg
+    canvas.  Subclasses hook into the GUI through invalidate, _timer,
+    _refine, _building_layers, _on_playback_frame and _set_status.
+    """
+
+    def __init__(self, figure, canvas):
+        self.profiler = Profiler()
+        self.figure = figure
+        self.ax = create_axes(self.figure)
+        self.canvas = canvas
+        self.overlay = BlitOverlay(self.canvas, self.profiler)
+        self.hud = ProfilerHud(self.profiler)
+        self._held = set()
+        self.playback = Playback(self._timer, on_frame=self._on_playback_frame,
+                                 s=2., c='cyan', marker='o', linewidths=0)
+        self.pan_cache = PanCache(self.figure.dpi)
+        self.progressive = ProgressiveRendering(self._timer, self._refine)
+        self._report_latency = False
+        self._connect_axes()
+
+        self.grid_label_font = FontProperties()
+        self.grid_label_font.set_size(GRID_LABEL_FONT_SIZE)
+        self.grid_label_font.set_family('monospace')
+
+        # setup the meridians and parallels collections and their labels
+        self.graticule = None
+        self._setup_grid()
+
+        self.grid_spacing = GridSpacing(NUM_GRID_LINES)
+        self.lons = []
+        self.lats = []
+        self.latll = -90
+        self.latur = 90
+        self.lonll = -180
+        self.lonur = 180
+
+        self.map = None
+        self.layers = {}
+
+        # plot properties the map layers were last built from
+        self.plot_param = None
+        self.points = PointLayer(s=1., c='r', marker='.', linewidths=0)
+        self.annotations = AnnotationLayer()
+        self.tracks = []
+        # range circles, great circles and other shapes drawn on the map
+        self.shapes = []
+        self.base_image = STOCK_IMAGE
+
+        # layers read from a session file, loaded when first displayed
+        self.pending_layers = {}
+
+        self.coordinate_grid_enabled = True
+        self.grid_labels_enabled = True
+
+    def set_coordinate_grid_enabled(self, enabled):
+        self.coordinate_grid_enabled = enabled
+
+    def set_grid_labels_enabled(self, enabled):
+        self.grid_labels_enabled = enabled
+
+    def on_xlims_change(self, axes):
+        pass
+
+    def on_ylims_change(self, axes):
+        pass
+
+    def set_profiler_hud_enabled(self, enabled):
+        self.hud.set_enabled(enabled)
+
+    def invalidate(self, *layers):
+        """
+        Redraws the given layers right away
+        """
+        self.render(set(layers))
+
+    def render(self, dirty):
+        """
+        Redraws the figure, recomputing the dirty layers first.  While the
+        user interacts the frame is rendered at reduced resolution.
+        """
+        if self._building_layers() and not set(dirty) <= set(['grid']):
+            # the frame on screen has map layers the figure doesn't have
+            # yet; the render waits for them
+            self._held.update(dirty)
+            return
+        reduced = self.progressive.reduced(self.figure)
+        with self.profiler.frame():
+            if reduced:
+                with self.progressive.resolution(self.figure):
+                    self._update_layers(dirty)
+                    with self.profiler.timer('canvas draw (reduced)'), \
+                            self.profiler.draw_timers(self._layer_artists()):
+                        image = self.progressive.rasterize(self.figure)
+                with self.profiler.timer('upscale'):
+                    self._show_frame(image)
+            elif set(dirty) <= set(['grid']) and \
+                    self.overlay.background is not None and \
+                    not self.pending_layers:
+                # the grid is drawn on the overlay, over the last full frame
+                self._update_layers(dirty)
+                self.overlay.update()
+            else:
+                self._update_layers(dirty)
+                with self.profiler.timer('canvas draw'), \
+                        self.profiler.draw_timers(self._layer_artists()):
+                    self.figure.canvas.draw()
+        self.progressive.record('interactive' if reduced else 'full',
+                                self.profiler.last_frame[0])
+        if self._report_latency and not reduced:
+            self._report_latency = False
+            self._set_status('Ready (%s)' % self.progressive.report())
+        self.hud.update()
+
+    def _update_layers(self, dirty):
+        loaded = self._load_pending_layers()
+        for name, layer in self.layers.items():
+            if 'view' in dirty or name in dirty or name in loaded:
+                with self.profiler.timer('update ' + name):
+                    layer.update_view()
+        if self.map and ('view' in dirty or 'grid' in dirty):
+            self._plot_meridians_and_parallels()
+
+    def _layer_artists(self):
+        """
+        The artists of the layers, as (stage, artist) pairs timing each
+        layer's draw
+        """
+        return [('draw ' + name, artist)
+                for name, layer in self.layers.items()
+                for artist in layer.shown_artists()]
+
+    def _show_frame(self, image):
+        """
+        Puts a reduced frame on screen, scaled up to the canvas, with the
+        overlay on top
+        """
+        self.progressive.upscale(
+                image, np.asarray(self.canvas.get_renderer().buffer_rgba()))
+        self.overlay.on_draw(None)
+        with self.profiler.timer('blit'):
+            self.canvas.blit()
+
+    def begin_pan(self):
+        """
+        Takes the frame on screen, without the overlay, as the start of a
+        pixel-shift pan
+        """
+        if self.overlay.background is not None:
+            self.canvas.restore_region(self.overlay.background)
+        self.pan_cache.begin(
+                self.ax, list(self.layers.values()),
+                np.asarray(self.canvas.get_renderer().buffer_rgba()))
+
+    @timed('pan frame')
+    def pan_frame(self):
+        """
+        Shows the panned view by shifting the cached frame and rasterizing
+        only the strips that came into view; anything else, like a zoom,
+        falls back to a full render
+        """
+        frame = np.asarray(self.canvas.get_renderer().buffer_rgba())
+        if self._building_layers() or \
+                not self.pan_cache.shift(self.ax, frame):
+            self.invalidate('view')
+            return
+        # the grid and annotations are on the overlay, clipped to the new
+        # view, so ones coming into view show up
+        clip_to_view(self.ax, self.canvas.get_renderer())
+        self.annotations.update_view()
+        if self.map:
+            self._plot_meridians_and_parallels()
+        self.overlay.on_draw(None)
+        with self.profiler.timer('blit'):
+            self.canvas.blit()
+
+    def add_point(self, lon, lat):
+        self.points.append(lon, lat)
+        self.invalidate('points')
+
+    def add_points(self, lons, lats):
+        self.points.extend(lons, lats)
+        self.invalidate('points')
+
+    def _adopt_layers(self, layers):
+        """
+        Makes layers the current ones, carrying the points over to the axes
+        """
+        self.points.attach(self.ax)
+        self.annotations.attach(self.ax, self.overlay)
+        layers['points'] = self.points
+        layers['annotations'] = self.annotations
+        for index, track in enumerate(self.tracks):
+            track.attach(self.ax)
+            layers['track-%d' % index] = track
+        for index, shape in enumerate(self.shapes):
+            shape.attach(self.ax)
+            layers['shape-%d' % index] = shape
+        self.layers = layers
+        self.map = axes_projection(self.ax)
+        self.playback.attach(self.ax, self.overlay)
+        self.hud.attach(self.ax, self.overlay)
+
+    def set_playback_data(self, times, lons, lats, ids=None, duration=None):
+        """
+        Loads time-tagged positions (optionally per entity id) for animated
+        playback
+        """
+        self.playback.set_data(times, lons, lats, ids, duration)
+
+    def _load_pending_layers(self):
+        """
+        Builds the layers read from a session, returning their names
+        """
+        loaded = set()
+        for name, layer in sorted(self.pending_layers.items(),
+                                  key=lambda item: (len(item[0]), item[0])):
+            if layer.kind == 'points':
+                self.points.extend(layer.arrays['lons'],
+                                   layer.arrays['lats'])
+                loaded.add('points')
+            elif layer.kind == 'track':
+                self.draw_track(layer.arrays['lons'], layer.arrays['lats'],
+                                linewidth=layer.attrs.get('linewidth', .5),
+                                color=layer.attrs.get('color', 'r'))
+                loaded.add('track-%d' % (len(self.tracks) - 1))
+            elif layer.kind == 'playback':
+                self.set_playback_data(duration=layer.attrs.get('duration'),
+                                       **layer.arrays)
+        self.pending_layers = {}
+        return loaded
+
+    def _connect_axes(self):
+        self.ax.callbacks.connect('xlim_changed', self.on_xlims_change)
+        self.ax.callbacks.connect('ylim_changed', self.on_ylims_change)
+
+    def set_base_image(self, path):
+        """
+        Sets the raster used for the base imagery (stock image by default)
+        """
+        self.base_image = path
+
+    def plot(self, param):
+        projection = projection_from_param(param)
+        old = self.ax
+        if projection is not axes_projection(self.ax):
+            # the old axes go once the layers have moved their artists off
+            # them
+            self.ax = create_axes(self.figure, projection)
+            self._connect_axes()
+            self._setup_grid()
+        self._adopt_layers(plot_layers(self.ax, param, self.base_image))
+        self.plot_param = dict(param)
+        for name in ['points', 'annotations'] + [
+                'track-%d' % index for index in range(len(self.tracks))] + [
+                'shape-%d' % index for index in range(len(self.shapes))]:
+            self.layers[name].update_view()
+        if old is not self.ax:
+            old.remove()
+        self.figure.canvas.draw()
+
+    def draw_track(self, lons, lats, linewidth=.5, color='r'):
+        """
+        Draws a polyline simplified to the current zoom level
+        """
+        track = PolylineLayer(
+                LodPolylines([np.column_stack((lons, lats))]), self.ax,
+                linewidths=linewidth, colors=color)
+        self.tracks.append(track)
+        name = 'track-%d' % (len(self.tracks) - 1)
+        self.layers[name] = track
+        self.invalidate(name)
+        return track
+
+    def add_shape(self, shape):
+        """
+        Draws a layer of fixed shapes, like range circles, kept over
+        rebuilds of the figure
+        """
+        self.shapes.append(shape)
+        name = 'shape-%d' % (len(self.shapes) - 1)
+        self.layers[name] = shape
+        self.invalidate(name)
+        return shape
+
+    @timed('grid')
+    def _plot_meridians_and_parallels(self):
+        """
+        Plots meridians and parallels appropriate for the current zoom level
+        """
+
+        # if grid is off and labels are off wipe lines
+        if not self.coordinate_grid_enabled and not self.grid_labels_enabled:
+            self._label_grid([], [])
+            self._clear_meridians_and_parallels()
+            return
+
+        # FIXME: Get this working for other projections
+        if self.map.projection != 'cyl':
+            self.lonll, self.lonur = self.map.llcrnrlon, self.map.urcrnrlon
+            self.latll, self.latur = self.map.llcrnrlat, self.map.urcrnrlat
+            lats = np.linspace(-90, 90, 10)
+            lons = np.linspace(self.lonll, self.lonur, 10)
+            if self.coordinate_grid_enabled:
+                # stop the parallels just short of the seam opposite the
+                # central longitude, where the projection wraps around
+                self.graticule.update(lons, lats,
+                                      (self.lonll + SEAM_DEGREES,
+                                       self.lonur - SEAM_DEGREES),
+                                      (-90, 90), transform=self.map)
+                self.graticule.set_visible(True)
+            else:
+                self._clear_meridians_and_parallels()
+
+            self._label_grid(lons, lats)
+            return
+
+        # get the corners of the viewport
+        self.lonll, self.latll, delta_lon, delta_lat = self.ax.viewLim.bounds
+        self.latur = self.latll + delta_lat
+        self.lonur = self.lonll + delta_lon
+
+        # translate to lat/lon (if needed)
+        self.lonll, self.latll = self.map(self.lonll, self.latll, inverse=True)
+        self.lonur, self.latur = self.map(self.lonur, self.latur, inverse=True)
+
+        if not self._zoom_is_valid():
+            return
+
+        # lay out the visible meridians and parallels at DMS-friendly
+        # intervals for the current zoom
+        lons = self.grid_spacing.lines(self.lonll, self.lonur)
+        lats = self.grid_spacing.lines(max(self.latll, -90.0),
+                                       min(self.latur, 90.0))
+
+        # plot labels for each one
+        self._label_grid(lons, lats)
+
+        self.lats = lats
+        self.lons = lons
+
+        # update the parallels/meridians in place
+        # these are made up of a solid black line, and a dashed white line
+        if self.coordinate_grid_enabled:
+            self.graticule.update(lons, lats,
+                                  (self.lonll, self.lonur),
+                                  (self.latll, self.latur),
+                                  transform=None if self.map.identity
+                                  else self.map)
+            self.graticule.set_visible(True)
+        else:
+            self._clear_meridians_and_parallels()
+
+    def _setup_grid(self):
+        """
+        Creates the grid line collections and label pools on the axes.  They
+        are drawn on the overlay, so the grid follows the view without a
+        full render.
+        """
+        if self.graticule is not None:
+            self.overlay.remove_artists(
+                    [self.graticule.black, self.graticule.white] +
+                    self.lat_labels.texts + self.lon_labels.texts)
+        self.graticule = Graticule(self.ax)
+        self.overlay.add_artist(self.graticule.black)
+        self.overlay.add_artist(self.graticule.white)
+        label_bbox = dict(facecolor='white', alpha=0.5, pad=0.2, lw=0.2)
+        self.lat_labels = LabelPool(
+                self.ax,
+                on_create=self.overlay.add_artist,
+                fontproperties=self.grid_label_font,
+                verticalalignment='center',
+                horizontalalignment='left',
+                bbox=label_bbox)
+        self.lon_labels = LabelPool(
+                self.ax,
+                on_create=self.overlay.add_artist,
+                fontproperties=self.grid_label_font,
+                rotation='vertical',
+                verticalalignment='bottom',
+                horizontalalignment='center',
+                bbox=label_bbox)
+
+    @timed('grid labels')
+    def _label_grid(self, lons, lats):
+        """
+        Plots labels on grid lines.
+        """
+        # labels are left out of reduced frames
+        if not self.grid_labels_enabled or self.progressive.active:
+            self.lat_labels.hide()
+            self.lon_labels.hide()
+            return
+
+        # peg the corners on the projection boundaries
+        lonll = max(self.lonll, self.map.llcrnrlon)
+        lonur = min(self.lonur, self.map.urcrnrlon)
+        latll = max(self.latll, self.map.llcrnrlat)
+        latur = min(self.latur, self.map.urcrnrlat)
+
+        lats = np.asarray(lats, dtype=float)
+        lats = lats[(lats >= latll) & (lats <= latur)]
+        x, y = self.map(np.full(lats.shape, lonll), lats)
+        shown = np.isfinite(x) & np.isfinite(y)
+        self.lat_labels.set_labels(
+                x[shown], y[shown],
+                self.grid_spacing.labels(lats[shown], 'N', 'S',
+                                         degree_digits=2))
+
+        lons = np.asarray(lons, dtype=float)
+        lons = lons[(lons >= lonll) & (lons <= lonur)]
+        x, y = self.map(lons, np.full(lons.shape, latll))
+        shown = np.isfinite(x) & np.isfinite(y)
+        self.lon_labels.set_labels(
+                x[shown], y[shown],
+                self.grid_spacing.labels(wrap_lon(lons[shown]), 'E', 'W',
+                                         degree_digits=3))
+
+    def _zoom_is_valid(self):
+        """
+        Checks if zoom level is valid
+        """
+        # check if corners are valid
+        try:
+            delta_lon = self.lonur - self.lonll
+            delta_lat = self.latur - self.latll
+        except:
+            return False
+        return True
+
+    def _clear_meridians_and_parallels(self):
+        """
+        Clears currently plotted meridians and parallels
+        """
+        self.graticule.set_visible(False)
+        self.graticule.clear()
+
+    def _building_layers(self):
+        """
+        Whether map layers missing from the figure are being built, so
+        frames showing them can't be redrawn yet
+        """
+        return False
+
+    def _refine(self):
+        """
+        Brings the frame back to full quality after an interaction
+        """
+        self.invalidate('view')
+
+    def _timer(self, callback):
+        """
+        A timer calling callback, for playback and progressive rendering
+        """
+        return ImmediateTimer(callback)
+
+    def _on_playback_frame(self, playback):
+        pass
+
+    def _set_status(self, text):
+        pass
@@ -0,0 +1,246 @@
+import multiprocessing
+import os
+import threading
+import weakref
+
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
+
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from map_figure import MAP_LAYERS
+from map_figure import STOCK_IMAGE
+from map_figure import create_axes
+from projections import axes_projection
+from projections import get_projection
+
+# one core is left to the thread drawing everything else
+LAYER_WORKERS = max((os.cpu_count() or 1) - 1, 0)
+MIN_PARALLEL_LAYERS = 2
+
+# pixels composited at a time
+BLOCK_PIXELS = 1 << 14
+
+# per worker process: the last raster of each layer it was sent, by name
+_RASTERS = {}
+
+
+def figure_view(figure):
+    """
+    What a worker needs to reproduce the view of figure: its projection,
+    size, resolution and axes limits
+    """
+    ax = figure.axes[0]
+    projection = axes_projection(ax)
+    return (projection.projection, projection.params,
+            tuple(figure.get_size_inches()), figure.dpi,
+            tuple(ax.get_xlim()), tuple(ax.get_ylim()))
+
+
+def composite(frames, background=(1.0, 1.0, 1.0, 1.0), out=None):
+    """
+    Stacks straight-alpha RGBA frames of the same shape, bottom to top, with
+    the over operator, on a background color.  The result goes to out, which
+    may be one of the frames.
+    """
+    height, width = frames[0].shape[:2]
+    size = height * width
+    if out is None:
+        out = np.empty((height, width, 4), np.uint8)
+    frames = [frame.reshape(size, 4) for frame in frames]
+    target = out.reshape(size, 4)
+
+    # colors are premultiplied while stacking, and alpha is kept in the
+    # same 0-255 units
+    background = np.asarray(background, np.float32) * 255
+    background[:3] *= background[3] / 255
+
+    # a block of pixels at a time, so the intermediate arrays stay in the
+    # cache
+    stack = np.empty((BLOCK_PIXELS, 4), np.float32)
+    layer = np.empty((BLOCK_PIXELS, 4), np.float32)
+    weight = np.empty((BLOCK_PIXELS, 1), np.float32)
+    for start in range(0, size, BLOCK_PIXELS):
+        block = slice(start, min(start + BLOCK_PIXELS, size))
+        count = block.stop - block.start
+        under, over, alpha = stack[:count], layer[:count], weight[:count]
+        under[:] = background
+        for frame in frames:
+            pixels = frame[block]
+            if not pixels[:, 3].any():
+                continue
+            np.multiply(pixels[:, 3:], np.float32(1.0 / 255), out=alpha)
+            over[:] = pixels
+            over[:, 3] = 255
+            over *= alpha
+            np.subtract(1.0, alpha, out=alpha)
+            under *= alpha
+            under += over
+
+        if background[3] < 255:
+            np.divide(under[:, :3], under[:, 3:] * np.float32(1.0 / 255),
+                      out=under[:, :3], where=under[:, 3:] > 0)
+        under += 0.5
+        target[block] = under
+    return out
+
+
+class LayerRaster(object):
+    """
+    One map layer alone on an offscreen figure with a transparent
+    background.  Worker processes keep them between renders, so a layer
+    whose properties haven't changed only has its view updated.
+    """
+
+    def __init__(self, name, view):
+        key, params, size_inches, dpi = view[:4]
+        self.spec = MAP_LAYERS.spec(name)
+        self.figure_key = view[:4]
+        self.figure = Figure(size_inches, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.figure.patch.set_visible(False)
+        self.ax = create_axes(self.figure, get_projection(key, **params))
+        self.ax.set_axis_off()
+        self.ax.set_autoscale_on(False)
+        self.layer = None
+        self.source = None
+
+    def render(self, param, view, base_image):
+        x_limits, y_limits = view[4:]
+        self.ax.set_xlim(x_limits)
+        self.ax.set_ylim(y_limits)
+        source = (param, base_image)
+        if source != self.source:
+            if self.layer is not None:
+                self.layer.remove()
+            self.source = source
+            self.layer = self.spec.build(self.ax, param,
+                                         base_image=base_image)
+
+            # building may have moved the view
+            self.ax.set_xlim(x_limits)
+            self.ax.set_ylim(y_limits)
+        elif self.layer is not None:
+            self.layer.update_view()
+        self.figure.canvas.draw()
+        return np.array(self.figure.canvas.buffer_rgba())
+
+
+def rasterize_layer(name, param, view, base_image=STOCK_IMAGE):
+    """
+    The map layer name built from param, alone in the view of figure_view,
+    as an RGBA array (worker process)
+    """
+    raster = _RASTERS.get(name)
+    if raster is None or raster.figure_key != view[:4]:
+        raster = _RASTERS[name] = LayerRaster(name, view)
+    return raster.render(param, view, base_image)
+
+
+class LayerCompositor(object):
+    """
+    Draws figures with their map layers rasterized in parallel.
+
+    The map layers are built in worker processes from the plot properties
+    they depend on, each into its own Agg buffer of the figure's size and
+    resolution, instead of on the figure; meanwhile this thread draws
+    everything else on a transparent background.  The buffers are then
+    stacked in the layers' order, under the rest of the figure, into the
+    figure's own Agg buffer.
+
+    A layer always goes to the same worker, which keeps it warm between
+    renders.  Workers are spawned rather than forked, as the GUI's threads
+    may hold locks at any moment.
+    """
+
+    def __init__(self, workers=LAYER_WORKERS, min_layers=MIN_PARALLEL_LAYERS):
+        self.workers = workers
+        self.min_layers = min_layers
+        self._pools = {}
+        self._pending = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def configure(self, workers=None, min_layers=None):
+        if workers is not None and workers != self.workers:
+            self.shutdown()
+            self.workers = workers
+        if min_layers is not None:
+            self.min_layers = min_layers
+
+    def shutdown(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=False)
+
+    def submit(self, figure, param, base_image=STOCK_IMAGE):
+        """
+        Starts rasterizing the map layers param turns on in the view of
+        figure, when there are enough of them to be worth it.  Returns their
+        names: those layers are left out of the figure, and composited into
+        it by draw.
+        """
+        names = MAP_LAYERS.enabled(param)
+        if self.workers < 1 or len(names) < max(self.min_layers, 1):
+            return []
+        view = figure_view(figure)
+        futures = []
+        for name in names:
+            spec = MAP_LAYERS.spec(name)
+            futures.append(self._pool(name).submit(
+                rasterize_layer, name,
+                dict((prop, param[prop]) for prop in spec.properties
+                     if prop in param),
+                view, base_image))
+        self._pending[figure] = (names, futures)
+        return names
+
+    def draw(self, figure, layers, param, base_image=STOCK_IMAGE):
+        """
+        Draws figure into its canvas's Agg buffer, with the map layers
+        submitted for it composited underneath.  Returns whether there were
+        any; when a worker fails, those layers are built into layers, on
+        the figure, and drawn here.
+        """
+        names, futures = self._pending.pop(figure, ((), ()))
+        if not futures:
+            figure.canvas.draw()
+            return False
+
+        visible = figure.patch.get_visible()
+        figure.patch.set_visible(False)
+        try:
+            figure.canvas.draw()
+        finally:
+            figure.patch.set_visible(visible)
+
+        try:
+            rasters = [future.result() for future in futures]
+        except Exception:
+            # a broken pool is replaced on the next render
+            self.shutdown()
+            rasters = None
+        frame = np.asarray(figure.canvas.get_renderer().buffer_rgba())
+        if rasters is None or \
+                any(raster.shape != frame.shape for raster in rasters):
+            layers.update(MAP_LAYERS.build(figure.axes[0], param,
+                                           names=names,
+                                           base_image=base_image))
+            figure.canvas.draw()
+            return False
+        background = to_rgba(figure.get_facecolor()) if visible else \
+            (0.0, 0.0, 0.0, 0.0)
+        composite(rasters + [frame], background, out=frame)
+        return True
+
+    def _pool(self, name):
+        index = MAP_LAYERS.names.index(name) % self.workers
+        with self._lock:
+            pool = self._pools.get(index)
+            if pool is None:
+                pool = self._pools[index] = ProcessPoolExecutor(
+                    1, mp_context=multiprocessing.get_context('spawn'))
+            return pool
@@ -0,0 +1,207 @@
+import time
+
+import numpy as np
+
+from projections import axes_projection
+
+PLAYBACK_FPS = 30.0
+
+# weight of the newest frame in the smoothed frame rate
+FPS_SMOOTHING = 0.1
+
+
+class TimeIndex(object):
+    """
+    Time-tagged positions of many entities, sorted for per-frame lookups.
+
+    Samples are sorted by entity and then time, and keyed so that a single
+    searchsorted call finds, for every entity at once, the last sample at or
+    before a given time.  Positions between samples are interpolated.
+    """
+
+    def __init__(self, times, lons, lats, ids=None):
+        times = np.asarray(times, dtype=float)
+        if ids is None:
+            ids = np.zeros(len(times), dtype=np.intp)
+        entities, codes = np.unique(np.asarray(ids), return_inverse=True)
+        self.entities = entities
+        self.start = float(times.min()) if len(times) else 0.0
+        self.end = float(times.max()) if len(times) else 0.0
+        span = self.end - self.start + 1.0
+
+        order = np.lexsort((times, codes))
+        self.codes = codes[order]
+        self.times = times[order]
+        self.lons = np.asarray(lons, dtype=float)[order]
+        self.lats = np.asarray(lats, dtype=float)[order]
+        self.span = span
+        self.keys = self.codes * span + (self.times - self.start)
+        self.first = np.searchsorted(self.codes, np.arange(len(entities)))
+        self.last = np.searchsorted(self.codes, np.arange(len(entities)),
+                                    side='right') - 1
+        self.entity_codes = np.arange(len(entities))
+
+    def positions(self, t):
+        """
+        Positions of the entities that exist at time t
+        """
+        if not len(self.times):
+            return np.empty(0), np.empty(0)
+        target = self.entity_codes * self.span + (t - self.start)
+        before = np.searchsorted(self.keys, target, side='right') - 1
+
+        # an entity exists from its first sample through its last one
+        started = before >= self.first
+        alive = started & ((before < self.last) |
+                           (self.times[np.maximum(before, 0)] >= t))
+        before = before[alive]
+        after = np.minimum(before + 1, self.last[alive])
+
+        t0 = self.times[before]
+        t1 = self.times[after]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = np.where(t1 > t0, (t - t0) / (t1 - t0), 0.0)
+        weight = np.clip(weight, 0.0, 1.0)
+
+        # interpolate the short way round across the antimeridian
+        dlon = (self.lons[after] - self.lons[before] + 180.0) % 360.0 - 180.0
+        lons = self.lons[before] + weight * dlon
+        lats = self.lats[before] + weight * (self.lats[after] -
+                                             self.lats[before])
+        return lons, lats
+
+
+class Playback(object):
+    """
+    Animates a TimeIndex on the plot overlay.
+
+    The moving entities are one animated scatter artist registered with the
+    BlitOverlay, so each frame restores the cached background (all static
+    layers) and blits only the entities.  Frames are driven by a timer made
+    by timer(callback), a wx.Timer bound to callback for the GUI; the
+    achieved frame rate is reported through on_frame.
+    """
+
+    def __init__(self, timer, fps=PLAYBACK_FPS, on_frame=None, **kwargs):
+        self.make_timer = timer
+        self.fps = fps
+        self.on_frame = on_frame
+        self.kwargs = kwargs
+        self.index = None
+        self.ax = None
+        self.overlay = None
+        self.artist = None
+        self.time = 0.0
+        self.speed = 1.0
+        self.duration = None
+        self.version = 0
+        self.achieved_fps = 0.0
+        self._last_frame = None
+        self._timer = None
+
+    def attach(self, ax, overlay):
+        """
+        Creates the moving artist on ax and registers it with the overlay
+        """
+        if self.artist is not None:
+            if self.artist in overlay.artists:
+                overlay.remove_artist(self.artist)
+            elif self.artist.axes is not None:
+                self.artist.remove()
+        self.ax = ax
+        self.overlay = overlay
+        self.artist = ax.scatter(np.empty(0), np.empty(0), **self.kwargs)
+        overlay.add_artist(self.artist)
+        self.seek(self.time)
+
+    def set_data(self, times, lons, lats, ids=None, duration=None):
+        """
+        Loads tracks; by default playback takes a minute of wall time
+        """
+        self.set_index(TimeIndex(times, lons, lats, ids), duration)
+
+    def set_index(self, index, duration=None):
+        """
+        Loads tracks already sorted into a TimeIndex
+        """
+        self.index = index
+        self.duration = duration
+        self.version += 1
+        self.speed = (self.index.end - self.index.start) / (duration or 60.0)
+        self.seek(self.index.start)
+
+    def clear(self):
+        """
+        Unloads the tracks
+        """
+        self.pause()
+        self.index = None
+        self.version += 1
+        if self.artist is not None:
+            self.artist.set_offsets(np.empty((0, 2)))
+            self.overlay.update([self.artist])
+
+    def arrays(self):
+        """
+        The loaded samples, as accepted by set_data
+        """
+        ids = self.index.entities[self.index.codes]
+        if ids.dtype == object:
+            ids = ids.astype(str)
+        return {'times': self.index.times, 'lons': self.index.lons,
+                'lats': self.index.lats, 'ids': ids}
+
+    def playing(self):
+        return self._timer is not None and self._timer.IsRunning()
+
+    def play(self):
+        if self.index is None:
+            return
+        if self.time >= self.index.end:
+            self.time = self.index.start
+        if self._timer is None:
+            # created on first use, so a playback can exist without a
+            # running wx application
+            self._timer = self.make_timer(self.on_timer)
+        self._last_frame = time.time()
+        self._timer.Start(max(1, int(1000.0 / self.fps)))
+
+    def pause(self):
+        if self._timer is not None:
+            self._timer.Stop()
+        self._last_frame = None
+
+    def fraction(self):
+        if self.index is None or self.index.end <= self.index.start:
+            return 0.0
+        return (self.time - self.index.start) / (self.index.end -
+                                                  self.index.start)
+
+    def seek_fraction(self, fraction):
+        if self.index is not None:
+            self.seek(self.index.start + fraction * (self.index.end -
+                                                     self.index.start))
+
+    def seek(self, t):
+        self.time = t
+        if self.index is None or self.artist is None:
+            return
+        lons, lats = self.index.positions(t)
+        x, y = axes_projection(self.ax).project(lons, lats)
+        self.artist.set_offsets(np.column_stack((x, y)))
+        self.overlay.update([self.artist])
+
+    def on_timer(self, event):
+        now = time.time()
+        elapsed = now - self._last_frame if self._last_frame else 0.0
+        self._last_frame = now
+        if elapsed > 0:
+            self.achieved_fps += FPS_SMOOTHING * (1.0 / elapsed -
+                                                  self.achieved_fps)
+        t = self.time + elapsed * self.speed
+        if t >= self.index.end:
+            t = self.index.end
+            self.pause()
+        self.seek(t)
+        if self.on_frame:
+            self.on_frame(self)
@@ -1,15 +1,30 @@
+import os
+import uuid
 import wx
-from wx.lib.embeddedimage import PyEmbeddedImage
 
-from pyembeddedimage_to_png import pyembeddedimage_to_png
+from image_cache import load_image
+from map_view import MapView
+from grid_labels import wrap_lon
+from render_scheduler import RenderScheduler
+from background_render import BackgroundRenderer
+from map_figure import MAP_LAYERS
+from map_figure import create_axes
+from map_figure import get_time_index
+from map_figure import plot_layers
+from map_figure import update_layers
+from lod import LodPolylines
+from lod import PolylineLayer
+from polygon_layer import PolygonLayer
+from projections import axes_projection
+from projections import projection_from_param
+from parallel_render import LayerCompositor
+from session import SessionLayer
+from instrumentation import timed
+import geodesy
 
-import cartopy.crs as ccrs
-
-from numpy import pi
 import numpy as np
 
 from matplotlib.figure import Figure
-from matplotlib._png import read_png
 
 from matplotlib.offsetbox import TextArea
 from matplotlib.offsetbox import AnnotationBbox
@@ -20,24 +35,42 @@ from matplotlib.font_manager import FontProperties
 from plottoolbar import PlotToolbar
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as PlotFigureCanvas
 
-NUM_GRID_LINES = 5
 MOTION_DISPLAY_FONT_SIZE = 3
-GRID_LABEL_FONT_SIZE = 2.5
 
 
-class PlotPanel(wx.Panel):
+class PlotPanel(wx.Panel, MapView):
 
-    def __init__(self, parent, statusbar):
+    def __init__(self, parent, statusbar, on_first_frame=None):
         wx.Panel.__init__(self, parent, -1, size=(50, 50))
         self.statusbar = statusbar
+        self.on_first_frame = on_first_frame
 
         self.plot_handl = None
         self.sizer = wx.BoxSizer(wx.VERTICAL)
         self.SetSizer(self.sizer)
 
-        self.figure = Figure(None, dpi=300)
-        self.ax = self.figure.add_axes([0, 0, 1, 1], frameon=False, projection=ccrs.PlateCarree())
-        self.canvas = PlotFigureCanvas(self, -1, self.figure)
+        figure = Figure(None, dpi=300)
+        MapView.__init__(self, figure, PlotFigureCanvas(self, -1, figure))
+        self.scheduler = RenderScheduler(self, self.render)
+        self.hud.status = self.scheduler.stats
+        self.compositor = LayerCompositor()
+        self.background_renderer = BackgroundRenderer(
+                self._build_figure,
+                self._on_render_done,
+                self._on_render_progress,
+                self._draw_figure,
+                self._on_render_failed)
+        # map layers missing from the figure: the ones rasterized by the
+        # compositor's workers, built here after their frame is up, and
+        # expensive ones rebuilt for new properties.  The figure holding
+        # them is never drawn.
+        self.layer_builder = BackgroundRenderer(
+                self._build_map_layers,
+                self._on_map_layers_built,
+                self._on_render_progress,
+                draw=lambda figure, job: None,
+                on_error=self._on_map_layers_failed)
+        self._refine_steps = None
         self.toolbar = PlotToolbar(self.canvas, self)
 
         self.sizer.Add(self.canvas, 1, wx.LEFT | wx.TOP | wx.GROW)
@@ -48,42 +81,20 @@ class PlotPanel(wx.Panel):
 
         # Bind events
         self.figure.canvas.mpl_connect('button_release_event', self.onclick)
-        self.ax.callbacks.connect('xlim_changed', self.on_xlims_change)
-        self.ax.callbacks.connect('ylim_changed', self.on_ylims_change)
-
-        # setup empty list of meridians and parallels
-        self.meridians_w = {}
-        self.meridians_b = {}
-        self.parallels_w = {}
-        self.parallels_b = {}
-
-        self.labels = []
-
-        self.nlons = NUM_GRID_LINES
-        self.nlats = NUM_GRID_LINES
-        self.lons = []
-        self.lats = []
-        self.latll = -90
-        self.latur = 90
-        self.lonll = -180
-        self.lonur = 180
 
         self.motion_display_font = FontProperties()
         self.motion_display_font.set_size(MOTION_DISPLAY_FONT_SIZE)
         self.motion_display_font.set_family('monospace')
 
-        self.grid_label_font = FontProperties()
-        self.grid_label_font.set_size(GRID_LABEL_FONT_SIZE)
-        self.grid_label_font.set_family('monospace')
-
-        self.map = None
         self.motion_display = None
+        self._session_key = uuid.uuid4().hex[:8]
+
+        # playback loaded from the input file, if time-tagged
+        self._input_index = None
 
         self._rc_zoomed = False
 
         self.cursor_coordinates_enabled = True
-        self.coordinate_grid_enabled = True
-        self.grid_labels_enabled = True
 
     def set_cursor_coordinates_enabled(self, enabled):
         self.cursor_coordinates_enabled = enabled
@@ -91,24 +102,12 @@ class PlotPanel(wx.Panel):
         # apply immediately
         if not enabled:
             if self.motion_display:
-                self.motion_display.remove()
-                self.figure.canvas.draw()
+                self.overlay.remove_artist(self.motion_display)
             self.motion_display = None
 
-    def set_coordinate_grid_enabled(self, enabled):
-        self.coordinate_grid_enabled = enabled
-
-    def set_grid_labels_enabled(self, enabled):
-        self.grid_labels_enabled = enabled
-
-    def on_xlims_change(axes):
-        pass
-
-    def on_ylims_change(axes):
-        pass
-
+    @timed('on_mouse_move')
     def on_mouse_move(self, event):
-        if not self.map:
+        if not self.map or event.xdata is None:
             return
         lon, lat = self.map(event.xdata, event.ydata, inverse=True)
         lonll = max(self.lonll, self.map.llcrnrlon)
@@ -122,7 +121,7 @@ class PlotPanel(wx.Panel):
             if self.motion_display is None:
                 # setup coordinate display for mouse motion
                 self.motion_display = self.ax.annotate(
-                        s="(NaN, NaN)",
+                        "(NaN, NaN)",
                         xy=(0.995, 0.995),
                         xycoords='axes fraction',
                         fontproperties=self.motion_display_font,
@@ -130,32 +129,98 @@ class PlotPanel(wx.Panel):
                         horizontalalignment='right',
                         bbox=dict(facecolor='white', alpha=1.0, pad=0.2, lw=0.2)
                         )
+                self.overlay.add_artist(self.motion_display)
 
             display_lon = self.wrap_lon_at_day_boundary(lon)
             self.motion_display.set_text('(%+10.5f,%+10.5f)' % (display_lon, lat))
-            self.ax.draw_artist(self.motion_display)
-            self.canvas.blit(self.motion_display.get_window_extent())
-        else:
-            if self.motion_display:
-                self.motion_display.remove()
-                self.figure.canvas.draw()
-            self.motion_display = None
+            self.motion_display.set_visible(True)
+            self.overlay.update([self.motion_display])
+        elif self.motion_display and self.motion_display.get_visible():
+            # hide instead of removing, so leaving the map only restores the
+            # cached background rather than re-rendering the whole figure
+            self.motion_display.set_visible(False)
+            self.overlay.update([self.motion_display])
 
     def wrap_lon_at_day_boundary(self, lon):
-        wrapped_lon = lon
-        while wrapped_lon < -180:
-            wrapped_lon += 360.0
-        while wrapped_lon > 180:
-            wrapped_lon -= 360.0
-        return wrapped_lon
-
-    def do_dynamic_update(self):
-        if not self.map:
+        return float(wrap_lon(lon))
+
+    def invalidate(self, *layers):
+        """
+        Requests a redraw of the given layers through the render scheduler
+        """
+        self.scheduler.invalidate(*layers)
+
+    def interact(self):
+        """
+        Notes a pan, zoom or drag in progress: frames are reduced until the
+        view has been idle for a while, and any full-quality render under
+        way is abandoned
+        """
+        self._refine_steps = None
+        self.progressive.interact()
+
+    def set_progressive_rendering(self, enabled=None, dpi=None,
+                                  idle_ms=None):
+        """
+        Sets whether frames are reduced while interacting, their resolution
+        and how long the view must be idle before a full-quality frame
+        """
+        self.progressive.configure(dpi, idle_ms, enabled)
+
+    def _refine(self):
+        """
+        Renders the full-quality frame after an interaction, one layer per
+        event loop turn so that renewed interaction can cancel it
+        """
+        steps = self._refine_steps = iter(list(self.layers.values()))
+        wx.CallAfter(self._refine_step, steps)
+
+    def _refine_step(self, steps):
+        if steps is not self._refine_steps:
+            return
+        layer = next(steps, None)
+        if layer is None:
+            self._refine_steps = None
+            self._report_latency = True
+            # a full frame, with the grid labels back
+            self.invalidate('grid', 'frame')
             return
+        with self.profiler.timer('refine'):
+            layer.update_view()
+        wx.CallAfter(self._refine_step, steps)
 
-        # update meridians
-        self._plot_meridians_and_parallels()
-        self.figure.canvas.draw()
+    def _building_layers(self):
+        return self.layer_builder.busy()
+
+    def _timer(self, callback):
+        timer = wx.Timer(self)
+        self.Bind(wx.EVT_TIMER, callback, timer)
+        return timer
+
+    def _set_status(self, text):
+        self.statusbar.SetStatusText(text)
+
+    def begin_pan(self):
+        """
+        Takes the frame on screen as the start of a pixel-shift pan, once
+        any pending render is on it
+        """
+        self.scheduler.flush()
+        MapView.begin_pan(self)
+
+    def end_pan(self):
+        """
+        Ends a pixel-shift pan with a full-quality render of the final view:
+        the refinement pass when frames were reduced, which stands in for
+        any frame still pending
+        """
+        self.pan_cache.end()
+        if self.progressive.interacting:
+            self.scheduler.cancel()
+            self.progressive.settle()
+            return
+        self.invalidate('view')
+        self.scheduler.flush()
 
     def set_right_click_zoomed(self):
         self._rc_zoomed = True
@@ -177,397 +242,359 @@ class PlotPanel(wx.Panel):
         wx.CallAfter(self.PopupMenu, menu)
 
     def callback(self, event):
-        self.map.plot(self.click_event.xdata, self.click_event.ydata,
-                      'r.', markersize=1.)
-        self.figure.canvas.draw()
+        self.add_point(self.click_event.xdata, self.click_event.ydata)
+
+    def set_playback_data(self, times, lons, lats, ids=None, duration=None):
+        MapView.set_playback_data(self, times, lons, lats, ids, duration)
+        self.toolbar.set_time_fraction(0.0)
+
+    def session_layers(self):
+        """
+        The data layers to save with the session, keyed by layer name; the
+        arrays are only copied when a layer is actually written
+        """
+        layers = dict(self.pending_layers)
+        if self.points.count:
+            layers['points'] = SessionLayer(
+                    'points',
+                    loader=lambda: {'lons': self.points.lons.copy(),
+                                    'lats': self.points.lats.copy()},
+                    token='%s-%d' % (self._session_key, self.points.version))
+        for index, track in enumerate(self.tracks):
+            layers['track-%d' % index] = SessionLayer(
+                    'track',
+                    {'linewidth': track.kwargs.get('linewidths'),
+                     'color': track.kwargs.get('colors')},
+                    loader=lambda track=track: {
+                        'lons': track.lod.vertices[:, 0],
+                        'lats': track.lod.vertices[:, 1]},
+                    token=self._session_key)
+        # playback of the input file is loaded again with it
+        if self.playback.index is not None and \
+                self.playback.index is not self._input_index:
+            layers['playback'] = SessionLayer(
+                    'playback',
+                    {'duration': self.playback.duration},
+                    loader=self.playback.arrays,
+                    token='%s-%d' % (self._session_key,
+                                     self.playback.version))
+        return layers
+
+    def load_session_layers(self, layers):
+        """
+        Replaces the data layers with the ones read from a session; their
+        arrays are only read once they are next drawn
+        """
+        self.points.clear()
+        for index, track in enumerate(self.tracks):
+            if track.collection.axes is not None:
+                track.collection.remove()
+            self.layers.pop('track-%d' % index, None)
+        self.tracks = []
+        self._session_key = uuid.uuid4().hex[:8]
+        self.pending_layers = dict(layers)
+        self.invalidate('points')
+
+    def _on_playback_frame(self, playback):
+        self.statusbar.SetStatusText(
+                'Playback %5.1f fps' % playback.achieved_fps)
+        self.toolbar.set_time_fraction(playback.fraction())
+        if not playback.playing():
+            self.toolbar.set_playing(False)
 
     def clear_artifacts(self):
         for artifact in ['artists', 'lines', 'patches']:
-            while getattr(self.ax, 'artists') != []:
-                getattr(self.ax, 'artists')[0].remove()
+            for artist in list(getattr(self.ax, artifact)):
+                artist.remove()
         self.artifacts = {'artists': [],
                           'lines': [],
                           'patches': []}
 
+    @timed('updatePlot')
     def updatePlot(self, attrs):
-
+        """
+        Applies a set of plot properties.  Only the map layers depending on
+        properties that changed are rebuilt: cheap ones in place, expensive
+        ones on a background thread.  The first plot and projection changes
+        rebuild the whole figure on a background thread, superseding any
+        rebuild already in progress.
+        """
+        if self.plot_param is not None and \
+                not self.background_renderer.busy() and \
+                not self.layer_builder.busy() and \
+                projection_from_param(attrs) is axes_projection(self.ax):
+            changed = update_layers(self.ax, self.layers, self.plot_param,
+                                    attrs, self.base_image,
+                                    defer_expensive=True)
+            self.plot_param = dict(attrs)
+            if any(name not in self.layers
+                   for name in MAP_LAYERS.enabled(attrs)):
+                self.statusbar.SetStatusText('Plotting...')
+                self.layer_builder.submit(attrs,
+                                          self.figure.get_size_inches(),
+                                          self.figure.dpi)
+            self._play_input()
+            if changed:
+                self.invalidate(*changed)
+            return
         self.statusbar.SetStatusText('Plotting... (Please Be Patient)')
-        self.ax.clear()
-        self.plot(attrs)
+        self.layer_builder.cancel()
+        self.background_renderer.submit(attrs,
+                                        self.figure.get_size_inches(),
+                                        self.figure.dpi)
+
+    @timed('build figure')
+    def _build_figure(self, figure, param, job):
+        """
+        Populates a fresh figure for the background renderer, leaving out
+        the map layers the compositor's workers rasterize (worker thread)
+        """
+        ax = create_axes(figure, projection_from_param(param))
+        sent = self.compositor.submit(figure, param, self.base_image)
+        return self._index_input(
+                plot_layers(ax, param, self.base_image, job,
+                            names=[name for name in MAP_LAYERS.names
+                                   if name not in sent]),
+                param, job)
+
+    @timed('draw figure')
+    def _draw_figure(self, figure, job):
+        """
+        Rasterizes a figure built by the background renderer, its map layers
+        in parallel worker processes (worker thread)
+        """
+        self.compositor.draw(figure, job.result, job.param, self.base_image)
+
+    def set_parallel_rendering(self, workers=None, min_layers=None):
+        """
+        Sets how many worker processes rasterize the map layers of full
+        renders (0 draws them in process), and the fewest layers worth
+        sending to them
+        """
+        self.compositor.configure(workers, min_layers)
+
+    def _on_render_progress(self, job, fraction, message):
+        if job is self.background_renderer.job or \
+                job is self.layer_builder.job:
+            self.statusbar.SetStatusText(
+                    'Plotting... %3d%% %s' % (100 * fraction, message))
+
+    def _on_render_done(self, job, figure):
+        self._install_figure(figure, job.result)
+        self.plot_param = dict(job.param)
+        self._play_input()
+        if any(name not in self.layers
+               for name in MAP_LAYERS.enabled(job.param)):
+            self.layer_builder.submit(job.param, figure.get_size_inches(),
+                                      figure.dpi)
+        if self.pending_layers:
+            self.invalidate('points')
         self.statusbar.SetStatusText('Ready')
+        if self.on_first_frame:
+            on_first_frame, self.on_first_frame = self.on_first_frame, None
+            on_first_frame()
 
-    def plot(self, param):
-        # Create Map
-        if not param:
-            self.ax.stock_img()
-            self.figure.canvas.draw()
-
-            # # Create a really simple plot to fill the void on app startup.
-            # self.map = Basemap(ax=self.ax, resolution=RESOLUTION_MAP['Crude'],
-            #                    ellps='WGS84', suppress_ticks=True)
-            # self.map.bluemarble()
-            # self._plot_meridians_and_parallels()
-
-            # # add the motion display to the list of texts for the new axes
-            # if self.motion_display:
-            #     self.ax.texts.append(self.motion_display)
-            # self.figure.canvas.draw()
+    def _on_render_failed(self, job, error):
+        self.statusbar.SetStatusText('Plotting failed: %s' % error)
+
+    @timed('build map layers')
+    def _build_map_layers(self, figure, param, job):
+        """
+        Builds the map layers on a figure of their own for the layer
+        builder (worker thread)
+        """
+        ax = create_axes(figure, projection_from_param(param))
+        return self._index_input(plot_layers(ax, param, self.base_image, job),
+                                 param, job)
+
+    def _index_input(self, layers, param, job):
+        """
+        Indexes the input file for playback along with its layer, when it
+        is time-tagged (worker thread)
+        """
+        if 'input' in layers:
+            job.progress(0.95, 'Indexing input times')
+            get_time_index(param['inputfile'])
+        return layers
+
+    def _play_input(self):
+        """
+        Loads the input file into playback once its layer is up, when it is
+        time-tagged, and unloads it with the input file
+        """
+        path = self.plot_param.get('inputfile')
+        if path and 'input' not in self.layers:
+            # still being built
+            return
+        index = get_time_index(path) if path else None
+        if index is self._input_index:
+            return
+        if index is not None:
+            self.playback.set_index(index)
+        elif self.playback.index is self._input_index:
+            self.playback.clear()
+        self._input_index = index
+        self.toolbar.set_time_fraction(0.0)
+        self.toolbar.set_playing(False)
+
+    def _on_map_layers_built(self, job, figure):
+        """
+        Mirrors the map layers the figure is missing from the ones built by
+        the layer builder, sharing their data.  Nothing is drawn here: after
+        a parallel render their frame is already on screen, and after new
+        properties the renders held for them follow.  The plot's own layers
+        are attached again to stay on top of them.
+        """
+        if job.param != self.plot_param:
             return
+        self.statusbar.SetStatusText('Ready')
+        layers = {}
+        for name in MAP_LAYERS.names:
+            if name in self.layers:
+                layers[name] = self.layers[name]
+            elif name in job.result:
+                layers[name] = job.result[name].mirror(self.ax)
+                layers[name].update_view()
+        self._adopt_layers(layers)
+        for name, layer in self.layers.items():
+            if name not in MAP_LAYERS.names:
+                layer.update_view()
+        self._play_input()
+        self.overlay.update()
+        self._release_held()
+
+    def _on_map_layers_failed(self, job, error):
+        """
+        Reports map layers that could not be built; the renders held for
+        them go ahead without them
+        """
+        self._on_render_failed(job, error)
+        self._release_held()
+
+    def _release_held(self):
+        held, self._held = self._held, set()
+        if held:
+            self.invalidate(*held)
 
-        # projection_name = param['Projection']
-        # projection_key = revlookup(PROJECTIONS, 'name', projection_name)
-        # resolution = RESOLUTION_MAP[param['Resolution']]
-        # kwargs = {'projection': projection_key,
-        #           'ellps': 'WGS84',
-        #           'suppress_ticks': True,
-        #           'ax': self.ax,
-        #           'resolution': resolution}
-        # for p in PROJECTION_PARAMS[projection_key].keys():
-        #     if 'rspherex' == p:
-        #         kwargs['rsphere'] = (param[OPTIONS['rspherex']['name']],
-        #                              param[OPTIONS['rspherey']['name']])
-        #     elif 'rspherey' == p:
-        #         pass
-        #     else:
-        #         kwargs[p] = param[OPTIONS[p]['name']]
-        # self.map = Basemap(**kwargs)
-
-        # # Draw Circle
-        # self.draw_range_circle(param["longitude"],
-        #                        param["geodetic_latitude"],
-        #                        param["range"],
-        #                        color='r',
-        #                        alpha=0.5)
-
-        # # Draw Blue Marble Texture
-        # if param.get('Blue Marble', False):
-        #     self.map.bluemarble()
-        # else:
-        #     self.map.fillcontinents(color='coral', lake_color='aqua')
-
-        # # Draw Coastlines, borders, lines
-        # if param.get('Coastlines', False):
-        #     self.map.drawcoastlines()
-        # if param.get('State Borders', False):
-        #     self.map.drawstates()
-        # if param.get('Country Borders', False):
-        #     self.map.drawcountries()
-        # self._plot_meridians_and_parallels()
-
-        # # add the motion display to the list of texts for the new axes
-        # if self.motion_display:
-        #     self.ax.texts.append(self.motion_display)
-
-        # self.figure.canvas.draw()
+    def save_preview(self, path):
+        """
+        Saves the current frame as a PNG, shown as the preview at the next
+        startup
+        """
+        bitmap = getattr(self.canvas, 'bitmap', None)
+        if bitmap is None or not bitmap.IsOk():
+            return
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        bitmap.SaveFile(path, wx.BITMAP_TYPE_PNG)
+
+    @timed('install figure')
+    def _install_figure(self, figure, layers):
+        """
+        Swaps a figure rendered by the background renderer into the canvas,
+        with layers, the map layers built on it.  The rendered frame is
+        copied to the canvas rather than drawn again, and only the plot's
+        own layers, the grid and the overlay are drawn over it.
+        """
+        frame = np.asarray(figure.canvas.get_renderer().buffer_rgba())
+        figure.set_canvas(self.canvas)
+        self.canvas.figure = figure
+        self.figure = figure
+        self.ax = figure.axes[0]
+        self._connect_axes()
+
+        # the event connections are held by the figure
+        self.canvas.mpl_connect('button_release_event', self.onclick)
+        self.overlay.connect()
+        self.toolbar.connect()
+
+        self.overlay.clear()
+        self.motion_display = None
+        self._setup_grid()
+        self.toolbar.update()
+
+        rendered = set(self.ax.get_children())
+        self._held = set()
+        self._adopt_layers(layers)
+        renderer = self.canvas.get_renderer()
+        target = np.asarray(renderer.buffer_rgba())
+        if target.shape != frame.shape:
+            # the canvas was resized while rendering
+            self.invalidate('view')
+            return
+        target[...] = frame
+        for name, layer in self.layers.items():
+            if name not in MAP_LAYERS.names:
+                layer.update_view()
+        with self.profiler.draw_timers(self._layer_artists()):
+            for artist in sorted((artist for artist in self.ax.get_children()
+                                  if artist not in rendered and
+                                  artist.get_visible() and
+                                  not artist.get_animated()),
+                                 key=lambda artist: artist.get_zorder()):
+                artist.draw(renderer)
+        self._plot_meridians_and_parallels()
+        self.overlay.on_draw(None)
+        with self.profiler.timer('blit'):
+            self.canvas.blit()
 
     def draw_great_circle(self, x1, y1, x2, y2, linewidth=.5, color='r'):
-        self.map.drawgreatcircle(x1, y1, x2, y2, linewidth, color)
+        return self.draw_great_circles([x1], [y1], [x2], [y2],
+                                       linewidth=linewidth, color=color)
+
+    def draw_great_circles(self, x1, y1, x2, y2, linewidth=.5, color='r'):
+        """
+        Draws the WGS84 geodesics from x1/y1 to x2/y2 (lon/lat arrays) as a
+        single polyline layer
+        """
+        paths = geodesy.great_circles(y1, x1, y2, x2)
+        return self.add_shape(PolylineLayer(
+                LodPolylines(geodesy.path_segments(paths)), self.ax,
+                linewidths=linewidth, colors=color))
+
+    def _add_annotation(self, factory, x, y, xycoords):
+        """
+        Adds an anchored artist, through the annotation layer's spatial index
+        when anchored in data coordinates
+        """
+        if xycoords != 'data':
+            self.ax.add_artist(factory((x, y)))
+            return
+        self.annotations.add(factory, x, y)
+        self.invalidate('annotations')
 
     def draw_text(self, text, x, y, xycoords='data', color='white',
                   size='xx-small'):
-        self.ax.add_artist(
-            AnnotationBbox(
+        self._add_annotation(
+            lambda xy: AnnotationBbox(
                 TextArea(
                     text, minimumdescent=False, textprops={'color': color,
-                                                           'size': size})
-                (x, y), xycoords='data', frameon=False))
+                                                           'size': size}),
+                xy, xycoords=xycoords, frameon=False),
+            x, y, xycoords)
 
     def draw_image(self, image, x, y, zoom=.1, alpha=.7, xycoords='data'):
-        if isinstance(image, PyEmbeddedImage):
-            png = pyembeddedimage_to_png(image)
-        elif isinstance(image, basestring):
-            png = read_png(image)
-        else:
-            png = image
-        self.ax.add_artist(
-            AnnotationBbox(
+        """
+        Places an image at x/y; embedded images, PNG files, PNG bytes and wx
+        bitmaps are decoded once and shared through the image cache
+        """
+        png = load_image(image)
+        self._add_annotation(
+            lambda xy: AnnotationBbox(
                 OffsetImage(png, zoom=zoom, alpha=alpha),
-                (x, y), xycoords=xycoords, frameon=False))
+                xy, xycoords=xycoords, frameon=False),
+            x, y, xycoords)
 
     def draw_range_circle(self, lat, lon, radius, color='r', alpha=.5):
-        # FIXME Use the real radius of the earth at this lat/lon
-        self.map.tissot(lon, lat,
-                        180./pi * radius / 6370.,
-                        256,
-                        facecolor=color,
-                        alpha=alpha)
+        return self.draw_range_circles([lat], [lon], [radius], color=color,
+                                       alpha=alpha)
 
-    def _plot_meridians_and_parallels(self):
+    def draw_range_circles(self, lats, lons, radii, color='r', alpha=.5):
         """
-        Plots meridians and parallels appropriate for the current zoom level
+        Draws WGS84 range circles of radii [km] around lats/lons as a single
+        polygon layer
         """
-
-        # if grid is off and labels are off wipe lines
-        if not self.coordinate_grid_enabled and not self.grid_labels_enabled:
-            self._label_grid([], [])
-            self._clear_meridians_and_parallels()
-            return
-
-        # FIXME: Get this working for other projections
-        if self.map.projection != 'cyl':
-            self._clear_meridians_and_parallels()
-
-            # FIXME: Make it an option to turn on/off white or black lines
-            if self.coordinate_grid_enabled:
-                lats = np.linspace(-90, 90, 10)
-                self.parallels_b = self.map.drawparallels(
-                        lats,
-                        labels=[True, False, False, False],
-                        fontsize=GRID_LABEL_FONT_SIZE,
-                        linewidth=0.2,
-                        dashes=[],
-                        color='black'
-                        )
-                self.parallels_w = self.map.drawparallels(
-                        lats,
-                        labels=[False, False, False, False],
-                        linewidth=0.2,
-                        dashes=[1, 1],
-                        color='white'
-                        )
-                lons = np.linspace(-180, 180, 10)
-                self.meridians_b = self.map.drawmeridians(
-                        lons,
-                        labels=[False, False, False, True],
-                        fontsize=GRID_LABEL_FONT_SIZE,
-                        linewidth=0.2,
-                        dashes=[],
-                        color='black'
-                        )
-                self.meridians_w = self.map.drawmeridians(
-                        lons,
-                        labels=[False, False, False, False],
-                        linewidth=0.2,
-                        dashes=[1, 1],
-                        color='white'
-                        )
-
-            self._label_grid(lons, lats)
-            return
-
-        # get the corners of the viewport
-        self.lonll, self.latll, delta_lon, delta_lat = self.ax.viewLim.bounds
-        self.latur = self.latll + delta_lat
-        self.lonur = self.lonll + delta_lon
-
-        # translate to lat/lon (if needed)
-        self.lonll, self.latll = self.map(self.lonll, self.latll, inverse=True)
-        self.lonur, self.latur = self.map(self.lonur, self.latur, inverse=True)
-
-        if not self._zoom_is_valid():
-            return
-
-        # get the range of lat/lon of the current viewport
-        lat_range = self.latur - self.latll
-        lon_range = self.lonur - self.lonll
-
-        # get the estimated number of parallels and meridians to plot
-        nlons = round(NUM_GRID_LINES * 360.0 / lon_range)
-        nlats = round(NUM_GRID_LINES * 180.0 / lat_range)
-
-        found = False
-        for kv in LAT_GRID_LOOKUP:
-            if nlats <= kv[0]:
-                self.nlats = kv[1]
-                found = True
-                break
-        if not found:
-            self.nlats = self._scale_grid_by_twos(nlats, self.nlats)
-
-        found = False
-        for kv in LON_GRID_LOOKUP:
-            if nlons <= kv[0]:
-                self.nlons = kv[1]
-                found = True
-                break
-        if not found:
-            self.nlons = self._scale_grid_by_twos(nlons, self.nlons)
-
-        # return if we've got too few to plot
-        if self.nlons <= 1 or self.nlats <= 1:
-            return
-
-        # calculate the actual meridian coordinates
-        lons = np.linspace(-180, 180.0, self.nlons)
-        lons = np.concatenate((lons-360.0, lons, lons+360.0))
-        lats = np.linspace(-90.0, 90.0, self.nlats)
-
-        # filter them to speed plotting
-        lon_condition = lons >= self.lonll
-        lons = np.extract(lon_condition, lons)
-        lon_condition = lons <= self.lonur
-        lons = np.extract(lon_condition, lons)
-
-        lat_condition = lats >= self.latll
-        lats = np.extract(lat_condition, lats)
-        lat_condition = lats <= self.latur
-        lats = np.extract(lat_condition, lats)
-
-        # plot labels for each one
-        self._label_grid(lons, lats)
-
-        self.lats = lats
-        self.lons = lons
-
-        # plot new parallels/meridians
-        # these are made up of a solid black line, and a dashed white line
-        self._clear_meridians_and_parallels()
-
-        # FIXME: Make it an option to turn on/off white or black lines
-        if self.coordinate_grid_enabled:
-            self.parallels_b = self.map.drawparallels(
-                    lats,
-                    labels=[False, False, False, False],
-                    linewidth=0.2,
-                    dashes=[],
-                    color='black'
-                    )
-            self.parallels_w = self.map.drawparallels(
-                    lats,
-                    labels=[False, False, False, False],
-                    linewidth=0.2,
-                    dashes=[1, 1],
-                    color='white'
-                    )
-            self.meridians_b = self.map.drawmeridians(
-                    lons,
-                    labels=[False, False, False, False],
-                    linewidth=0.2,
-                    dashes=[],
-                    color='black'
-                    )
-            self.meridians_w = self.map.drawmeridians(
-                    lons,
-                    labels=[False, False, False, False],
-                    linewidth=0.2,
-                    dashes=[1, 1],
-                    color='white'
-                    )
-
-    def _label_grid(self, lons, lats):
-        """
-        Plots labels on grid lines.
-        """
-        degree_sign = u'\N{DEGREE SIGN}'
-        for label in self.labels:
-            if label in self.ax.texts:
-                label.remove()
-        self.labels = []
-
-        if self.grid_labels_enabled:
-
-            # peg the corners on the projection boundaries
-            lonll = max(self.lonll, self.map.llcrnrlon)
-            lonur = min(self.lonur, self.map.urcrnrlon)
-            latll = max(self.latll, self.map.llcrnrlat)
-            latur = min(self.latur, self.map.urcrnrlat)
-
-            for lat in lats:
-                if lat > latur or lat < latll:
-                    continue
-                if lat >= 0:
-                    NS = 'N'
-                else:
-                    NS = 'S'
-                (d, m, sd) = self._to_dms(lat)
-                self.labels.append(self.ax.text(lonll, lat,
-                                                   "%02d%s%02d'%05.2f\"%s" % (abs(d), degree_sign, m, sd, NS),
-                                                   fontproperties=self.grid_label_font, verticalalignment='center',
-                                                   horizontalalignment='left',
-                                                   bbox=dict(facecolor='white', alpha=0.5, pad=0.2, lw=0.2)))
-
-            for lon in lons:
-                if lon > lonur or lon < lonll:
-                    continue
-
-                # normalize
-                display_lon = self.wrap_lon_at_day_boundary(lon)
-                if display_lon >= 0:
-                    NS = 'E'
-                else:
-                    NS = 'W'
-                (d, m, sd) = self._to_dms(display_lon)
-                self.labels.append(self.ax.text(lon, latll,
-                                                   "%03d%s%02d'%05.2f\"%s" % (abs(d), degree_sign, m, sd, NS),
-                                                   fontproperties=self.grid_label_font, rotation='vertical',
-                                                   verticalalignment='bottom', horizontalalignment='center',
-                                                   bbox=dict(facecolor='white', alpha=0.5, pad=0.2, lw=0.2)))
-
-    def _to_dms(self, deg):
-        """
-        Converts degrees to degrees minutes seconds
-        """
-        d = int(deg)
-        md = abs(deg - d) * 60.0
-        m = int(md)
-        sd = (md - m) * 60.0
-        return [d, m, sd]
-
-    def _scale_grid_by_twos(self, n_target, n_current):
-        """
-        Determines number of grid lines to plot via hopping by powers of 2
-        """
-        half_n_current = int(n_current / 2.0) + 1
-        twice_n_current = round(n_current * 2) - 1
-        if n_target < n_current and n_target > 1:
-            while n_target < n_current:
-                n_current = half_n_current
-                half_n_current = int(n_current / 2.0) + 1
-                if n_current < 3:
-                    break
-        else:
-            while n_target >= twice_n_current:
-                n_current = twice_n_current
-                twice_n_current = round(n_current * 2) - 1
-
-        # should be an odd number at this point, but make sure
-        if n_current % 2 == 0:
-            n_current += 1
-
-        return n_current
-
-    def _zoom_is_valid(self):
-        """
-        Checks if zoom level is valid
-        """
-        # check if corners are valid
-        try:
-            delta_lon = self.lonur - self.lonll
-            delta_lat = self.latur - self.latll
-        except:
-            return False
-        return True
-
-    def _clear_meridians_and_parallels(self):
-        """
-        Clears currently plotted meridians and parallels
-        """
-        # clear old meridians and parallels
-        # these are made up of a solid black line, and a dashed white line
-        for par in self.parallels_w:
-            for item in self.parallels_w[par]:
-                if len(item) > 0:
-                    if item[0] in self.ax.lines:
-                        item[0].remove()
-        self.parallels_w.clear()
-
-        for par in self.parallels_b:
-            for item in self.parallels_b[par]:
-                if len(item) > 0:
-                    if item[0] in self.ax.lines:
-                        item[0].remove()
-        self.parallels_b.clear()
-
-        for mer in self.meridians_w:
-            for item in self.meridians_w[mer]:
-                if len(item) > 0:
-                    if item[0] in self.ax.lines:
-                        item[0].remove()
-        self.meridians_w.clear()
-
-        for mer in self.meridians_b:
-            for item in self.meridians_b[mer]:
-                if len(item) > 0:
-                    if item[0] in self.ax.lines:
-                        item[0].remove()
-        self.meridians_b.clear()
+        rings = geodesy.range_rings(lats, lons, np.asarray(radii) * 1000.0)
+        return self.add_shape(PolygonLayer(
+                geodesy.ring_polygons(rings), self.ax, facecolors=color,
+                edgecolors='none', alpha=alpha))
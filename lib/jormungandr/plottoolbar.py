@@ -1,6 +1,14 @@
+import contextlib
 import wx
+from matplotlib.patches import Rectangle
+from matplotlib.transforms import IdentityTransform
 from matplotlib.backends.backend_wx import NavigationToolbar2Wx as NavigationToolbar
 
+TIME_SLIDER_STEPS = 1000
+
+# view scale per mouse wheel step, as for matplotlib's own wheel zoom
+SCROLL_ZOOM = 0.85
+
 
 class PlotToolbar(NavigationToolbar):
 
@@ -20,10 +28,12 @@ class PlotToolbar(NavigationToolbar):
         self._checkboxes['cursor'] = wx.CheckBox(self, label='&Cursor Coords')
         self._checkboxes['grid'] = wx.CheckBox(self, label='Coord &Grid')
         self._checkboxes['gridlabel'] = wx.CheckBox(self, label='Grid &Labels')
+        self._checkboxes['hud'] = wx.CheckBox(self, label='Profiler &HUD')
         self.AddSeparator()
         self.AddControl(self._checkboxes['cursor'])
         self.AddControl(self._checkboxes['grid'])
         self.AddControl(self._checkboxes['gridlabel'])
+        self.AddControl(self._checkboxes['hud'])
 
         # bind the checkboxes
         self.Bind(
@@ -38,13 +48,30 @@ class PlotToolbar(NavigationToolbar):
                 wx.EVT_CHECKBOX, self.on_checkbox,
                 id=self._checkboxes['gridlabel'].GetId()
                 )
+        self.Bind(
+                wx.EVT_CHECKBOX, self.on_checkbox,
+                id=self._checkboxes['hud'].GetId()
+                )
 
         # default values for checkboxes
         self._checkboxes['cursor'].SetValue(wx.CHK_CHECKED)
         self._checkboxes['grid'].SetValue(wx.CHK_CHECKED)
         self._checkboxes['gridlabel'].SetValue(wx.CHK_CHECKED)
 
+        # add playback controls for time-tagged tracks
+        self._play = wx.ToggleButton(self, label='&Play')
+        self._time = wx.Slider(self, value=0, minValue=0,
+                               maxValue=TIME_SLIDER_STEPS)
+        self.AddSeparator()
+        self.AddControl(self._play)
+        self.AddControl(self._time)
+        self.Bind(wx.EVT_TOGGLEBUTTON, self.on_play, id=self._play.GetId())
+        self.Bind(wx.EVT_SLIDER, self.on_time_slider, id=self._time.GetId())
+
         self._zoom_pressed = False
+        self._rubberband = None
+        self._id_scroll = self.canvas.mpl_connect('scroll_event',
+                                                  self.on_scroll)
 
         self.Realize()
 
@@ -52,7 +79,69 @@ class PlotToolbar(NavigationToolbar):
         self.plot.set_cursor_coordinates_enabled(self._checkboxes['cursor'].GetValue())
         self.plot.set_coordinate_grid_enabled(self._checkboxes['grid'].GetValue())
         self.plot.set_grid_labels_enabled(self._checkboxes['gridlabel'].GetValue())
-        self.plot.do_dynamic_update()
+        self.plot.set_profiler_hud_enabled(self._checkboxes['hud'].GetValue())
+        self.plot.invalidate('grid')
+
+    def on_play(self, event):
+        if self._play.GetValue():
+            self.plot.playback.play()
+        else:
+            self.plot.playback.pause()
+        self.set_playing(self.plot.playback.playing())
+
+    def on_time_slider(self, event):
+        self.plot.playback.seek_fraction(
+                self._time.GetValue() / float(TIME_SLIDER_STEPS))
+
+    def set_playing(self, playing):
+        self._play.SetValue(playing)
+        self._play.SetLabel('&Pause' if playing else '&Play')
+
+    def set_time_fraction(self, fraction):
+        self._time.SetValue(int(round(fraction * TIME_SLIDER_STEPS)))
+
+    def connect(self):
+        """
+        Connects the navigation to the figure on the canvas, after another
+        figure has been swapped in; the figure holds the event connections
+        """
+        self._id_press = self.canvas.mpl_connect('button_press_event',
+                                                 self.on_button)
+        self._id_release = self.canvas.mpl_connect('button_release_event',
+                                                   self.on_button)
+        self._id_drag = self.canvas.mpl_connect('motion_notify_event',
+                                                self.mouse_move)
+        self._id_scroll = self.canvas.mpl_connect('scroll_event',
+                                                  self.on_scroll)
+
+    @contextlib.contextmanager
+    def _without_redraw(self):
+        """
+        Runs a navigation handler of the base class without the redraw it
+        asks the canvas for; the handlers here have the plot's render
+        scheduler draw the view instead
+        """
+        self.canvas.draw_idle = lambda *args, **kwargs: None
+        try:
+            yield
+        finally:
+            del self.canvas.draw_idle
+
+    def on_button(self, event):
+        """
+        Mouse button callback, handing the event to the pan or zoom mode
+        """
+        pressed = event.name == 'button_press_event'
+        if self.mode == 'pan/zoom':
+            if pressed:
+                self.press_pan(event)
+            else:
+                self.release_pan(event)
+        elif self.mode == 'zoom rect':
+            if pressed:
+                self.press_zoom(event)
+            else:
+                self.release_zoom(event)
 
     def press_pan(self, event):
         """
@@ -62,12 +151,22 @@ class PlotToolbar(NavigationToolbar):
         if event.button != 1 and event.button != 3:
             return
         NavigationToolbar.press_pan(self, event)
+        if self._pan_info is not None:
+            self.plot.begin_pan()
 
     def drag_pan(self, event):
         """
-        Callback for mouse motion in pan mode
+        Callback for mouse motion in pan mode; the frame is shifted from the
+        plot's pan cache instead of re-rendering every layer
         """
-        NavigationToolbar.drag_pan(self, event)
+        if event.buttons != {self._pan_info.button}:
+            with self._without_redraw():
+                NavigationToolbar.drag_pan(self, event)
+            return
+        for ax in self._pan_info.axes:
+            ax.drag_pan(self._pan_info.button, event.key, event.x, event.y)
+        self.plot.interact()
+        self.plot.pan_frame()
         if event.button == 3:
             self.plot.set_right_click_zoomed()
 
@@ -76,16 +175,11 @@ class PlotToolbar(NavigationToolbar):
         Callback for mouse button release in pan mode
         """
         # disable any buttons except 1 and 3
-        if event.button != 1 and event.button != 3:
+        if event is not None and event.button != 1 and event.button != 3:
             return
-        NavigationToolbar.release_pan(self, event)
-
-    def dynamic_update(self):
-        """
-        Dynamic updater for plot
-        """
-        NavigationToolbar.dynamic_update(self)
-        self.plot.do_dynamic_update()
+        with self._without_redraw():
+            NavigationToolbar.release_pan(self, event)
+        self.plot.end_pan()
 
     def press_zoom(self, event):
         """
@@ -105,8 +199,65 @@ class PlotToolbar(NavigationToolbar):
         if event.button != 1:
             return
         self._zoom_pressed = False
-        NavigationToolbar.release_zoom(self, event)
-        self.plot.do_dynamic_update()
+        view = self.plot.ax.viewLim.bounds
+        with self._without_redraw():
+            NavigationToolbar.release_zoom(self, event)
+        if self.plot.ax.viewLim.bounds != view:
+            self.plot.interact()
+        self.plot.invalidate('view')
+
+    def on_scroll(self, event):
+        """
+        Mouse wheel callback, zooming the map in or out around the cursor
+        """
+        ax = event.inaxes
+        if ax is None or event.xdata is None:
+            return
+        self.push_current()
+        scale = SCROLL_ZOOM ** event.step
+        x0, x1 = ax.get_xlim()
+        y0, y1 = ax.get_ylim()
+        ax.set_xlim(event.xdata - (event.xdata - x0) * scale,
+                    event.xdata + (x1 - event.xdata) * scale)
+        ax.set_ylim(event.ydata - (event.ydata - y0) * scale,
+                    event.ydata + (y1 - event.ydata) * scale)
+        self.plot.interact()
+        self.plot.invalidate('view')
+
+    def drag_zoom(self, event):
+        """
+        Callback for mouse motion in zoom mode; the zoom rectangle is drawn
+        on the plot overlay
+        """
+        with self._without_redraw():
+            NavigationToolbar.drag_zoom(self, event)
+
+    def draw_rubberband(self, event, x0, y0, x1, y1):
+        """
+        Draws the zoom rectangle on the plot overlay
+        """
+        if self._rubberband is None:
+            self._rubberband = Rectangle(
+                    (0, 0), 0, 0,
+                    transform=IdentityTransform(),
+                    fill=False,
+                    linewidth=0.5,
+                    linestyle='--',
+                    edgecolor='black'
+                    )
+            self.canvas.figure.add_artist(self._rubberband)
+            self.plot.overlay.add_artist(self._rubberband)
+        self._rubberband.set_bounds(
+                min(x0, x1), min(y0, y1), abs(x1 - x0), abs(y1 - y0))
+        self.plot.overlay.update([self._rubberband])
+
+    def remove_rubberband(self):
+        """
+        Erases the zoom rectangle from the plot overlay
+        """
+        if self._rubberband is not None:
+            self.plot.overlay.remove_artist(self._rubberband)
+            self._rubberband = None
 
     def mouse_move(self, event):
         """
@@ -124,19 +275,22 @@ class PlotToolbar(NavigationToolbar):
         """
         Overloaded home method that resets the zoom, and re-draws meridians
         """
-        NavigationToolbar.home(self, args)
-        self.plot.do_dynamic_update()
+        with self._without_redraw():
+            NavigationToolbar.home(self, args)
+        self.plot.invalidate('view')
 
     def back(self, *args):
         """
         Callback for the "back" button
         """
-        NavigationToolbar.back(self, args)
-        self.plot.do_dynamic_update()
+        with self._without_redraw():
+            NavigationToolbar.back(self, args)
+        self.plot.invalidate('view')
 
     def forward(self, *args):
         """
         Callback for the "forward" button
         """
-        NavigationToolbar.forward(self, args)
-        self.plot.do_dynamic_update()
+        with self._without_redraw():
+            NavigationToolbar.forward(self, args)
+        self.plot.invalidate('view')
@@ -0,0 +1,135 @@
+import numpy as np
+
+from projections import ProjectedCache
+from projections import axes_box
+from projections import axes_projection
+from spatial_index import GridIndex
+
+
+class PointLayer(object):
+    """
+    Points kept in a spatial index and drawn as one scatter artist.
+
+    The index stores the points in growable contiguous arrays, so adding
+    points one at a time is amortized O(1).  On each view update only the
+    points the index returns for the viewport are considered, and of those
+    only one per screen pixel is handed to the artist, so the cost of a
+    frame follows what is visible rather than the size of the layer.
+
+    On other projections than plain lon/lat, the points are projected in
+    bulk and the copies cached per projection, so switching projections
+    back and forth, or appending points, doesn't transform them all again.
+    """
+
+    def __init__(self, ax=None, pixel=1.0, **kwargs):
+        self.pixel = pixel
+        self.kwargs = kwargs
+        self.index = GridIndex()
+        self.version = 0
+        self.generation = 0
+        self.projected = ProjectedCache()
+        self.artist = None
+        self.ax = None
+        if ax is not None:
+            self.attach(ax)
+
+    @property
+    def count(self):
+        return self.index.count
+
+    @property
+    def lons(self):
+        return self.index.lons
+
+    @property
+    def lats(self):
+        return self.index.lats
+
+    def attach(self, ax):
+        """
+        Creates the scatter artist on ax, leaving the point data alone
+        """
+        if self.artist is not None and self.artist.axes is not None:
+            self.artist.remove()
+        self.ax = ax
+        self.artist = ax.scatter(np.empty(0), np.empty(0), **self.kwargs)
+
+    def mirror(self, ax):
+        """
+        A layer drawing the same points on other axes, sharing the index and
+        projected copies
+        """
+        layer = PointLayer(None, self.pixel, **self.kwargs)
+        layer.index = self.index
+        layer.projected = self.projected
+        layer.generation = self.generation
+        layer.attach(ax)
+        return layer
+
+    def remove(self):
+        """
+        Takes the scatter artist off its axes, leaving the point data alone
+        """
+        if self.artist is not None and self.artist.axes is not None:
+            self.artist.remove()
+        self.artist = None
+
+    def set_visible(self, visible):
+        if self.artist is not None:
+            self.artist.set_visible(visible)
+
+    def shown_artists(self):
+        return [self.artist] if self.artist is not None else []
+
+    def append(self, lon, lat):
+        self.index.insert(lon, lat)
+        self.version += 1
+
+    def extend(self, lons, lats):
+        self.index.insert(lons, lats)
+        self.version += 1
+
+    def clear(self):
+        self.index.clear()
+        self.version += 1
+        self.generation += 1
+
+    def visible_points(self):
+        """
+        Positions of the points to draw for the current view: those inside
+        the viewport, decimated to one per pixel
+        """
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        projection = axes_projection(self.ax)
+        if projection.identity:
+            ids, shifts = self.index.query(x0, x1, y0, y1)
+            xs = self.index.lons[ids] + shifts
+            ys = self.index.lats[ids]
+        else:
+            xs, ys = self.projected.get(projection, self.index.lons,
+                                        self.index.lats, self.generation)
+            inside = (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+            xs, ys = xs[inside], ys[inside]
+        box = axes_box(self.ax)
+        width = max(int(box.width / self.pixel), 1)
+        height = max(int(box.height / self.pixel), 1)
+        if len(xs) < width:
+            # too few points for decimation to pay off
+            return xs, ys
+
+        col = (xs - x0) * (width - 1) / max(x1 - x0, 1e-12)
+        row = (ys - y0) * (height - 1) / max(y1 - y0, 1e-12)
+        cells = row.astype(np.intp) * width + col.astype(np.intp)
+
+        # last write wins, leaving one point per occupied pixel
+        occupancy = np.full(width * height, -1, dtype=np.intp)
+        occupancy[cells] = np.arange(len(cells))
+        keep = occupancy[occupancy >= 0]
+        return xs[keep], ys[keep]
+
+    def update_view(self):
+        if self.artist is None:
+            return
+        xs, ys = self.visible_points()
+        self.artist.set_offsets(np.column_stack((xs, ys)))
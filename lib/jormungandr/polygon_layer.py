@@ -0,0 +1,55 @@
+from matplotlib.collections import PolyCollection
+
+from projections import axes_projection
+from projections import project_segments
+
+
+class PolygonLayer(object):
+    """
+    Filled lon/lat polygons, like range circles, drawn as one
+    PolyCollection.  The polygons are projected again only when the axes'
+    projection changes.
+    """
+
+    def __init__(self, polygons, ax=None, **kwargs):
+        self.polygons = polygons
+        self.kwargs = kwargs
+        self.collection = None
+        self.ax = None
+        self._key = None
+        if ax is not None:
+            self.attach(ax)
+
+    def attach(self, ax):
+        if self.collection is not None and self.collection.axes is not None:
+            self.collection.remove()
+        self.ax = ax
+        self.collection = PolyCollection([], **self.kwargs)
+        ax.add_collection(self.collection, autolim=False)
+        self._key = None
+
+    def mirror(self, ax):
+        """
+        A layer drawing the same polygons on other axes
+        """
+        return PolygonLayer(self.polygons, ax, **self.kwargs)
+
+    def remove(self):
+        if self.collection is not None and self.collection.axes is not None:
+            self.collection.remove()
+        self.collection = None
+        self._key = None
+
+    def set_visible(self, visible):
+        if self.collection is not None:
+            self.collection.set_visible(visible)
+
+    def shown_artists(self):
+        return [self.collection] if self.collection is not None else []
+
+    def update_view(self):
+        projection = axes_projection(self.ax)
+        if projection.cache_key != self._key:
+            self._key = projection.cache_key
+            self.collection.set_verts(
+                project_segments(projection, self.polygons))
@@ -0,0 +1,40 @@
+import os
+import wx
+
+PREVIEW_PATH = os.path.join(os.path.expanduser('~'), '.jormungandr',
+                            'preview.png')
+
+
+class PreviewPanel(wx.Panel):
+    """
+    Shows the bitmap of the last view saved by the previous run, scaled to
+    the panel, until the plot is ready to take its place
+    """
+
+    def __init__(self, parent, path=PREVIEW_PATH):
+        wx.Panel.__init__(self, parent, -1)
+        self.image = None
+        if path and os.path.exists(path):
+            self.image = wx.Image(path, wx.BITMAP_TYPE_PNG)
+        self._bitmap = None
+        self.SetBackgroundStyle(wx.BG_STYLE_PAINT)
+        self.Bind(wx.EVT_PAINT, self.on_paint)
+        self.Bind(wx.EVT_SIZE, self.on_size)
+
+    def on_size(self, event):
+        self.Refresh()
+        event.Skip()
+
+    def on_paint(self, event):
+        dc = wx.AutoBufferedPaintDC(self)
+        dc.SetBackground(wx.WHITE_BRUSH)
+        dc.Clear()
+        width, height = self.GetClientSize()
+        if self.image is None or not self.image.IsOk() or \
+                width <= 0 or height <= 0:
+            return
+        if self._bitmap is None or \
+                self._bitmap.GetSize() != wx.Size(width, height):
+            self._bitmap = wx.Bitmap(self.image.Scale(
+                width, height, wx.IMAGE_QUALITY_NORMAL))
+        dc.DrawBitmap(self._bitmap, 0, 0)
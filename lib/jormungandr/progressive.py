@@ -0,0 +1,132 @@
+import contextlib
+
+import numpy as np
+
+from matplotlib.backends.backend_agg import RendererAgg
+
+INTERACTIVE_DPI = 75
+IDLE_RENDER_MS = 300
+
+# weight of the newest frame in the smoothed latencies
+LATENCY_SMOOTHING = 0.2
+
+
+class ProgressiveRendering(object):
+    """
+    Reduced-resolution frames while the user interacts with the plot, and a
+    full-quality frame once the view has been left alone for idle_ms.
+
+    Every interaction marks the plot as interacting and restarts the idle
+    timer.  Frames rendered in the meantime are rasterized at dpi into an
+    offscreen buffer and scaled up to the canvas.  When the timer fires,
+    refine() is called to bring the frame back to full quality; it is
+    expected to work in steps that give up as soon as interacting is set
+    again.  The idle timer is made by timer(callback), a wx.Timer bound to
+    callback for the GUI.
+    """
+
+    def __init__(self, timer, refine, dpi=INTERACTIVE_DPI,
+                 idle_ms=IDLE_RENDER_MS, enabled=True):
+        self.refine = refine
+        self.dpi = dpi
+        self.idle_ms = idle_ms
+        self.enabled = enabled
+        self.interacting = False
+
+        # set while a reduced frame is being prepared
+        self.active = False
+        self.latency = {}
+        self._scale_key = None
+        self._rows = None
+        self._cols = None
+        self._make_timer = timer
+        self._timer = None
+
+    def configure(self, dpi=None, idle_ms=None, enabled=None):
+        if dpi is not None:
+            self.dpi = dpi
+        if idle_ms is not None:
+            self.idle_ms = idle_ms
+        if enabled is not None:
+            self.enabled = enabled
+            if not enabled and self.interacting:
+                if self._timer is not None:
+                    self._timer.Stop()
+                self.interacting = False
+                self.refine()
+
+    def interact(self):
+        """
+        Notes an interaction, postponing the full-quality frame
+        """
+        if not self.enabled:
+            return
+        self.interacting = True
+        if self._timer is None:
+            self._timer = self._make_timer(self.on_timer)
+        self._timer.StartOnce(max(1, int(self.idle_ms)))
+
+    def settle(self):
+        """
+        Ends an interaction right away, refining the frame without waiting
+        for the idle timer
+        """
+        if not self.interacting:
+            return
+        self._timer.Stop()
+        self.on_timer(None)
+
+    def on_timer(self, event):
+        self.interacting = False
+        self.refine()
+
+    def reduced(self, figure):
+        """
+        Whether the next frame of figure should be a reduced one
+        """
+        return self.enabled and self.interacting and self.dpi < figure.dpi
+
+    @contextlib.contextmanager
+    def resolution(self, figure):
+        """
+        Runs the block with figure at the interactive resolution
+        """
+        dpi = figure.dpi
+        figure.dpi = self.dpi
+        self.active = True
+        try:
+            yield
+        finally:
+            self.active = False
+            figure.dpi = dpi
+
+    def rasterize(self, figure):
+        """
+        Draws figure at its current resolution into a new RGBA buffer,
+        leaving the canvas and its draw event listeners alone
+        """
+        renderer = RendererAgg(int(figure.bbox.width),
+                               int(figure.bbox.height), figure.dpi)
+        with figure.canvas.callbacks.blocked(signal='draw_event'):
+            figure.draw(renderer)
+        return np.asarray(renderer.buffer_rgba())
+
+    def upscale(self, image, frame):
+        """
+        Scales image up into frame, by nearest neighbour
+        """
+        key = image.shape[:2] + frame.shape[:2]
+        if key != self._scale_key:
+            self._scale_key = key
+            self._rows = np.arange(key[2]) * key[0] // key[2]
+            self._cols = np.arange(key[3]) * key[1] // key[3]
+        frame[:] = image[self._rows[:, np.newaxis], self._cols]
+
+    def record(self, mode, seconds):
+        previous = self.latency.get(mode)
+        self.latency[mode] = seconds if previous is None else \
+            previous + LATENCY_SMOOTHING * (seconds - previous)
+
+    def report(self):
+        return ', '.join('%s %.0f ms' % (mode, 1000.0 * seconds)
+                         for mode, seconds in sorted(self.latency.items()))
@@ -0,0 +1,253 @@
+import threading
+from collections import OrderedDict
+
+import cartopy.crs as ccrs
+import numpy as np
+
+DEFAULT_PROJECTION = 'cyl'
+
+# Basemap-style projection keys, with their display name and cartopy class
+PROJECTIONS = {
+    'cyl': {'name': 'Cylindrical Equidistant', 'crs': 'PlateCarree'},
+    'merc': {'name': 'Mercator', 'crs': 'Mercator'},
+    'mill': {'name': 'Miller Cylindrical', 'crs': 'Miller'},
+    'robin': {'name': 'Robinson', 'crs': 'Robinson'},
+    'moll': {'name': 'Mollweide', 'crs': 'Mollweide'},
+    'eck4': {'name': 'Eckert IV', 'crs': 'EckertIV'},
+    'ortho': {'name': 'Orthographic', 'crs': 'Orthographic'},
+    'stere': {'name': 'Stereographic', 'crs': 'Stereographic'},
+    'laea': {'name': 'Lambert Azimuthal Equal Area',
+             'crs': 'LambertAzimuthalEqualArea'},
+    'aeqd': {'name': 'Azimuthal Equidistant', 'crs': 'AzimuthalEquidistant'},
+    'lcc': {'name': 'Lambert Conformal', 'crs': 'LambertConformal'},
+    'geos': {'name': 'Geostationary', 'crs': 'Geostationary'},
+}
+
+# parameters of each projection and their defaults
+PROJECTION_PARAMS = {
+    'cyl': {'lon_0': 0.0},
+    'merc': {'lon_0': 0.0},
+    'mill': {'lon_0': 0.0},
+    'robin': {'lon_0': 0.0},
+    'moll': {'lon_0': 0.0},
+    'eck4': {'lon_0': 0.0},
+    'ortho': {'lon_0': 0.0, 'lat_0': 0.0},
+    'stere': {'lon_0': 0.0, 'lat_0': 90.0},
+    'laea': {'lon_0': 0.0, 'lat_0': 0.0},
+    'aeqd': {'lon_0': 0.0, 'lat_0': 0.0},
+    'lcc': {'lon_0': -96.0, 'lat_0': 39.0},
+    'geos': {'lon_0': 0.0},
+}
+
+# projection parameters: property name and type, and cartopy keyword
+OPTIONS = {
+    'lon_0': {'name': 'Central Longitude', 'type': 'FloatProperty',
+              'keyword': 'central_longitude'},
+    'lat_0': {'name': 'Central Latitude', 'type': 'FloatProperty',
+              'keyword': 'central_latitude'},
+}
+
+# projected copies kept per layer
+MAX_CACHED_PROJECTIONS = 4
+
+LONLAT = ccrs.PlateCarree()
+
+_PROJECTIONS = {}
+_PROJECTIONS_LOCK = threading.Lock()
+
+
+def revlookup(table, field, value):
+    """
+    Key of the entry of table whose field equals value
+    """
+    for key, entry in table.items():
+        if entry[field] == value:
+            return key
+    raise KeyError(value)
+
+
+def get_projection(key=DEFAULT_PROJECTION, **params):
+    """
+    The shared MapProjection for a projection key and parameter set
+    """
+    full = dict(PROJECTION_PARAMS[key])
+    full.update((name, float(value)) for name, value in params.items())
+    cache_key = (key, tuple(sorted(full.items())))
+    with _PROJECTIONS_LOCK:
+        if cache_key not in _PROJECTIONS:
+            _PROJECTIONS[cache_key] = MapProjection(key, full)
+        return _PROJECTIONS[cache_key]
+
+
+def projection_from_param(param):
+    """
+    The MapProjection selected by a set of plot properties
+    """
+    name = (param or {}).get('Projection')
+    key = revlookup(PROJECTIONS, 'name', name) if name \
+        else DEFAULT_PROJECTION
+    return get_projection(key, **dict(
+        (option, param.get(OPTIONS[option]['name'], default))
+        for option, default in PROJECTION_PARAMS[key].items()))
+
+
+def axes_projection(ax):
+    """
+    The MapProjection of axes made by map_figure.create_axes
+    """
+    return getattr(ax, 'map_projection', None) or get_projection()
+
+
+def axes_box(ax):
+    """
+    The pixel box of ax for its current limits.  Equal-aspect axes only fit
+    their box to new limits when drawn, so the aspect is applied first.
+    """
+    ax.apply_aspect()
+    return ax.bbox
+
+
+def clip_to_view(ax, renderer):
+    """
+    Fits the clip path of ax's artists to its current limits, as drawing
+    the axes would; needed when artists are drawn over a frame that wasn't.
+    The background patch recomputes the path when drawn, so it is drawn
+    hidden.
+    """
+    ax.apply_aspect()
+    visible = ax.patch.get_visible()
+    ax.patch.set_visible(False)
+    try:
+        ax.patch.draw(renderer)
+    finally:
+        ax.patch.set_visible(visible)
+
+
+class MapProjection(object):
+    """
+    A cartopy projection behind the Basemap-style interface the plot code
+    uses: called with lon/lat it returns map coordinates, and with
+    inverse=True the reverse.
+
+    All transforms go through a single transform_points call per array, and
+    points off the map come back as NaN.  Instances are shared per
+    projection and parameter set (see get_projection), so cache_key can key
+    caches of projected geometry.
+    """
+
+    def __init__(self, key, params):
+        self.projection = key
+        self.params = params
+        self.cache_key = (key, tuple(sorted(params.items())))
+        self.crs = getattr(ccrs, PROJECTIONS[key]['crs'])(**dict(
+            (OPTIONS[name]['keyword'], value)
+            for name, value in params.items()))
+
+        # the default plate carree maps lon/lat to themselves
+        self.identity = key == 'cyl' and params.get('lon_0', 0.0) == 0.0
+
+        lon_0 = params.get('lon_0', 0.0)
+        self.llcrnrlon = lon_0 - 180.0
+        self.urcrnrlon = lon_0 + 180.0
+        self.llcrnrlat = -90.0
+        self.urcrnrlat = 90.0
+        self.x_limits = tuple(float(x) for x in self.crs.x_limits)
+        self.y_limits = tuple(float(y) for y in self.crs.y_limits)
+        self.x_span = self.x_limits[1] - self.x_limits[0]
+
+        # map units per degree near the projection's center
+        lat_0 = params.get('lat_0', 0.0)
+        x, y = self.project(np.array([lon_0, lon_0 + 0.01]),
+                            np.array([lat_0, lat_0]))
+        units = np.hypot(x[1] - x[0], y[1] - y[0]) / 0.01
+        self.degrees_per_unit = 1.0 / units if np.isfinite(units) and \
+            units > 0 else 360.0 / self.x_span
+
+    def __call__(self, x, y, inverse=False):
+        if inverse:
+            return self.unproject(x, y)
+        return self.project(x, y)
+
+    def project(self, lons, lats):
+        """
+        Map coordinates of lon/lat, NaN where a point is not on the map
+        """
+        if self.identity:
+            return lons, lats
+        return _transform(self.crs, LONLAT, lons, lats)
+
+    def unproject(self, x, y):
+        """
+        Lon/lat of map coordinates, NaN where a point is not on the globe
+        """
+        if self.identity:
+            return x, y
+        return _transform(LONLAT, self.crs, x, y)
+
+
+def _transform(target, source, x, y):
+    scalar = np.ndim(x) == 0 and np.ndim(y) == 0
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float),
+                               np.asarray(y, dtype=float))
+    points = target.transform_points(source, x.ravel(), y.ravel())
+    tx = points[:, 0].reshape(x.shape)
+    ty = points[:, 1].reshape(x.shape)
+    invalid = ~(np.isfinite(tx) & np.isfinite(ty))
+    tx[invalid] = np.nan
+    ty[invalid] = np.nan
+    if scalar:
+        return float(tx), float(ty)
+    return tx, ty
+
+
+def project_segments(projection, segments):
+    """
+    Projects a list of (n, 2) lon/lat vertex arrays with one transform
+    """
+    if projection.identity or not len(segments):
+        return segments
+    vertices = np.concatenate(segments)
+    x, y = projection.project(vertices[:, 0], vertices[:, 1])
+    bounds = np.cumsum([len(segment) for segment in segments])[:-1]
+    return np.split(np.column_stack((x, y)), bounds)
+
+
+class ProjectedCache(object):
+    """
+    Map coordinates of a lon/lat array pair, cached per projection.
+
+    When the arrays have only grown since they were last projected (the
+    generation is unchanged), only the new tail is transformed.  Projected
+    copies are kept for the most recently used projections.
+    """
+
+    def __init__(self, max_projections=MAX_CACHED_PROJECTIONS):
+        self.max_projections = max_projections
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, projection, lons, lats, generation=0):
+        key = projection.cache_key
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        count = len(lons)
+        if entry is not None and entry[0] == generation and \
+                len(entry[1]) == count:
+            return entry[1], entry[2]
+
+        if entry is not None and entry[0] == generation and \
+                len(entry[1]) < count:
+            done = len(entry[1])
+            x, y = projection.project(lons[done:], lats[done:])
+            x = np.concatenate((entry[1], x))
+            y = np.concatenate((entry[2], y))
+        else:
+            x, y = projection.project(np.asarray(lons), np.asarray(lats))
+
+        with self._lock:
+            self._entries[key] = (generation, x, y)
+            while len(self._entries) > self.max_projections:
+                self._entries.popitem(last=False)
+        return x, y
@@ -11,6 +11,12 @@ from wx.propgrid import ArrayStringProperty
 from wx.propgrid import FileProperty
 from wx.propgrid import DirProperty
 
+from projections import DEFAULT_PROJECTION
+from projections import OPTIONS
+from projections import PROJECTIONS
+from projections import PROJECTION_PARAMS
+from projections import revlookup
+
 # Structure of Dictionary to load
 
 INPUT_DATA = {'PropertyCategory': [
@@ -57,11 +63,11 @@ def compiletupleregex(size):
                       r')\s*?\)\s*?')
 
 
-class SingleChoiceDialogAdapter(wxpg.PyEditorDialogAdapter):
-    """ This demonstrates use of wxpg.PyEditorDialogAdapter.
+class SingleChoiceDialogAdapter(wxpg.PGEditorDialogAdapter):
+    """ This demonstrates use of wxpg.PGEditorDialogAdapter.
     """
     def __init__(self, choices):
-        wxpg.PyEditorDialogAdapter.__init__(self)
+        wxpg.PGEditorDialogAdapter.__init__(self)
         self.choices = choices
 
     def DoShowDialog(self, propGrid, property):
@@ -72,18 +78,18 @@ class SingleChoiceDialogAdapter(wxpg.PyEditorDialogAdapter):
         return False
 
 
-class SingleChoiceProperty(wxpg.PyStringProperty):
+class SingleChoiceProperty(wxpg.StringProperty):
     def __init__(self, label, name=wxpg.PG_LABEL, choices=None, value=''):
-        wxpg.PyStringProperty.__init__(self, label, name, value)
+        wxpg.StringProperty.__init__(self, label, name, value)
 
         # Prepare choices
         if not choices:
             choices = []
         self.dialog_choices = choices
 
-    def GetEditor(self):
+    def DoGetEditorClass(self):
         # Set editor to have button
-        return "TextCtrlAndButton"
+        return wxpg.PropertyGridInterface.GetEditorByName("TextCtrlAndButton")
 
     def GetEditorDialog(self):
         # Set what happens on button click
@@ -121,13 +127,13 @@ class PropertyGridPanel(wx.Panel):
             for prop_index, prop in enumerate(property_category['properties']):
                 self.append(format_string % (prop_index + 1), prop)
 
-        # pg.Append(wxpg.PropertyCategory("2 - Plot Type"))
-        # projection_names = sorted([PROJECTIONS[proj]['name']
-        #                            for proj in PROJECTIONS])
-        # proj = 'Cylindrical Equidistant'
-        # pg.Append(SingleChoiceProperty("Projection",
-        #                                choices=projection_names,
-        #                                value=proj))
+        pg.Append(wxpg.PropertyCategory("2 - Plot Type"))
+        projection_names = sorted([PROJECTIONS[proj]['name']
+                                   for proj in PROJECTIONS])
+        proj = PROJECTIONS[DEFAULT_PROJECTION]['name']
+        pg.Append(SingleChoiceProperty("Projection",
+                                       choices=projection_names,
+                                       value=proj))
 
         self.pp = pg.Append(wxpg.PropertyCategory("3 - Projection Parameters"))
         self.pp_list = []
@@ -152,8 +158,8 @@ class PropertyGridPanel(wx.Panel):
         self.SetSizer(sizer)
         self.SetAutoLayout(True)
 
+        self.OnProjectionChange(proj)
         self.OnUpdatePlotButtonEvent()
-        # self.OnProjectionChange(proj)
 
     def append(self, format_string, prop, parent=None):
         pass
@@ -215,15 +221,19 @@ class PropertyGridPanel(wx.Panel):
         pass
 
     def OnProjectionChange(self, projection_value):
+        try:
+            projection_key = revlookup(PROJECTIONS, 'name', projection_value)
+        except KeyError:
+            return
         for p in self.pp_list:
             self.pg.DeleteProperty(p)
         self.pp_list = []
-        projection_key = revlookup(PROJECTIONS, 'name', projection_value)
-        for param in PROJECTION_PARAMS[projection_key].keys():
+        for param in sorted(PROJECTION_PARAMS[projection_key].keys()):
             option = OPTIONS[param]
-            self.pp_list.append(self.pg.AppendIn(self.pp, option['type'](
-                option['name'],
-                value=PROJECTION_PARAMS[projection_key][param])))
+            self.pp_list.append(self.pg.AppendIn(
+                self.pp, globals()[option['type']](
+                    option['name'],
+                    value=PROJECTION_PARAMS[projection_key][param])))
 
     def OnUpdatePlotButtonEvent(self, event=None):
         if not event:
@@ -0,0 +1,166 @@
+import numpy as np
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from map_figure import create_axes
+from projections import axes_projection
+
+# relative change of the view scale still treated as a pure pan
+SCALE_TOLERANCE = 1e-6
+
+
+class ShadowRenderer(object):
+    """
+    Rasterizes the static layers of a plot for any part of the map at the
+    current scale, on an offscreen Agg figure.
+
+    The layers are mirrored onto the offscreen axes, sharing their data and
+    caches, so only the artists are duplicated.
+    """
+
+    def __init__(self, dpi):
+        self.figure = Figure((1, 1), dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.ax = None
+        self.mirrors = []
+
+    def mirror(self, ax, layers):
+        """
+        Mirrors the layers that support it from ax
+        """
+        projection = axes_projection(ax)
+        if self.ax is None or axes_projection(self.ax) is not projection:
+            self.figure.clear()
+            self.ax = create_axes(self.figure, projection)
+            self.ax.set_aspect('auto')
+            self.ax.set_autoscale_on(False)
+        for mirror in self.mirrors:
+            mirror.remove()
+        self.mirrors = [layer.mirror(self.ax) for layer in layers
+                        if hasattr(layer, 'mirror')]
+
+    def render(self, x0, x1, y0, y1, width, height):
+        """
+        The mirrored layers over [x0, x1] x [y0, y1], as a height by width
+        RGBA array
+        """
+        # a hair over the pixel size, so the canvas doesn't round down
+        self.figure.set_size_inches((width + 1e-6) / self.figure.dpi,
+                                    (height + 1e-6) / self.figure.dpi)
+        self.ax.set_xlim(x0, x1)
+        self.ax.set_ylim(y0, y1)
+        for mirror in self.mirrors:
+            mirror.update_view()
+        self.figure.canvas.draw()
+        return np.asarray(self.figure.canvas.buffer_rgba())[:height, :width]
+
+
+class PanCache(object):
+    """
+    The static part of the frame on screen, kept as an RGBA buffer so a pan
+    can translate it.
+
+    Each pan frame shifts the buffer by the whole number of pixels the view
+    moved, and rasterizes only the strips that came into view through the
+    shadow renderer.  A frame whose scale differs from the buffer's (a zoom)
+    is refused, leaving it to a full render.  The grid, its labels and the
+    annotations are overlay artists, so they are never in the buffer and
+    are redrawn over each frame instead.
+    """
+
+    def __init__(self, dpi):
+        self.shadow = ShadowRenderer(dpi)
+        self.buffer = None
+        self.view = None
+        self.box = None
+
+    def begin(self, ax, layers, frame):
+        """
+        Starts a pan from frame, the canvas's RGBA buffer showing ax without
+        any overlay
+        """
+        self.shadow.mirror(ax, layers)
+        self.box = self._box(ax, frame)
+        if self.box is None:
+            self.buffer = None
+            return
+        top, bottom, left, right = self.box
+        self.buffer = np.array(frame[top:bottom, left:right])
+        self.view = self._view(ax)
+
+    def end(self):
+        self.buffer = None
+        self.view = None
+
+    def shift(self, ax, frame):
+        """
+        Writes the frame for ax's current view into frame, returning False
+        when the view can't be reached by shifting
+        """
+        if self.buffer is None or self._box(ax, frame) != self.box:
+            return False
+        x0, x1, y0, y1 = self._view(ax)
+        ox0, ox1, oy0, oy1 = self.view
+        height, width = self.buffer.shape[:2]
+        x_scale = (ox1 - ox0) / width
+        y_scale = (oy1 - oy0) / height
+        if abs((x1 - x0) / width - x_scale) > SCALE_TOLERANCE * abs(x_scale) \
+                or abs((y1 - y0) / height - y_scale) > \
+                SCALE_TOLERANCE * abs(y_scale):
+            return False
+
+        # whole pixels moved; the view is snapped to them so rounding errors
+        # don't accumulate over the pan
+        dx = int(round((x0 - ox0) / x_scale))
+        dy = int(round((y0 - oy0) / y_scale))
+        x0, x1 = ox0 + dx * x_scale, ox1 + dx * x_scale
+        y0, y1 = oy0 + dy * y_scale, oy1 + dy * y_scale
+
+        shifted = np.empty_like(self.buffer)
+        if abs(dx) >= width or abs(dy) >= height:
+            shifted[:] = self.shadow.render(x0, x1, y0, y1, width, height)
+        else:
+            # rows run top down, so moving the view up moves content down
+            src_rows = slice(max(-dy, 0), height - max(dy, 0))
+            dst_rows = slice(max(dy, 0), height - max(-dy, 0))
+            src_cols = slice(max(dx, 0), width - max(-dx, 0))
+            dst_cols = slice(max(-dx, 0), width - max(dx, 0))
+            shifted[dst_rows, dst_cols] = self.buffer[src_rows, src_cols]
+
+            # exposed columns span the full height, exposed rows the rest
+            if dx:
+                cols = slice(width - dx, width) if dx > 0 else slice(0, -dx)
+                shifted[:, cols] = self.shadow.render(
+                    x0 + cols.start * x_scale, x0 + cols.stop * x_scale,
+                    y0, y1, cols.stop - cols.start, height)
+            if dy:
+                rows = slice(0, dy) if dy > 0 else slice(height + dy, height)
+                shifted[rows, dst_cols] = self.shadow.render(
+                    x0 + dst_cols.start * x_scale,
+                    x0 + dst_cols.stop * x_scale,
+                    y1 - rows.stop * y_scale, y1 - rows.start * y_scale,
+                    dst_cols.stop - dst_cols.start, rows.stop - rows.start)
+
+        self.buffer = shifted
+        self.view = (x0, x1, y0, y1)
+        top, bottom, left, right = self.box
+        frame[top:bottom, left:right] = shifted
+        return True
+
+    def _view(self, ax):
+        x0, x1 = ax.get_xlim()
+        y0, y1 = ax.get_ylim()
+        return x0, x1, y0, y1
+
+    def _box(self, ax, frame):
+        """
+        Rows and columns of frame covered by ax
+        """
+        x0, y0, x1, y1 = [int(round(value)) for value in ax.bbox.extents]
+        height, width = frame.shape[:2]
+        top, bottom = max(height - y1, 0), min(height - y0, height)
+        left, right = max(x0, 0), min(x1, width)
+        if bottom <= top or right <= left:
+            return None
+        return top, bottom, left, right
@@ -0,0 +1,77 @@
+import time
+import wx
+
+DEFAULT_MAX_FPS = 20.0
+
+
+class RenderScheduler(object):
+    """
+    Coalesces redraw requests and caps how often the plot is re-rendered.
+
+    Callers invalidate named layers instead of drawing.  The first request
+    after an idle period is rendered on the next timer tick; requests that
+    arrive while a frame is pending are merged into it and counted as
+    skipped.  A pending frame is always rendered, so the final state of an
+    interaction is drawn even when intermediate states are dropped.
+    """
+
+    def __init__(self, owner, render, max_fps=DEFAULT_MAX_FPS):
+        self.owner = owner
+        self.render = render
+        self.max_fps = max_fps
+        self.dirty = set()
+        self.rendered_frames = 0
+        self.skipped_frames = 0
+        self._last_render = 0.0
+        self._timer = wx.Timer(owner)
+        owner.Bind(wx.EVT_TIMER, self.on_timer, self._timer)
+
+    def set_max_fps(self, max_fps):
+        self.max_fps = max_fps
+
+    def invalidate(self, *layers):
+        """
+        Marks layers as needing a redraw and schedules a frame
+        """
+        if self.dirty:
+            # merge into the frame that is already pending
+            self.skipped_frames += 1
+            self.dirty.update(layers)
+            return
+        self.dirty.update(layers)
+        interval = 1.0 / self.max_fps if self.max_fps > 0 else 0.0
+        wait = self._last_render + interval - time.time()
+        self._timer.StartOnce(max(1, int(wait * 1000)))
+
+    def flush(self):
+        """
+        Renders any pending frame immediately
+        """
+        if self._timer.IsRunning():
+            self._timer.Stop()
+        if not self.dirty:
+            return
+        dirty = self.dirty
+        self.dirty = set()
+        self._last_render = time.time()
+        self.rendered_frames += 1
+        self.render(dirty)
+
+    def cancel(self):
+        """
+        Drops any pending frame, for a caller about to redraw everything
+        """
+        if self._timer.IsRunning():
+            self._timer.Stop()
+        self.dirty = set()
+
+    def on_timer(self, event):
+        self.flush()
+
+    def reset_stats(self):
+        self.rendered_frames = 0
+        self.skipped_frames = 0
+
+    def stats(self):
+        return 'Rendered %d frames, skipped %d' % (self.rendered_frames,
+                                                   self.skipped_frames)
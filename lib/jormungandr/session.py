@@ -0,0 +1,286 @@
+import io
+import json
+import os
+import tempfile
+import threading
+import zipfile
+
+import numpy as np
+import yaml
+
+SESSION_FORMAT = 'jormungandr-session'
+SESSION_VERSION = 1
+HEADER = 'header.json'
+AUTOSAVE_SUFFIX = '.autosave'
+AUTOSAVE_DIR = os.path.join(os.path.expanduser('~'), '.jormungandr',
+                            'autosave')
+
+
+class SessionLayer(object):
+    """
+    A named data layer: a kind, plain attributes and a set of arrays.
+
+    The arrays are produced by loader() on first access, which lets layers
+    read from a session file stay on disk until they are displayed, and lets
+    the plot hand over layers without copying them until they are saved.
+    The token identifies the layer's content; a layer is rewritten by an
+    incremental save only when its token changes.
+    """
+
+    def __init__(self, kind, attrs=None, arrays=None, loader=None,
+                 token=None):
+        self.kind = kind
+        self.attrs = attrs or {}
+        self.token = token
+        self._arrays = arrays
+        self._loader = loader
+
+    @property
+    def loaded(self):
+        return self._arrays is not None
+
+    @property
+    def arrays(self):
+        if self._arrays is None:
+            self._arrays = self._loader()
+            self._loader = None
+        return self._arrays
+
+
+class Session(object):
+    """
+    Property values plus named SessionLayers
+    """
+
+    def __init__(self, properties=None, layers=None):
+        self.properties = properties or {}
+        self.layers = layers or {}
+
+
+def _pack(arrays, compress):
+    buffer = io.BytesIO()
+    (np.savez_compressed if compress else np.savez)(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def _unpack(data):
+    with np.load(io.BytesIO(data), allow_pickle=False) as npz:
+        return dict((key, npz[key]) for key in npz.files)
+
+
+def _header(properties, layers, members):
+    return {'format': SESSION_FORMAT,
+            'version': SESSION_VERSION,
+            'properties': properties,
+            'layers': dict((name, {'kind': layer.kind,
+                                   'attrs': layer.attrs,
+                                   'token': layer.token,
+                                   'member': members[name]})
+                           for name, layer in layers.items())}
+
+
+def _member_name(name, token):
+    safe = ''.join(c if c.isalnum() or c in '-_' else '_' for c in name)
+    return 'layers/%s-%s.npz' % (safe, token) if token is not None \
+        else 'layers/%s.npz' % safe
+
+
+def write_session(path, properties, layers, compress=True):
+    """
+    Writes a session container to path atomically: a zip archive holding
+    the JSON header and one .npz payload per layer, assembled in a temporary
+    file that replaces path only once it is complete
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temp = tempfile.mkstemp(prefix='.' + os.path.basename(path),
+                                    dir=directory)
+    os.close(handle)
+    try:
+        members = {}
+        with zipfile.ZipFile(temp, 'w', zipfile.ZIP_STORED) as archive:
+            for name, layer in layers.items():
+                members[name] = _member_name(name, None)
+                archive.writestr(members[name],
+                                 _pack(layer.arrays, compress))
+            archive.writestr(HEADER, json.dumps(
+                _header(properties, layers, members), indent=1))
+        os.replace(temp, path)
+    except Exception:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return path
+
+
+def write_incremental(directory, properties, layers, previous=None,
+                      compress=False):
+    """
+    Writes a session as a directory of payloads, only writing the layers
+    whose token differs from the previous header written there.
+
+    Every payload file is named after its layer's token and written before
+    the header that references it, and the header itself is replaced
+    atomically, so a crash leaves the last complete session readable.
+    Returns the new header.
+    """
+    if not os.path.isdir(os.path.join(directory, 'layers')):
+        os.makedirs(os.path.join(directory, 'layers'))
+    previous = (previous or {}).get('layers', {})
+    members = {}
+    for name, layer in layers.items():
+        member = _member_name(name, layer.token)
+        target = os.path.join(directory, member)
+        if previous.get(name, {}).get('member') != member or \
+                not os.path.exists(target):
+            _atomic_write(target, _pack(layer.arrays, compress))
+        members[name] = member
+
+    header = _header(properties, layers, members)
+    _atomic_write(os.path.join(directory, HEADER),
+                  json.dumps(header, indent=1).encode('utf-8'))
+
+    # drop payloads no longer referenced
+    keep = set(os.path.basename(member) for member in members.values())
+    for filename in os.listdir(os.path.join(directory, 'layers')):
+        if filename not in keep and not filename.startswith('.'):
+            os.remove(os.path.join(directory, 'layers', filename))
+    return header
+
+
+def _atomic_write(path, data):
+    handle, temp = tempfile.mkstemp(prefix='.' + os.path.basename(path),
+                                    dir=os.path.dirname(path))
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(data)
+        os.replace(temp, path)
+    except Exception:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def _session_from_header(header, read):
+    if header.get('format') != SESSION_FORMAT:
+        raise ValueError('not a session file')
+    if header.get('version', 0) > SESSION_VERSION:
+        raise ValueError('session version %s is newer than supported (%d)' %
+                         (header.get('version'), SESSION_VERSION))
+    layers = {}
+    for name, entry in header.get('layers', {}).items():
+        layers[name] = SessionLayer(
+            entry['kind'], entry.get('attrs'),
+            loader=lambda member=entry['member']: _unpack(read(member)),
+            token=entry.get('token'))
+    return Session(header.get('properties', {}), layers)
+
+
+def read_session(path):
+    """
+    Opens a session container, an incremental (autosave) directory or a
+    legacy YAML property file.  Only the header is read here; layer arrays
+    are read when first accessed.
+    """
+    if os.path.isdir(path):
+        def read(member):
+            with open(os.path.join(path, member), 'rb') as f:
+                return f.read()
+        with open(os.path.join(path, HEADER)) as f:
+            return _session_from_header(json.load(f), read)
+
+    if zipfile.is_zipfile(path):
+        def read(member):
+            with zipfile.ZipFile(path) as archive:
+                return archive.read(member)
+        with zipfile.ZipFile(path) as archive:
+            header = json.loads(archive.read(HEADER).decode('utf-8'))
+        return _session_from_header(header, read)
+
+    with open(path) as f:
+        return Session(yaml.safe_load(f) or {})
+
+
+def autosave_path(path=None):
+    """
+    Autosave directory for a session file, or for an unsaved session
+    """
+    if path:
+        return os.path.abspath(path) + AUTOSAVE_SUFFIX
+    return os.path.join(AUTOSAVE_DIR, 'untitled' + AUTOSAVE_SUFFIX)
+
+
+class SessionWriter(object):
+    """
+    Saves sessions on a worker thread.
+
+    Layer arrays are snapshotted on the calling (GUI) thread; serialization,
+    compression and I/O happen on the worker.  Writes are serialized, and
+    on_done(path, error) is called from the worker when each one finishes.
+    Autosaves are incremental: only layers whose token changed since the
+    last autosave to the same directory are snapshotted and written, and
+    nothing is written when neither the properties nor any token changed.
+    """
+
+    def __init__(self, on_done=None, compress=True):
+        self.on_done = on_done
+        self.compress = compress
+        self._lock = threading.Lock()
+        self._count_lock = threading.Lock()
+        self._pending = 0
+        self._autosaved = {}
+
+    def busy(self):
+        return self._pending > 0
+
+    def save(self, path, properties, layers):
+        layers = self._snapshot(layers)
+        return self._start(write_session, path, properties, layers,
+                           self.compress)
+
+    def autosave(self, directory, properties, layers):
+        if self.busy():
+            return None
+        previous = self._autosaved.get(directory)
+        if previous is not None and previous['properties'] == properties \
+                and dict((name, layer.token)
+                         for name, layer in layers.items()) == \
+                dict((name, entry['token'])
+                     for name, entry in previous['layers'].items()):
+            return None
+        changed = dict(
+            (name, layer) for name, layer in layers.items()
+            if previous is None or
+            previous['layers'].get(name, {}).get('token') != layer.token)
+        self._snapshot(changed)
+
+        def write(directory, properties, layers, previous):
+            self._autosaved[directory] = write_incremental(
+                directory, properties, layers, previous)
+        return self._start(write, directory, properties, dict(layers),
+                           previous)
+
+    def _snapshot(self, layers):
+        for layer in layers.values():
+            layer.arrays
+        return dict(layers)
+
+    def _start(self, write, path, *args):
+        with self._count_lock:
+            self._pending += 1
+        worker = threading.Thread(target=self._run,
+                                  args=(write, path) + args)
+        worker.daemon = True
+        worker.start()
+        return worker
+
+    def _run(self, write, path, *args):
+        error = None
+        try:
+            with self._lock:
+                write(path, *args)
+        except Exception as e:
+            error = e
+        with self._count_lock:
+            self._pending -= 1
+        if self.on_done:
+            self.on_done(path, error)
@@ -0,0 +1,158 @@
+import math
+
+import numpy as np
+
+CELL_DEGREES = 1.0
+INITIAL_CAPACITY = 1024
+
+# the unindexed tail is scanned linearly until it grows past this many
+# features, or past this fraction of the indexed ones
+MIN_REINDEX = 4096
+REINDEX_FRACTION = 0.125
+
+# features whose grid cells are computed at a time when re-sorting
+REINDEX_CHUNK = 1 << 20
+
+
+def wrapped_windows(x0, x1):
+    """
+    Splits a longitude range, which may extend past the antimeridian, into
+    ranges within [-180, 180] and the shift that maps each back into the
+    view
+    """
+    windows = []
+    first = int(math.floor((x0 + 180.0) / 360.0))
+    last = int(math.floor((x1 + 180.0) / 360.0))
+    for k in range(first, last + 1):
+        shift = 360.0 * k
+        lo = max(x0, shift - 180.0) - shift
+        hi = min(x1, shift + 180.0) - shift
+        if hi > lo or (hi == lo and not windows):
+            windows.append((lo, hi, shift))
+    return windows
+
+
+class GridIndex(object):
+    """
+    Uniform lon/lat grid index over point features.
+
+    Features are stored in growable contiguous arrays, as given, and
+    identified by insertion order.  Memory-mapped arrays inserted into an
+    empty index are referenced rather than copied, until more features are
+    added.  The index keeps the features sorted by grid cell, so a viewport
+    query only visits the cells it overlaps.  Features added since the last
+    sort are kept in a tail that is scanned linearly until it is large
+    enough to re-sort, which keeps single inserts amortized O(1).
+    """
+
+    def __init__(self, cell=CELL_DEGREES):
+        self.cell = cell
+        self.ncols = int(math.ceil(360.0 / cell))
+        self.nrows = int(math.ceil(180.0 / cell))
+        self.count = 0
+        self._lons = np.empty(INITIAL_CAPACITY)
+        self._lats = np.empty(INITIAL_CAPACITY)
+        self._indexed = 0
+        self._order = np.empty(0, dtype=np.intp)
+        self._starts = np.zeros(self.ncols * self.nrows + 1, dtype=np.intp)
+
+    @property
+    def lons(self):
+        return self._lons[:self.count]
+
+    @property
+    def lats(self):
+        return self._lats[:self.count]
+
+    def _reserve(self, count):
+        if count <= len(self._lons) and self._lons.flags.writeable:
+            return
+        capacity = max(count, 2 * len(self._lons))
+        for name in ('_lons', '_lats'):
+            grown = np.empty(capacity)
+            grown[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, grown)
+
+    def insert(self, lons, lats):
+        """
+        Adds features, returning their ids
+        """
+        first = self.count
+        if not first and isinstance(lons, np.memmap) and \
+                isinstance(lats, np.memmap) and lons.ndim == 1 and \
+                lons.dtype == lats.dtype == np.float64:
+            self._lons, self._lats = lons, lats
+            self.count = len(lons)
+            return np.arange(self.count)
+
+        lons = np.atleast_1d(np.asarray(lons, dtype=float)).ravel()
+        lats = np.atleast_1d(np.asarray(lats, dtype=float)).ravel()
+        self._reserve(first + len(lons))
+        self._lons[first:first + len(lons)] = lons
+        self._lats[first:first + len(lats)] = lats
+        self.count += len(lons)
+        return np.arange(first, self.count)
+
+    def clear(self):
+        if not self._lons.flags.writeable:
+            self._lons = np.empty(INITIAL_CAPACITY)
+            self._lats = np.empty(INITIAL_CAPACITY)
+        self.count = 0
+        self._indexed = 0
+        self._order = np.empty(0, dtype=np.intp)
+        self._starts[:] = 0
+
+    def _cells(self, lons, lats):
+        cols = np.clip((((lons + 180.0) % 360.0) / self.cell).astype(np.intp),
+                       0, self.ncols - 1)
+        rows = np.clip(((lats + 90.0) / self.cell).astype(np.intp),
+                       0, self.nrows - 1)
+        return rows * self.ncols + cols
+
+    def _reindex(self):
+        # a chunk at a time, so the temporaries stay small next to the
+        # features
+        keys = np.empty(self.count, dtype=np.int32)
+        for start in range(0, self.count, REINDEX_CHUNK):
+            stop = min(start + REINDEX_CHUNK, self.count)
+            keys[start:stop] = self._cells(self._lons[start:stop],
+                                           self._lats[start:stop])
+        self._order = np.argsort(keys, kind='stable')
+        self._starts = np.searchsorted(keys[self._order],
+                                       np.arange(len(self._starts)))
+        self._indexed = self.count
+
+    def query(self, x0, x1, y0, y1):
+        """
+        Ids of the features inside the viewport, and the longitude shift to
+        draw each one at (non-zero when the view crosses the antimeridian,
+        or for longitudes outside [-180, 180))
+        """
+        tail = self.count - self._indexed
+        if tail > max(MIN_REINDEX, REINDEX_FRACTION * self._indexed):
+            self._reindex()
+
+        ids = []
+        shifts = []
+        r0 = int(np.clip((y0 + 90.0) / self.cell, 0, self.nrows - 1))
+        r1 = int(np.clip((y1 + 90.0) / self.cell, 0, self.nrows - 1))
+        tail_ids = np.arange(self._indexed, self.count)
+        for lo, hi, shift in wrapped_windows(x0, x1):
+            c0 = int(np.clip((lo + 180.0) / self.cell, 0, self.ncols - 1))
+            c1 = int(np.clip((hi + 180.0) / self.cell, 0, self.ncols - 1))
+            candidates = [self._order[self._starts[r * self.ncols + c0]:
+                                      self._starts[r * self.ncols + c1 + 1]]
+                          for r in range(r0, r1 + 1)]
+            candidates.append(tail_ids)
+            candidates = np.concatenate(candidates)
+            given = self._lons[candidates]
+            lons = (given + 180.0) % 360.0 - 180.0
+            lats = self._lats[candidates]
+            inside = (lons >= lo) & (lons <= hi) & \
+                (lats >= y0) & (lats <= y1)
+            ids.append(candidates[inside])
+            shifts.append(shift + lons[inside] - given[inside])
+
+        if not ids:
+            return np.empty(0, dtype=np.intp), np.empty(0)
+        return np.concatenate(ids), np.concatenate(shifts)
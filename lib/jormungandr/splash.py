@@ -1,15 +1,28 @@
 import wx
 import wx.lib.agw.advancedsplash as wxAS
 
+# the splash is dismissed once the first frame is ready, or after this long
+SPLASH_TIMEOUT_MS = 4000
+
 
 class Splash(wxAS.AdvancedSplash):
-    def __init__(self, pn, parent=None, display=True):
+    def __init__(self, pn, parent=None, display=True,
+                 timeout=SPLASH_TIMEOUT_MS):
+
+        self.display = display
 
         # Splash Screen
         if display:
             bitmap = wx.Bitmap(pn, wx.BITMAP_TYPE_PNG)
             wxAS.AdvancedSplash.__init__(
-                self, None, bitmap=bitmap, timeout=4000,
+                self, None, bitmap=bitmap, timeout=timeout,
                 agwStyle=wxAS.AS_TIMEOUT | wxAS.AS_CENTER_ON_PARENT)
             self.Show()
             wx.Yield()
+
+    def dismiss(self):
+        """
+        Closes the splash early, if it hasn't timed out already
+        """
+        if self.display and self:
+            self.Close()
@@ -0,0 +1,83 @@
+import contextlib
+import importlib
+import sys
+import threading
+import time
+
+# imported on a worker thread while the splash and the preview are shown,
+# in dependency order so each entry only times what it adds
+HEAVY_MODULES = ('numpy',
+                 'yaml',
+                 'matplotlib',
+                 'matplotlib.figure',
+                 'matplotlib.collections',
+                 'matplotlib.offsetbox',
+                 'matplotlib.backends.backend_agg',
+                 'cartopy',
+                 'cartopy.crs',
+                 'cartopy.io.shapereader')
+
+
+class StartupProfile(object):
+    """
+    Wall-clock breakdown of application startup.
+
+    Phases are timed with phase(), may overlap (the heavy imports run on a
+    worker thread alongside the GUI thread) and are reported with their
+    offset from the creation of the profile, which the launcher does first
+    thing.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.phases = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def record(self, name, start, end):
+        with self._lock:
+            self.phases.append((name, start - self.origin, end - self.origin,
+                                threading.current_thread().name))
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.record(name, now, now)
+
+    def report(self, stream=None):
+        stream = stream or sys.stderr
+        stream.write('%-40s %10s %10s  %s\n' % ('phase', 'start [ms]',
+                                                 'time [ms]', 'thread'))
+        for name, start, end, thread in sorted(self.phases,
+                                               key=lambda phase: phase[1]):
+            stream.write('%-40s %10.1f %10.1f  %s\n' % (
+                name, 1000.0 * start, 1000.0 * (end - start), thread))
+        stream.flush()
+
+
+def preload(profile, on_done, modules=HEAVY_MODULES):
+    """
+    Imports modules on a worker thread, timing each one, then calls
+    on_done() from the worker
+    """
+    def run():
+        with profile.phase('background imports'):
+            for name in modules:
+                with profile.phase('  import %s' % name):
+                    try:
+                        importlib.import_module(name)
+                    except ImportError:
+                        pass
+        on_done()
+
+    worker = threading.Thread(target=run, name='preload')
+    worker.daemon = True
+    worker.start()
+    return worker
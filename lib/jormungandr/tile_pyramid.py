@@ -0,0 +1,346 @@
+import collections
+import hashlib
+import math
+import os
+import threading
+
+import numpy as np
+
+from matplotlib.image import imread
+
+from projections import axes_box
+from projections import axes_projection
+from spatial_index import wrapped_windows
+
+TILE_SIZE = 256
+TILE_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.jormungandr', 'tiles')
+
+# bound on the decoded tiles kept in memory, per pyramid
+MAX_MEMORY_TILES = 256
+
+# finest level reprojected for non-cylindrical maps, and how many
+# reprojected images to keep
+MAX_WARPED_LEVEL = 2
+MAX_WARPED_IMAGES = 8
+
+
+def load_raster(path):
+    """
+    Reads an image file as a uint8 RGB(A) array
+    """
+    image = imread(path)
+    if image.dtype != np.uint8:
+        image = (np.clip(image, 0.0, 1.0) * 255).astype(np.uint8)
+    if image.ndim == 2:
+        image = np.dstack((image, image, image))
+    return image
+
+
+class TilePyramid(object):
+    """
+    Multi-resolution tiles of a global equirectangular raster.
+
+    Level L covers the globe with 2**(L+1) by 2**L square tiles of tile_size
+    pixels, the finest level being the first one at least as detailed as the
+    source.  Tiles are box-filtered from the source on first use, written to
+    an on-disk cache keyed by the source file, and kept in a bounded
+    in-memory LRU.  Whole levels reprojected onto other projections are kept
+    in a second, smaller LRU.
+    """
+
+    def __init__(self, source, cache_dir=TILE_CACHE_DIR, tile_size=TILE_SIZE,
+                 max_memory_tiles=MAX_MEMORY_TILES):
+        self.source = source
+        self.tile_size = tile_size
+        self.max_memory_tiles = max_memory_tiles
+        self._image = None
+        self._tiles = collections.OrderedDict()
+        self._warped = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        stat = os.stat(source)
+        key = hashlib.sha1(('%s:%d:%d:%d' % (
+            os.path.abspath(source), stat.st_size, stat.st_mtime,
+            tile_size)).encode('utf-8')).hexdigest()
+        self.cache_dir = os.path.join(cache_dir, key)
+
+        width = self.image.shape[1]
+        self.max_level = max(0, int(math.ceil(
+            math.log(float(width) / (2 * tile_size), 2))))
+
+    @property
+    def image(self):
+        if self._image is None:
+            self._image = load_raster(self.source)
+        return self._image
+
+    def shape(self, level):
+        """
+        Number of tile rows and columns at a level
+        """
+        return 2 ** level, 2 ** (level + 1)
+
+    def tile_degrees(self, level):
+        return 180.0 / 2 ** level
+
+    def level_for_resolution(self, degrees_per_pixel):
+        """
+        Coarsest level with at least the requested resolution
+        """
+        if degrees_per_pixel <= 0:
+            return self.max_level
+        level = int(math.ceil(math.log(
+            180.0 / (self.tile_size * degrees_per_pixel), 2)))
+        return min(max(level, 0), self.max_level)
+
+    def get_tile(self, level, row, col):
+        """
+        Returns the tile array, wrapping col around the antimeridian
+        """
+        col = col % self.shape(level)[1]
+        key = (level, row, col)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                return tile
+
+        path = os.path.join(self.cache_dir, str(level), '%d_%d.npy' % (row,
+                                                                     col))
+        if os.path.exists(path):
+            tile = np.load(path)
+        else:
+            tile = self._make_tile(level, row, col)
+            self._store(path, tile)
+
+        with self._lock:
+            self._tiles[key] = tile
+            while len(self._tiles) > self.max_memory_tiles:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def mosaic(self, level):
+        """
+        The whole globe at a level, as one array
+        """
+        rows, cols = self.shape(level)
+        return np.vstack([np.hstack([self.get_tile(level, row, col)
+                                     for col in range(cols)])
+                          for row in range(rows)])
+
+    def warped(self, projection, level):
+        """
+        A level resampled onto a MapProjection, as an RGBA array covering
+        the projection's x/y limits, transparent off the globe
+        """
+        key = (projection.cache_key, level)
+        with self._lock:
+            image = self._warped.get(key)
+            if image is not None:
+                self._warped.move_to_end(key)
+                return image
+
+        source = self.mosaic(level)
+        height, width = source.shape[:2]
+        x0, x1 = projection.x_limits
+        y0, y1 = projection.y_limits
+        rows_out = max(int(round(width * (y1 - y0) / (x1 - x0))), 1)
+        x, y = np.meshgrid(
+            x0 + (np.arange(width) + 0.5) * (x1 - x0) / width,
+            y1 - (np.arange(rows_out) + 0.5) * (y1 - y0) / rows_out)
+
+        # pixel centers that don't survive the round trip are off the globe
+        lons, lats = projection.unproject(x, y)
+        x_back, y_back = projection.project(lons, lats)
+        with np.errstate(invalid='ignore'):
+            valid = (np.abs(x_back - x) < (x1 - x0) / width) & \
+                (np.abs(y_back - y) < (y1 - y0) / rows_out)
+        lons = np.where(valid, lons, 0.0)
+        lats = np.where(valid, lats, 0.0)
+        cols = np.floor((lons + 180.0) * width / 360.0).astype(np.intp)
+        rows = np.floor((90.0 - lats) * height / 180.0).astype(np.intp)
+        cols %= width
+        rows = np.clip(rows, 0, height - 1)
+
+        image = np.zeros((rows_out, width, 4), dtype=np.uint8)
+        image[..., :3] = source[rows, cols, :3]
+        alpha = source[rows, cols, 3] if source.shape[2] == 4 else 255
+        image[..., 3] = np.where(valid, alpha, 0)
+
+        with self._lock:
+            self._warped[key] = image
+            while len(self._warped) > MAX_WARPED_IMAGES:
+                self._warped.popitem(last=False)
+        return image
+
+    def build(self, max_level=None):
+        """
+        Precomputes every tile into the on-disk cache
+        """
+        if max_level is None:
+            max_level = self.max_level
+        for level in range(min(max_level, self.max_level) + 1):
+            rows, cols = self.shape(level)
+            for row in range(rows):
+                for col in range(cols):
+                    self.get_tile(level, row, col)
+
+    def _store(self, path, tile):
+        directory = os.path.dirname(path)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            temp = '%s.%d.tmp' % (path, threading.current_thread().ident)
+            with open(temp, 'wb') as f:
+                np.save(f, tile)
+            os.rename(temp, path)
+        except OSError:
+            # the disk cache is an optimization only
+            pass
+
+    def _make_tile(self, level, row, col):
+        image = self.image
+        height, width = image.shape[:2]
+        rows, cols = self.shape(level)
+        size = self.tile_size
+        y_index = self._source_edges(height, rows * size, row * size)
+        x_index = self._source_edges(width, cols * size, col * size)
+        return self._box_filter(image, y_index, x_index)
+
+    def _source_edges(self, source_pixels, level_pixels, start):
+        scale = float(source_pixels) / level_pixels
+        edges = (np.arange(start, start + self.tile_size + 1) * scale)
+        return np.minimum(edges.astype(int), source_pixels)
+
+    def _box_filter(self, image, y_edges, x_edges):
+        # average the source pixels under each output pixel; when
+        # magnifying, fall back to nearest neighbour
+        if np.all(np.diff(y_edges) > 0) and np.all(np.diff(x_edges) > 0):
+            block = image[y_edges[0]:y_edges[-1], x_edges[0]:x_edges[-1]]
+            block = block.astype(np.uint32)
+            summed = np.add.reduceat(block, y_edges[:-1] - y_edges[0], axis=0)
+            summed = np.add.reduceat(summed, x_edges[:-1] - x_edges[0],
+                                     axis=1)
+            counts = np.outer(np.diff(y_edges), np.diff(x_edges))
+            return (summed // counts[:, :, np.newaxis]).astype(np.uint8)
+        rows = np.minimum(y_edges[:-1], image.shape[0] - 1)
+        cols = np.minimum(x_edges[:-1], image.shape[1] - 1)
+        return image[rows[:, np.newaxis], cols[np.newaxis, :]]
+
+
+class TiledImageLayer(object):
+    """
+    Base imagery drawn from a TilePyramid as image artists.
+
+    On every view change the tiles intersecting the viewport at the matching
+    level are stitched into a mosaic, whose size follows the viewport rather
+    than the source image.  Columns are wrapped around the globe, so a view
+    wider than the globe fetches each tile once and shows the mosaic once
+    per visible wrap.  On other projections than plain lon/lat the
+    pyramid's reprojected levels are shown instead.
+    """
+
+    def __init__(self, ax, pyramid, **kwargs):
+        self.ax = ax
+        self.pyramid = pyramid
+        self.kwargs = kwargs
+        self.images = []
+        self.visible = True
+        self._key = None
+
+    def update_view(self):
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        pixels = max(axes_box(self.ax).width, 1)
+        projection = axes_projection(self.ax)
+        if not projection.identity:
+            self._update_warped(projection, (x1 - x0) / pixels)
+            return
+        level = self.pyramid.level_for_resolution((x1 - x0) / pixels)
+        degrees = self.pyramid.tile_degrees(level)
+        rows, cols = self.pyramid.shape(level)
+
+        row0 = int(math.floor((90.0 - y1) / degrees))
+        row1 = int(math.ceil((90.0 - y0) / degrees)) - 1
+        row0 = min(max(row0, 0), rows - 1)
+        row1 = min(max(row1, 0), rows - 1)
+
+        # the columns seen in each wrap of the globe across the view; the
+        # images are placed in data coordinates, shifted by the wrap, so
+        # that wrapped extents are not resampled by the projection
+        spans = []
+        for lo, hi, shift in wrapped_windows(x0, x1):
+            col0 = max(int(math.floor((lo + 180.0) / degrees)), 0)
+            col1 = min(int(math.ceil((hi + 180.0) / degrees)) - 1, cols - 1)
+            if col1 >= col0:
+                spans.append((col0, col1, shift))
+
+        key = (level, row0, row1, tuple(spans))
+        if key == self._key:
+            return
+        self._key = key
+
+        mosaics = {}
+        pieces = []
+        for col0, col1, shift in spans:
+            if (col0, col1) not in mosaics:
+                mosaics[col0, col1] = np.vstack([
+                    np.hstack([self.pyramid.get_tile(level, row, col)
+                               for col in range(col0, col1 + 1)])
+                    for row in range(row0, row1 + 1)])
+            pieces.append((mosaics[col0, col1],
+                           (shift - 180.0 + col0 * degrees,
+                            shift - 180.0 + (col1 + 1) * degrees,
+                            90.0 - (row1 + 1) * degrees,
+                            90.0 - row0 * degrees)))
+        self._show(pieces)
+
+    def _update_warped(self, projection, units_per_pixel):
+        level = min(self.pyramid.level_for_resolution(
+            units_per_pixel * projection.degrees_per_unit), MAX_WARPED_LEVEL)
+        key = (projection.cache_key, level)
+        if key == self._key:
+            return
+        self._key = key
+        self._show([(self.pyramid.warped(projection, level),
+                     projection.x_limits + projection.y_limits)])
+
+    def _show(self, pieces):
+        """
+        Shows (image, extent) pairs, reusing the image artists
+        """
+        while len(self.images) > len(pieces):
+            self.images.pop().remove()
+        for index, (image, extent) in enumerate(pieces):
+            if index < len(self.images):
+                self.images[index].set_data(image)
+                self.images[index].set_extent(extent)
+                continue
+            x0, x1 = self.ax.get_xlim()
+            y0, y1 = self.ax.get_ylim()
+            self.images.append(self.ax.imshow(
+                    image, origin='upper', extent=extent,
+                    transform=self.ax.transData, interpolation='nearest',
+                    zorder=0, visible=self.visible, **self.kwargs))
+            self.ax.set_xlim(x0, x1)
+            self.ax.set_ylim(y0, y1)
+
+    def mirror(self, ax):
+        """
+        A layer drawing the same imagery on other axes
+        """
+        return TiledImageLayer(ax, self.pyramid, **self.kwargs)
+
+    def remove(self):
+        for image in self.images:
+            image.remove()
+        self.images = []
+        self._key = None
+
+    def set_visible(self, visible):
+        self.visible = visible
+        for image in self.images:
+            image.set_visible(visible)
+
+    def shown_artists(self):
+        return list(self.images)
@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+
+import pytest
+
+SCRIPT_PATH = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(SCRIPT_PATH, '..', 'lib', 'jormungandr'))
+
+
+@pytest.fixture(scope='session')
+def wx_app():
+    """
+    A wx application, for tests of the GUI; skipped without wxPython
+    """
+    wx = pytest.importorskip('wx')
+    app = wx.GetApp() or wx.App(False)
+    yield app
+
+
+def run_events(app, until, timeout=30.0):
+    """
+    Processes the application's pending events, like the ones posted by
+    wx.CallAfter from worker threads, until until() holds
+    """
+    deadline = time.time() + timeout
+    while not until():
+        assert time.time() < deadline, 'timed out waiting for events'
+        app.ProcessPendingEvents()
+        time.sleep(0.01)
@@ -0,0 +1,28 @@
+from conftest import run_events
+
+
+def test_failed_build_frees_the_renderer(wx_app):
+    from background_render import BackgroundRenderer
+
+    done = []
+    errors = []
+
+    def build(figure, param, job):
+        if param == 'bad':
+            raise ValueError('bad input')
+        return param
+
+    renderer = BackgroundRenderer(
+            build,
+            lambda job, figure: done.append(job.result),
+            on_error=lambda job, error: errors.append(error))
+    renderer.submit('bad', (1, 1), 10)
+    run_events(wx_app, lambda: not renderer.busy())
+    assert isinstance(errors[0], ValueError)
+    assert done == []
+
+    # a later render still goes through
+    renderer.submit('good', (1, 1), 10)
+    run_events(wx_app, lambda: not renderer.busy())
+    assert done == ['good']
+    assert len(errors) == 1
@@ -0,0 +1,31 @@
+import numpy as np
+
+import ingest
+
+
+def write_csv(path, rows):
+    with open(path, 'w') as f:
+        f.write('lat,lon,name\n')
+        for row in rows:
+            f.write(','.join(row) + '\n')
+
+
+def test_missing_values_after_the_first_chunk(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    write_csv(path, [('10.5', '20', 'a'), ('11', '21', 'b'),
+                     ('', '22', 'c'), ('13', 'NA', 'd')])
+    store = ingest.load(path, chunk_rows=2)
+    lons, lats = store.positions()
+    assert store.rows == 4
+    np.testing.assert_array_equal(lats, [10.5, 11, np.nan, 13])
+    np.testing.assert_array_equal(lons, [20, 21, 22, np.nan])
+
+
+def test_text_after_the_first_chunk(tmp_path):
+    path = str(tmp_path / 'log.csv')
+    write_csv(path, [('10', '20', '1'), ('11', '21', '2'),
+                     ('12', '22', 'three')])
+    store = ingest.load(path, chunk_rows=2)
+    names = [store.labels['name'][code] for code in store['name']]
+    assert names == ['1', '2', 'three']
+    np.testing.assert_array_equal(store['lat'], [10, 11, 12])
@@ -0,0 +1,30 @@
+import numpy as np
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from map_view import MapView
+
+
+def make_view():
+    figure = Figure((4, 3), dpi=50)
+    view = MapView(figure, FigureCanvasAgg(figure))
+    view.plot({'Blue Marble': True})
+    return view
+
+
+def test_interaction_renders_on_a_headless_view():
+    view = make_view()
+    frames = view.profiler.frames
+    view.progressive.interact()
+    assert not view.progressive.interacting
+    assert view.profiler.frames == frames + 1
+
+
+def test_playback_on_a_headless_view():
+    view = make_view()
+    view.set_playback_data(np.array([0.0, 1.0]), np.array([0.0, 10.0]),
+                           np.array([0.0, 5.0]))
+    view.playback.play()
+    assert not view.playback.playing()
+    assert view.playback.fraction() <= 1.0
@@ -0,0 +1,39 @@
+from conftest import run_events
+
+
+def make_panel(wx_app):
+    import wx
+    from plot_panel import PlotPanel
+
+    frame = wx.Frame(None)
+    panel = PlotPanel(frame, frame.CreateStatusBar())
+    panel.figure.set_size_inches((4, 3))
+    panel.figure.set_dpi(100)
+    panel.set_parallel_rendering(workers=0)
+    return frame, panel
+
+
+def idle(panel):
+    return not panel.background_renderer.busy() and \
+        not panel.layer_builder.busy()
+
+
+def test_failed_layer_build_releases_held_renders(wx_app, tmp_path):
+    frame, panel = make_panel(wx_app)
+    param = {'Blue Marble': True}
+    panel.updatePlot(param)
+    run_events(wx_app, lambda: idle(panel))
+
+    # the input layer is built by the layer builder, and can't be read
+    panel.updatePlot(dict(param, inputfile=str(tmp_path / 'missing.csv')))
+    assert panel.layer_builder.busy()
+    frames = panel.profiler.frames
+    panel.render(set(['view']))
+    assert panel.profiler.frames == frames
+
+    run_events(wx_app, lambda: idle(panel) and not panel._held)
+    panel.scheduler.flush()
+    assert panel.profiler.frames > frames
+    assert 'input' not in panel.layers
+    assert frame.GetStatusBar().GetStatusText().startswith('Plotting failed')
+    frame.Destroy()